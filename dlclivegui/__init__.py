@@ -1,4 +1,5 @@
 from dlclivegui.camera_process import CameraProcess
 from dlclivegui.pose_process import CameraPoseProcess
+from dlclivegui.session import MultiCameraSession
 from dlclivegui.video import create_labeled_video
 from dlclivegui.dlclivegui import DLCLiveGUI
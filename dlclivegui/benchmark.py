@@ -0,0 +1,224 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import time
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageDraw
+
+from dlclivegui.display import PoseOverlay, cmap_colors
+from dlclivegui.pose_recorder import pose_dataframe
+from dlclivegui.video import pose_array, pose_indices
+
+
+def _draw_pose_pil(img, pose, colors, radius, lik_thresh, skeleton=None):
+    """ Draw keypoints one at a time with :class:`PIL.ImageDraw`, as the GUI did before :class:`dlclivegui.display.PoseOverlay`
+    """
+
+    img_draw = ImageDraw.Draw(img)
+    for i, j in skeleton if skeleton is not None else []:
+        if (pose[i, 2] > lik_thresh) and (pose[j, 2] > lik_thresh):
+            img_draw.line(
+                [tuple(pose[i, :2]), tuple(pose[j, :2])], fill=(255, 255, 255)
+            )
+    for i in range(pose.shape[0]):
+        if pose[i, 2] > lik_thresh:
+            x0 = max(pose[i, 0] - radius, 0)
+            x1 = min(pose[i, 0] + radius, img.size[0])
+            y0 = max(pose[i, 1] - radius, 0)
+            y1 = min(pose[i, 1] + radius, img.size[1])
+            img_draw.ellipse([x0, y0, x1, y1], fill=colors[i], outline=colors[i])
+
+    return img
+
+
+def benchmark_overlay(
+    n_keypoints=50,
+    im_size=(640, 480),
+    radius=3,
+    lik_thresh=0.5,
+    skeleton=False,
+    n_frames=500,
+):
+    """ Measure the time to draw a pose on a display frame, with :class:`dlclivegui.display.PoseOverlay` and with a loop of :class:`PIL.ImageDraw` ellipses
+
+    Parameters
+    ----------
+    n_keypoints : int, optional
+        number of keypoints per pose (10 per animal), by default 50
+    im_size : tuple, optional
+        size of the frames, (width, height), by default (640, 480)
+    radius : int, optional
+        radius of the keypoint markers, by default 3
+    lik_thresh : float, optional
+        likelihood threshold, by default 0.5
+    skeleton : bool, optional
+        also draw lines between consecutive keypoints of each animal, by default False
+    n_frames : int, optional
+        number of frames to draw, by default 500
+
+    Returns
+    -------
+    dict
+        mean time per frame in seconds, with keys "overlay" and "pil"
+    """
+
+    rng = np.random.RandomState(0)
+    frame = rng.randint(0, 256, size=(im_size[1], im_size[0], 3), dtype=np.uint8)
+
+    ### keypoints are scattered around one animal per 10 keypoints, so skeleton lines have realistic lengths
+
+    centers = rng.uniform((0, 0), im_size, size=(n_frames, n_keypoints // 10 + 1, 2))
+    xy = np.repeat(centers, 10, axis=1)[:, :n_keypoints]
+    xy = np.clip(xy + rng.normal(0, 20, size=xy.shape), 0, np.array(im_size) - 1)
+    poses = np.concatenate(
+        [xy, rng.uniform(0, 1, size=(n_frames, n_keypoints, 1))], axis=2
+    )
+    colors = cmap_colors("bmy", n_keypoints)
+    pil_colors = [tuple(int(v) for v in c) for c in colors]
+    links = (
+        [(i, i + 1) for i in range(n_keypoints - 1) if (i + 1) % 10 > 0]
+        if skeleton
+        else None
+    )
+
+    overlay = PoseOverlay(colors, radius=radius, lik_thresh=lik_thresh, skeleton=links)
+    image = np.empty_like(frame)
+    start = time.perf_counter()
+    for pose in poses:
+        np.copyto(image, frame)
+        overlay.draw(image, pose)
+    overlay_time = (time.perf_counter() - start) / n_frames
+
+    start = time.perf_counter()
+    for pose in poses:
+        img = Image.fromarray(frame)
+        _draw_pose_pil(img, pose, pil_colors, radius, lik_thresh, links)
+    pil_time = (time.perf_counter() - start) / n_frames
+
+    return {"overlay": overlay_time, "pil": pil_time}
+
+
+def _lookup_poses_pandas(long_poses, pose_times, bodyparts, cur_time):
+    """ Find the pose for a frame by filtering a long-format pose data frame, as :func:`dlclivegui.video.create_labeled_video` did before :func:`dlclivegui.video.pose_indices`
+    """
+
+    poses_before_index = np.where(pose_times < cur_time)[0]
+    if poses_before_index.size == 0:
+        return None
+
+    cur_pose_time = pose_times[poses_before_index[-1]]
+    this_pose = long_poses[long_poses["pose_time"] == cur_pose_time]
+
+    return np.array(
+        [this_pose[this_pose["bodyparts"] == bp]["value"].values for bp in bodyparts]
+    )
+
+
+def benchmark_pose_lookup(
+    n_frames=10000, n_bodyparts=10, fps=100, pose_fps=50, n_pandas_frames=200
+):
+    """ Measure the time to find the pose to draw on each frame of a labeled video, with :func:`dlclivegui.video.pose_indices` on a dense pose array,
+    and with per-frame filtering of a pandas data frame
+
+    Parameters
+    ----------
+    n_frames : int, optional
+        number of video frames, by default 10000
+    n_bodyparts : int, optional
+        number of bodyparts, by default 10
+    fps : float, optional
+        frame rate of the video, by default 100
+    pose_fps : float, optional
+        rate of the poses, by default 50
+    n_pandas_frames : int, optional
+        number of frames timed with the pandas lookup, which is too slow to run on every frame, by default 200
+
+    Returns
+    -------
+    dict
+        mean time per frame in seconds, with keys "array" (including the conversion to an array) and "pandas"
+    """
+
+    rng = np.random.RandomState(0)
+    frame_times = np.arange(n_frames) / fps
+    pose_times = np.sort(rng.uniform(0, n_frames / fps, int(n_frames * pose_fps / fps)))
+    bodyparts = [f"bodypart{i}" for i in range(n_bodyparts)]
+    poses = rng.uniform(0, 1, size=(pose_times.size, n_bodyparts, 3))
+    pose_df = pose_dataframe(bodyparts, poses, pose_times, pose_times)
+
+    start = time.perf_counter()
+    _, pose_arr = pose_array(pose_df)
+    inds = pose_indices(frame_times, pose_times)
+    for ind in inds:
+        this_pose = pose_arr[ind] if ind >= 0 else None
+    array_time = (time.perf_counter() - start) / n_frames
+
+    long_poses = pd.DataFrame(
+        {
+            "pose_time": np.repeat(pose_times, n_bodyparts * 3),
+            "bodyparts": np.tile(np.repeat(bodyparts, 3), pose_times.size),
+            "value": poses.ravel(),
+        }
+    )
+    test_frames = frame_times[
+        np.linspace(0, n_frames - 1, min(n_pandas_frames, n_frames)).astype(int)
+    ]
+    start = time.perf_counter()
+    for cur_time in test_frames:
+        this_pose = _lookup_poses_pandas(long_poses, pose_times, bodyparts, cur_time)
+    pandas_time = (time.perf_counter() - start) / test_frames.size
+
+    return {"array": array_time, "pandas": pandas_time}
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark")
+
+    overlay_parser = subparsers.add_parser("overlay")
+    overlay_parser.add_argument("-k", "--n-keypoints", type=int, default=50)
+    overlay_parser.add_argument(
+        "-s", "--im-size", nargs=2, type=int, default=[640, 480]
+    )
+    overlay_parser.add_argument("-r", "--radius", type=int, default=3)
+    overlay_parser.add_argument("--skeleton", action="store_true")
+    overlay_parser.add_argument("-n", "--n-frames", type=int, default=500)
+
+    lookup_parser = subparsers.add_parser("pose-lookup")
+    lookup_parser.add_argument("-n", "--n-frames", type=int, default=10000)
+    lookup_parser.add_argument("-b", "--n-bodyparts", type=int, default=10)
+    lookup_parser.add_argument("--fps", type=float, default=100)
+    lookup_parser.add_argument("--pose-fps", type=float, default=50)
+
+    args = parser.parse_args()
+
+    if args.benchmark == "overlay":
+        times = benchmark_overlay(
+            n_keypoints=args.n_keypoints,
+            im_size=tuple(args.im_size),
+            radius=args.radius,
+            skeleton=args.skeleton,
+            n_frames=args.n_frames,
+        )
+    elif args.benchmark == "pose-lookup":
+        times = benchmark_pose_lookup(
+            n_frames=args.n_frames,
+            n_bodyparts=args.n_bodyparts,
+            fps=args.fps,
+            pose_fps=args.pose_fps,
+        )
+    else:
+        parser.print_help()
+        return
+
+    for name, t in times.items():
+        print(f"{name}: {t*1000:0.3f} ms per frame")
@@ -92,7 +92,7 @@ class AravisCam(Camera):
 
         buffer = None
         while buffer is None:
-            buffer = self.stream.try_pop_buffer()
+            buffer = self.stream.timeout_pop_buffer(int(1e6))
 
         frame = self._convert_image_to_numpy(buffer)
         self.stream.push_buffer(buffer)
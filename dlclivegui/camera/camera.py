@@ -9,6 +9,8 @@ Licensed under GNU Lesser General Public License v3.0
 import cv2
 import time
 
+from dlclivegui.timing import sleep_until, DEFAULT_SPIN_THRESHOLD
+
 
 class CameraError(Exception):
     """
@@ -73,6 +75,7 @@ class Camera(object):
         self.use_tk_display = use_tk_display
         self.display_resize = display_resize if display_resize else 1.0
         self.next_frame = 0
+        self.spin_threshold = DEFAULT_SPIN_THRESHOLD
 
     def set_im_size(self, res):
         """[summary]
@@ -105,6 +108,7 @@ class Camera(object):
 
     def get_image_on_time(self):
         """ Gets an image from frame capture device at the appropriate time (according to fps).
+        Sleeps until the next frame is due, spinning only for the last `spin_threshold` seconds.
         
         Returns
         -------
@@ -116,13 +120,13 @@ class Camera(object):
 
         frame = None
         while frame is None:
+            sleep_until(self.next_frame, self.spin_threshold)
             cur_time = time.time()
-            if cur_time > self.next_frame:
-                frame = self.get_image()
-                timestamp = cur_time
-                self.next_frame = max(
-                    self.next_frame + 1.0 / self.fps, cur_time + 0.5 / self.fps
-                )
+            frame = self.get_image()
+            timestamp = cur_time
+            self.next_frame = max(
+                self.next_frame + 1.0 / self.fps, cur_time + 0.5 / self.fps
+            )
 
         return frame, timestamp
 
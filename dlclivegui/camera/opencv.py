@@ -13,6 +13,7 @@ import time
 import platform
 
 from dlclivegui.camera import Camera, CameraError
+from dlclivegui.timing import sleep_until
 
 
 class OpenCVCam(Camera):
@@ -129,8 +130,7 @@ class OpenCVCam(Camera):
 
         # if video, wait...
         if self.video:
-            while time.time() - self.last_cap_read < (1.0 / self.fps):
-                pass
+            sleep_until(self.last_cap_read + 1.0 / self.fps, self.spin_threshold)
 
         ret, frame = self.cap.read()
 
@@ -9,6 +9,7 @@ Licensed under GNU Lesser General Public License v3.0
 import warnings
 import numpy as np
 import time
+import threading
 
 import gi
 
@@ -66,8 +67,6 @@ class TISCam(Camera):
         )
         self.color = color
         self.display = display
-        self.sample_locked = False
-        self.new_sample = False
 
     def no_auto(self):
 
@@ -144,6 +143,9 @@ class TISCam(Camera):
 
     def set_capture_device(self):
 
+        self.sample_lock = threading.Lock()
+        self.new_sample = threading.Event()
+
         self.setup_gst(self.id, self.fps)
         self.gst_pipeline.set_state(Gst.State.PLAYING)
 
@@ -151,14 +153,12 @@ class TISCam(Camera):
 
     def get_image(self, sink):
 
-        # wait for sample to unlock
-        while self.sample_locked:
-            pass
-
         try:
 
             self.sample = sink.get_property("last-sample")
-            self._convert_image_to_numpy()
+            with self.sample_lock:
+                self._convert_image_to_numpy()
+            self.new_sample.set()
 
         except GLib.Error as e:
 
@@ -170,8 +170,6 @@ class TISCam(Camera):
 
     def _convert_image_to_numpy(self):
 
-        self.sample_locked = True
-
         buffer = self.sample.get_buffer()
         struct = self.sample.get_caps().get_structure(0)
 
@@ -187,17 +185,16 @@ class TISCam(Camera):
             dtype=dtype,
         )
 
-        self.sample_locked = False
-        self.new_sample = True
-
     def get_image_on_time(self):
 
         # wait for new sample
-        while not self.new_sample:
-            pass
-        self.new_sample = False
+        self.new_sample.wait()
+        self.new_sample.clear()
+
+        with self.sample_lock:
+            frame = self.frame
 
-        return self.frame, time.time()
+        return frame, time.time()
 
     def close_capture_device(self):
 
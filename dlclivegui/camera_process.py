@@ -9,7 +9,18 @@ Licensed under GNU Lesser General Public License v3.0
 import time
 import multiprocess as mp
 import ctypes
-from dlclivegui.queue import ClearableQueue, ClearableMPQueue
+from dlclivegui.queue import SharedArrayQueue
+from dlclivegui.frame_buffer import FrameRingBuffer
+from dlclivegui.control import CommandChannel
+from dlclivegui.timing import (
+    LoopMonitor,
+    sleep_until,
+    wait_for,
+    DEFAULT_SPIN_THRESHOLD,
+)
+from dlclivegui.npy_file import NpyAppender
+from dlclivegui.writers import WRITERS, VideoWriterError, create_writer
+from dlclivegui.segments import EncoderPool
 import threading
 import cv2
 import numpy as np
@@ -33,73 +44,191 @@ class CameraProcess(object):
         a camera object
     ctx : :class:`multiprocess.Context`
         multiprocessing context
+    buffer_size : int, optional
+        number of frame slots in the shared memory ring buffer, by default 4
+    write_mode : str, optional
+        how frames reach the writer process. If "queue", frames are copied into `write_frame_queue`, a queue of `write_buffer_size` frames preallocated in shared memory.
+        If "shared", only frame sequence numbers are sent and the writer reads frames from the ring buffer;
+        frames overwritten before the writer reads them are counted as dropped. By default "queue"
+    spin_threshold : float, optional
+        time in seconds that the capture, pose and writer loops busy-wait before sleeping or blocking while waiting for a frame.
+        0 never busy-waits. By default 0.001
+    writer : str, optional
+        video writer backend, one of the keys of :data:`dlclivegui.writers.WRITERS` (e.g. "divx", "mjpg", "ffv1", "huffyuv", "raw", "ffmpeg"), by default "divx"
+    writer_options : dict, optional
+        options passed to the video writer backend (e.g. {"preset": "fast", "crf": 18} for "ffmpeg"), by default None
+    n_encoders : int, optional
+        number of encoder threads. If greater than 1, the video is written as segments of `segment_frames` frames, which are encoded in parallel
+        (see :class:`dlclivegui.segments.EncoderPool`). By default 1
+    segment_frames : int, optional
+        maximum number of frames per video segment. If any of `segment_frames`, `segment_seconds` or `segment_bytes` is set, the video is written as rolling segments,
+        each with its own timestamp file, listed in `{filename}_MANIFEST.json`. By default None, which writes a single video file with one encoder, or segments of 1000 frames with several encoders
+    segment_seconds : float, optional
+        maximum duration of a video segment, in seconds, by default None
+    segment_bytes : int, optional
+        approximate maximum size of a video segment file, in bytes, by default None
+    write_buffer_size : int, optional
+        maximum number of frames waiting to be written. In "queue" mode, this many frames are allocated in shared memory while the writer process runs
+        (from :meth:`start_writer_process` to :meth:`stop_writer_process`), e.g. 0.9 GB for 1024 frames at 640x480. By default None,
+        which is 1024 frames or as many frames as fit in `WRITE_BUFFER_BYTES` (256 MB), whichever is fewer
+    overflow_policy : str, optional
+        what the capture process does when `write_buffer_size` frames are waiting to be written. If "block", capture waits for the writer (for at most one second per frame).
+        If "drop_oldest", the oldest waiting frame is dropped. If "drop_newest", the new frame is dropped. By default "drop_newest".
+        Every dropped frame is recorded in `{filename}_DROPPED.npy`
+    instrument_queues : bool, optional
+        If True, `write_frame_queue` records its depth, high-water mark, latency and throughput, which are reported by :meth:`get_queue_stats`. By default False
+    display_fps : float, optional
+        maximum rate at which the capture process prepares display frames (resized by the camera's `display_resize` and converted to RGB), by default 30.
+        The GUI also redraws the display at most this often. 0 prepares every frame. Display frames are only prepared while they are read with :meth:`read_display_frame`;
+        the capture process stops preparing them `DISPLAY_IDLE_TIME` seconds after the last read
     """
 
-    def __init__(self, device, ctx=mp.get_context("spawn")):
+    WRITE_MODES = ["queue", "shared"]
+    OVERFLOW_POLICIES = ["block", "drop_oldest", "drop_newest"]
+    DISPLAY_IDLE_TIME = 1
+    WRITE_BUFFER_BYTES = 256 * 1024 ** 2
+
+    def __init__(
+        self,
+        device,
+        ctx=mp.get_context("spawn"),
+        buffer_size=4,
+        write_mode="queue",
+        spin_threshold=DEFAULT_SPIN_THRESHOLD,
+        writer="divx",
+        writer_options=None,
+        n_encoders=1,
+        segment_frames=None,
+        segment_seconds=None,
+        segment_bytes=None,
+        write_buffer_size=None,
+        overflow_policy="drop_newest",
+        instrument_queues=False,
+        display_fps=30,
+    ):
         """ Constructor method
         """
 
+        if write_mode not in CameraProcess.WRITE_MODES:
+            raise CameraProcessError(
+                f"write_mode must be one of {CameraProcess.WRITE_MODES}, not '{write_mode}'."
+            )
+        if overflow_policy not in CameraProcess.OVERFLOW_POLICIES:
+            raise CameraProcessError(
+                f"overflow_policy must be one of {CameraProcess.OVERFLOW_POLICIES}, not '{overflow_policy}'."
+            )
+        if (write_buffer_size is not None) and (write_buffer_size < 1):
+            raise CameraProcessError(
+                f"write_buffer_size must be at least 1, not {write_buffer_size}."
+            )
+        if writer not in WRITERS:
+            raise CameraProcessError(
+                f"writer must be one of {list(WRITERS.keys())}, not '{writer}'."
+            )
+
         self.device = device
+        self.device.spin_threshold = spin_threshold
+        self.spin_threshold = spin_threshold
         self.ctx = ctx
 
         res = self.device.im_size
-        self.frame_shared = mp.Array(ctypes.c_uint8, res[1] * res[0] * 3)
-        self.frame = np.frombuffer(self.frame_shared.get_obj(), dtype="uint8").reshape(
-            res[1], res[0], 3
+        self.frame_buffer = FrameRingBuffer(
+            (res[1], res[0], 3), n_slots=buffer_size, ctx=self.ctx
         )
-        self.frame_time_shared = mp.Array(ctypes.c_double, 1)
-        self.frame_time = np.frombuffer(self.frame_time_shared.get_obj(), dtype="d")
-
-        self.q_to_process = ClearableMPQueue(ctx=self.ctx)
-        self.q_from_process = ClearableMPQueue(ctx=self.ctx)
-        self.write_frame_queue = ClearableMPQueue(ctx=self.ctx)
+        self.display_size = (
+            int(res[0] * self.device.display_resize),
+            int(res[1] * self.device.display_resize),
+        )
+        self.display_buffer = FrameRingBuffer(
+            (self.display_size[1], self.display_size[0], 3),
+            n_slots=2,
+            time_history=2,
+            ctx=self.ctx,
+        )
+        self.display_fps = display_fps
+        self.display_request = self.ctx.RawValue(ctypes.c_double, 0)
+
+        self.channels = {
+            "capture": CommandChannel("capture", ctx=self.ctx),
+            "writer": CommandChannel("writer", ctx=self.ctx),
+        }
+
+        ### messages to the writer process: the frame's sequence number, its timestamp (NaN marks where recording stopped), the sequence number of the first frame of the recording,
+        ### and in "queue" mode the frame itself, written straight into shared memory. The queue's slots are only allocated while the writer process runs
+
+        fields = [("seq", np.int64), ("ts", np.float64), ("first_seq", np.int64)]
+        if write_mode == "queue":
+            fields.append(("frame", self.frame_buffer.dtype, self.frame_buffer.shape))
+        if write_buffer_size is None:
+            item_bytes = np.dtype(fields).itemsize
+            write_buffer_size = min(
+                1024, max(CameraProcess.WRITE_BUFFER_BYTES // item_bytes, 1)
+            )
+        self.write_frame_queue = SharedArrayQueue(
+            (),
+            dtype=fields,
+            maxsize=write_buffer_size,
+            ctx=self.ctx,
+            instrument=instrument_queues,
+            allocate=False,
+        )
+        self.write_mode = write_mode
+        self.write_buffer_size = write_buffer_size
+        self.overflow_policy = overflow_policy
+
+        ### frames written, dropped, queued by capture, read by the writer, and evicted from the queue by capture
+
+        self.write_stats = self.ctx.RawArray(ctypes.c_int64, 5)
+        self.write_error = self.ctx.RawArray(ctypes.c_char, 1024)
+        self.writer = writer
+        self.writer_options = writer_options if writer_options is not None else {}
+        self.n_encoders = n_encoders
+        self.segment_frames = segment_frames
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.encode_fps = self.ctx.RawValue(ctypes.c_double, 0)
+        self.cpu_usage = {
+            "capture": self.ctx.RawValue(ctypes.c_double, 0),
+            "writer": self.ctx.RawValue(ctypes.c_double, 0),
+        }
 
         self.capture_process = None
         self.writer_process = None
 
     def start_capture_process(self, timeout=60):
 
-        cmds = self.q_to_process.read(clear=True, position="all")
-        if cmds is not None:
-            for c in cmds:
-                if c[1] != "capture":
-                    self.q_to_process.write(c)
+        self.channels["capture"].clear()
 
         self.capture_process = self.ctx.Process(
-            target=self._run_capture,
-            args=(self.frame_shared, self.frame_time_shared),
-            daemon=True,
+            target=self._run_capture, args=(self.frame_buffer,), daemon=True,
         )
         self.capture_process.start()
 
-        stime = time.time()
-        while time.time() - stime < timeout:
-            cmd = self.q_from_process.read()
-            if cmd is not None:
-                if (cmd[0] == "capture") and (cmd[1] == "start"):
-                    return cmd[2]
-                else:
-                    self.q_to_process.write(cmd)
-
-        return True
+        resp = self.channels["capture"].wait("start", timeout=timeout)
+        return resp.result if resp is not None else True
 
-    def _run_capture(self, frame_shared, frame_time):
+    def _run_capture(self, frame_buffer):
 
-        res = self.device.im_size
-        self.frame = np.frombuffer(frame_shared.get_obj(), dtype="uint8").reshape(
-            res[1], res[0], 3
-        )
-        self.frame_time = np.frombuffer(frame_time.get_obj(), dtype="d")
+        self.frame_buffer = frame_buffer
 
         ret = self.device.set_capture_device()
         if not ret:
             raise CameraProcessError("Could not start capture device.")
-        self.q_from_process.write(("capture", "start", ret))
+        self.channels["capture"].notify("start", ret)
+
+        display_stop = threading.Event()
+        display_thread = threading.Thread(
+            target=self._display_loop, args=(display_stop,), daemon=True
+        )
+        display_thread.start()
 
         self._capture_loop()
 
+        display_stop.set()
+        display_thread.join()
+
         self.device.close_capture_device()
-        self.q_from_process.write(("capture", "end", True))
+        self.channels["capture"].notify("end", True)
 
     def _capture_loop(self):
         """ Acquires frames from frame capture device in a loop
@@ -107,7 +236,11 @@ class CameraProcess(object):
 
         run = True
         write = False
+        first_seq = -1
+        seq = -1
         last_frame_time = time.time()
+        channel = self.channels["capture"]
+        monitor = LoopMonitor(self.cpu_usage["capture"])
 
         while run:
 
@@ -117,11 +250,19 @@ class CameraProcess(object):
 
             write_capture = time.time()
 
-            np.copyto(self.frame, frame)
-            self.frame_time[0] = frame_time
+            seq = self.frame_buffer.write(frame, frame_time)
 
             if write:
-                ret = self.write_frame_queue.write((frame, frame_time))
+                if first_seq < 0:
+                    first_seq = seq
+                ret = self._queue_write_frame(
+                    (
+                        seq,
+                        frame_time,
+                        first_seq,
+                        frame if self.write_mode == "queue" else None,
+                    )
+                )
 
             end_capture = time.time()
 
@@ -130,34 +271,112 @@ class CameraProcess(object):
             # print("\n")
 
             last_frame_time = time.time()
+            monitor.tick()
 
             ### read commands
-            cmd = self.q_to_process.read()
+            cmd = channel.poll()
             if cmd is not None:
-                if cmd[0] == "capture":
-                    if cmd[1] == "write":
-                        write = cmd[2]
-                        self.q_from_process.write(cmd)
-                    elif cmd[1] == "end":
-                        run = False
-                else:
-                    self.q_to_process.write(cmd)
+                if cmd.name == "write":
+                    if write and (not cmd.args[0]) and (first_seq >= 0):
+                        ### tell the writer where recording stopped, so frames dropped at the end are accounted for
+                        self._queue_write_frame((seq, None, first_seq, None), True)
+                    if not write:
+                        first_seq = -1
+                    if cmd.args[0]:
+                        write = self.write_frame_queue.attach()
+                    else:
+                        write = False
+                        self.write_frame_queue.detach()
+                    channel.reply(cmd, write)
+                elif cmd.name == "end":
+                    run = False
+
+    def _display_loop(self, stop):
+        """ Prepares display frames from the newest captured frame, at most `display_fps` times per second, in a thread of the capture process
+
+        Parameters
+        ----------
+        stop : :class:`threading.Event`
+            set to end the loop
+        """
+
+        seq = -1
+        interval = 1 / self.display_fps if self.display_fps else 0
+        next_time = time.time()
+        frame = np.empty(self.frame_buffer.shape, dtype=self.frame_buffer.dtype)
+        small = np.empty(self.display_buffer.shape, dtype=self.display_buffer.dtype)
+        rgb = np.empty(self.display_buffer.shape, dtype=self.display_buffer.dtype)
+
+        while not stop.is_set():
+
+            ### prepare display frames only while a display reads them
+
+            if (
+                time.time() - self.display_request.value
+                > CameraProcess.DISPLAY_IDLE_TIME
+            ):
+                stop.wait(0.05)
+                continue
+
+            if not self.frame_buffer.wait_for_frame(seq, timeout=0.1, spin_threshold=0):
+                continue
+
+            frame, frame_time, seq = self.frame_buffer.read_latest(out=frame)
+            if frame is None:
+                continue
+
+            if self.display_size != (frame.shape[1], frame.shape[0]):
+                cv2.resize(frame, self.display_size, dst=small)
+                cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb)
+            else:
+                cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+            self.display_buffer.write(rgb, frame_time)
 
-    def stop_capture_process(self):
+            next_time = max(next_time + interval, time.time())
+            sleep_until(next_time, spin_threshold=0)
+
+    def _queue_write_frame(self, msg, block=False):
+        """ Put a message for the writer process in `write_frame_queue`, applying the overflow policy if the queue is full
+
+        Returns
+        -------
+        bool
+            True if the message was queued
+        """
+
+        if block or (self.overflow_policy == "block"):
+            ret = wait_for(
+                lambda: not self.write_frame_queue.full(),
+                timeout=1,
+                spin_threshold=self.spin_threshold,
+            )
+        elif self.overflow_policy == "drop_oldest":
+            if self.write_frame_queue.full():
+                self.write_stats[4] += 1
+            ret = True
+        else:
+            ret = not self.write_frame_queue.full()
+
+        if ret:
+            seq, ts, first_seq, frame = msg
+            item = self.write_frame_queue.reserve()
+            item["seq"] = seq
+            item["ts"] = ts if ts is not None else np.nan
+            item["first_seq"] = first_seq
+            if frame is not None:
+                np.copyto(item["frame"], frame, casting="unsafe")
+            self.write_frame_queue.commit()
+            self.write_stats[2] += 1
+
+        return ret
+
+    def stop_capture_process(self, timeout=None):
 
         ret = True
         if self.capture_process is not None:
             if self.capture_process.is_alive():
-                self.q_to_process.write(("capture", "end"))
-
-                while True:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if cmd[0] == "capture":
-                            if cmd[1] == "end":
-                                break
-                        else:
-                            self.q_from_process.write(cmd)
+                self.channels["capture"].send("end")
+                self.channels["capture"].wait("end", timeout=timeout)
 
                 self.capture_process.join(5)
                 if self.capture_process.is_alive():
@@ -167,51 +386,95 @@ class CameraProcess(object):
 
     def start_writer_process(self, filename, timeout=60):
 
-        cmds = self.q_to_process.read(clear=True, position="all")
-        if cmds is not None:
-            for c in cmds:
-                if c[1] != "writer":
-                    self.q_to_process.write(c)
+        self.channels["writer"].clear()
+
+        try:
+            self.write_frame_queue.allocate()
+        except OSError:
+            return False
 
         self.writer_process = self.ctx.Process(
-            target=self._run_writer, args=(filename,), daemon=True
+            target=self._run_writer, args=(filename, self.frame_buffer), daemon=True
         )
         self.writer_process.start()
 
-        stime = time.time()
-        while time.time() - stime < timeout:
-            cmd = self.q_from_process.read()
-            if cmd is not None:
-                if (cmd[0] == "writer") and (cmd[1] == "start"):
-                    return cmd[2]
-                else:
-                    self.q_to_process.write(cmd)
+        resp = self.channels["writer"].wait("start", timeout=timeout)
+        ret = resp.result if resp is not None else True
+        if not ret:
+            self.write_frame_queue.free()
 
-        return True
+        return ret
 
-    def _run_writer(self, filename):
+    def _run_writer(self, filename, frame_buffer):
 
+        self.frame_buffer = frame_buffer
         ret = self._create_writer(filename)
-        self.q_from_process.write(("writer", "start", ret))
+        self.channels["writer"].notify("start", ret)
+        if not ret:
+            return
 
         save = self._write_loop()
 
         ret = self._save_video(not save)
-        self.q_from_process.write(("writer", "end", ret))
+        self.channels["writer"].notify("end", ret)
 
     def _create_writer(self, filename):
 
+        if not self.write_frame_queue.attach():
+            return False
+
         self.filename = filename
-        self.video_file = f"{self.filename}_VIDEO.avi"
         self.timestamp_file = f"{self.filename}_TS.npy"
 
-        self.video_writer = cv2.VideoWriter(
-            self.video_file,
-            cv2.VideoWriter_fourcc(*"DIVX"),
-            self.device.fps,
-            self.device.im_size,
+        try:
+            segmented = (
+                self.segment_frames,
+                self.segment_seconds,
+                self.segment_bytes,
+            ) != (None, None, None)
+            if (self.n_encoders > 1) or segmented:
+                self.video_writer = EncoderPool(
+                    self.writer,
+                    self.filename,
+                    self.device.fps,
+                    self.device.im_size,
+                    n_encoders=self.n_encoders,
+                    segment_frames=self.segment_frames,
+                    segment_seconds=self.segment_seconds,
+                    segment_bytes=self.segment_bytes,
+                    copy_frames=True,
+                    max_queued=self.write_buffer_size,
+                    writer_options=self.writer_options,
+                )
+            else:
+                self.video_writer = create_writer(
+                    self.writer,
+                    self.filename,
+                    self.device.fps,
+                    self.device.im_size,
+                    **self.writer_options,
+                )
+        except VideoWriterError:
+            return False
+
+        self.video_file = self.video_writer.video_file
+        if not self.video_writer.is_opened():
+            return False
+
+        self.write_frame_ts = NpyAppender(self.timestamp_file, "float64")
+        self.dropped_file = f"{self.filename}_DROPPED.npy"
+        self.write_dropped = NpyAppender(self.dropped_file, "float64", (3,))
+
+        self.write_frame = np.empty(
+            self.frame_buffer.shape, dtype=self.frame_buffer.dtype
         )
-        self.write_frame_ts = []
+        self.write_item = np.empty((), dtype=self.write_frame_queue.dtype)
+        for i in range(len(self.write_stats)):
+            self.write_stats[i] = 0
+        self.write_error.value = b""
+        self.failed_frames = []
+        self.encode_fps.value = 0
+        self.write_frame_queue.reset_stats()
 
         return True
 
@@ -221,65 +484,203 @@ class CameraProcess(object):
 
         run = True
         new_frame = None
+        first_seq = -1
+        last_seq = -1
+        channel = self.channels["writer"]
+        monitor = LoopMonitor(self.cpu_usage["writer"])
 
         while run or (new_frame is not None):
 
-            new_frame = self.write_frame_queue.read()
+            new_frame = self.write_frame_queue.read(timeout=0.1, out=self.write_item)
             if new_frame is not None:
-                frame, ts = new_frame
-                if frame.shape[2] == 1:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
-                self.video_writer.write(frame)
-                self.write_frame_ts.append(ts)
 
-            cmd = self.q_to_process.read()
+                self.write_stats[3] += 1
+                seq = int(new_frame["seq"])
+                ts = float(new_frame["ts"]) if not np.isnan(new_frame["ts"]) else None
+                msg_first_seq = int(new_frame["first_seq"])
+
+                ### frames missing between consecutive messages of one recording were dropped by the capture process
+
+                if msg_first_seq != first_seq:
+                    first_seq = msg_first_seq
+                    last_seq = first_seq - 1
+                for missed in range(last_seq + 1, seq if ts is not None else seq + 1):
+                    self._drop_frame(missed, self.frame_buffer.timestamp(missed))
+                last_seq = seq
+
+                if ts is not None:
+                    if self.write_mode == "queue":
+                        frame = new_frame["frame"]
+                    else:
+                        frame, _ = self.frame_buffer.read(seq, out=self.write_frame)
+                    self._write_frame(frame, ts, seq)
+
+            self._check_encoder_errors()
+            monitor.tick()
+
+            cmd = channel.poll()
             if cmd is not None:
-                if cmd[0] == "writer":
-                    if cmd[1] == "end":
-                        run = False
-                        save = cmd[2]
-                else:
-                    self.q_to_process.write(cmd)
+                if cmd.name == "end":
+                    run = False
+                    save = cmd.args[0]
 
         return save
 
+    def _write_frame(self, frame, ts, seq=-1):
+        """ Write a single frame to the video file, or record it as dropped if it is None
+        """
+
+        if frame is None:
+            self._drop_frame(seq, ts)
+            return
+
+        if frame.shape[2] == 1:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
+        if isinstance(self.video_writer, EncoderPool):
+            self.video_writer.write(frame, ts, frame_id=seq)
+        else:
+            self.video_writer.write(frame, ts)
+        self.write_frame_ts.append(ts)
+        self.write_stats[0] += 1
+        self.encode_fps.value = self.video_writer.encode_fps
+
+    def _drop_frame(self, seq, ts, n_written=None):
+        """ Record a dropped frame: its sequence number, timestamp (NaN if unknown) and the number of frames written before it (by default, all frames written so far)
+        """
+
+        self.write_stats[1] += 1
+        self.write_dropped.append(
+            (
+                seq,
+                ts if ts is not None else np.nan,
+                n_written if n_written is not None else self.write_stats[0],
+            )
+        )
+
+    def _check_encoder_errors(self):
+        """ Move frames that the encoder pool could not encode (because their segment could not be opened or written) from the written to the dropped frames,
+        and publish the encoder error
+        """
+
+        if (not isinstance(self.video_writer, EncoderPool)) or (
+            self.video_writer.n_failed == len(self.failed_frames)
+        ):
+            return
+
+        for seq, ts, frame_number in self.video_writer.pop_failed():
+            self.write_stats[0] -= 1
+            self._drop_frame(seq, ts, frame_number - len(self.failed_frames))
+            self.failed_frames.append(frame_number)
+
+        if (self.video_writer.error is not None) and (not self.write_error.value):
+            self.write_error.value = self.video_writer.error.encode()[
+                : len(self.write_error) - 1
+            ]
+
+    def get_write_stats(self):
+        """ Get the number of frames written, dropped and waiting to be written by the current (or last) writer process,
+        the sustained encoding rate of the video writer backend (frames per second of time spent encoding), and the first error of the video writer, if any.
+        The counters are read from shared memory, so this is cheap enough to poll while recording.
+
+        Returns
+        -------
+        dict
+            dictionary with keys "written", "dropped", "queued", "encode_fps" and "error" (None if there was no error)
+        """
+
+        return {
+            "written": self.write_stats[0],
+            "dropped": self.write_stats[1],
+            "queued": max(
+                self.write_stats[2] - self.write_stats[3] - self.write_stats[4], 0
+            ),
+            "encode_fps": self.encode_fps.value,
+            "error": self.write_error.value.decode(errors="replace") or None,
+        }
+
+    def get_queue_stats(self):
+        """ Get metrics of the queues between the main, capture, writer and pose processes. Reads shared memory only, so it can be polled while recording.
+
+        Returns
+        -------
+        dict
+            dictionary with key "write" for `write_frame_queue` (see :meth:`dlclivegui.queue.QueueStats.snapshot`, None if `instrument_queues` is False),
+            and one key per control channel (e.g. "capture", "writer") with the number of commands sent, received and pending
+        """
+
+        stats = {"write": self.write_frame_queue.stats()}
+        for name, channel in self.channels.items():
+            stats[name] = channel.stats()
+
+        return stats
+
+    def get_cpu_usage(self):
+        """ Get the CPU usage of each background loop, as a fraction of one core (averaged over the last second)
+
+        Returns
+        -------
+        dict
+            dictionary of CPU usage by loop name (e.g. "capture", "writer")
+        """
+
+        return {k: v.value for k, v in self.cpu_usage.items()}
+
     def _save_video(self, delete=False):
+        """ Finish the video, timestamp and dropped frame files, or delete them
+
+        Returns
+        -------
+        bool
+            True if the recording was saved without errors. If the video writer failed, the frames written before the failure are kept and False is returned;
+            the error is reported by :meth:`get_write_stats`
+        """
 
         ret = False
 
         self.video_writer.release()
-
-        if (not delete) and (len(self.write_frame_ts) > 0):
-            np.save(self.timestamp_file, self.write_frame_ts)
-            ret = True
+        self._check_encoder_errors()
+        self.write_frame_ts.close()
+        self.write_dropped.close()
+        if (delete or (len(self.write_dropped) == 0)) and os.path.isfile(
+            self.dropped_file
+        ):
+            os.remove(self.dropped_file)
+        self.encode_fps.value = self.video_writer.encode_fps
+
+        if (not delete) and (len(self.write_frame_ts) > len(self.failed_frames)):
+
+            ### timestamps of frames that were not encoded are removed, so the timestamp file matches the video
+
+            if len(self.failed_frames) > 0:
+                np.save(
+                    self.timestamp_file,
+                    np.delete(np.load(self.timestamp_file), self.failed_frames),
+                )
+            ret = not self.write_error.value
         else:
-            os.remove(self.video_file)
+            self.video_writer.remove()
             if os.path.isfile(self.timestamp_file):
                 os.remove(self.timestamp_file)
 
         return ret
 
-    def stop_writer_process(self, save=True):
+    def stop_writer_process(self, save=True, timeout=None):
 
         ret = False
         if self.writer_process is not None:
             if self.writer_process.is_alive():
-                self.q_to_process.write(("writer", "end", save))
-
-                while True:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if cmd[0] == "writer":
-                            if cmd[1] == "end":
-                                ret = cmd[2]
-                                break
-                        else:
-                            self.q_from_process.write(cmd)
+                self.channels["writer"].send("end", save)
+
+                resp = self.channels["writer"].wait("end", timeout=timeout)
+                if resp is not None:
+                    ret = resp.result
 
                 self.writer_process.join(5)
                 if self.writer_process.is_alive():
                     self.writer_process.terminate()
 
+        self.write_frame_queue.free()
+
         return ret
 
     def start_record(self, timeout=5):
@@ -288,17 +689,14 @@ class CameraProcess(object):
 
         if (self.capture_process is not None) and (self.writer_process is not None):
             if self.capture_process.is_alive() and self.writer_process.is_alive():
-                self.q_to_process.write(("capture", "write", True))
-
-                stime = time.time()
-                while time.time() - stime < timeout:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if (cmd[0] == "capture") and (cmd[1] == "write"):
-                            ret = cmd[2]
-                            break
-                        else:
-                            self.q_from_process.write(cmd)
+                resp = self.channels["capture"].request("write", True, timeout=timeout)
+                if resp is not None:
+                    ret = resp.result
+
+        ### the capture and writer processes have attached to the write queue, which is released once they detach, even if this process exits without freeing it
+
+        if ret:
+            self.write_frame_queue.unlink()
 
         return ret
 
@@ -308,31 +706,52 @@ class CameraProcess(object):
 
         if (self.capture_process is not None) and (self.writer_process is not None):
             if (self.capture_process.is_alive()) and (self.writer_process.is_alive()):
-                self.q_to_process.write(("capture", "write", False))
-
-                stime = time.time()
-                while time.time() - stime < timeout:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if (cmd[0] == "capture") and (cmd[1] == "write"):
-                            ret = not cmd[2]
-                            break
-                        else:
-                            self.q_from_process.write(cmd)
+                resp = self.channels["capture"].request("write", False, timeout=timeout)
+                if resp is not None:
+                    ret = not resp.result
 
         return ret
 
     def get_display_frame(self):
+        """ Get the newest display frame, which the capture process has already resized by the camera's `display_resize` and converted to RGB
 
-        frame = self.frame.copy()
-        if frame is not None:
-            if self.device.display_resize != 1:
-                frame = cv2.resize(
-                    frame,
-                    (
-                        int(frame.shape[1] * self.device.display_resize),
-                        int(frame.shape[0] * self.device.display_resize),
-                    ),
-                )
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the display frame, or None if no frame has been captured
+        """
+
+        frame, _, _ = self.read_display_frame()
 
         return frame
+
+    def read_display_frame(self, last_seq=-1):
+        """ Get the newest display frame if it is newer than `last_seq`. Checking for a new frame only reads a shared integer.
+
+        Parameters
+        ----------
+        last_seq : int, optional
+            sequence number of the last display frame the caller has shown, by default -1
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the display frame (resized and in RGB), or None if there is no new frame
+        float
+            capture timestamp of the frame, or None
+        int
+            sequence number of the frame, or `last_seq` if there is no new frame
+        """
+
+        self.display_request.value = time.time()
+
+        if self.display_buffer.latest_seq <= last_seq:
+            return None, None, last_seq
+
+        frame, frame_time, seq = self.display_buffer.read_latest(
+            out=np.empty(self.display_buffer.shape, dtype=self.display_buffer.dtype)
+        )
+        if frame is None:
+            return None, None, last_seq
+
+        return frame, frame_time, seq
@@ -0,0 +1,199 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import time
+import ctypes
+from collections import namedtuple
+from queue import Empty
+import multiprocess as mp
+
+
+Command = namedtuple("Command", ["id", "name", "args"])
+Command.__doc__ = """ A request sent to a background process. `id` is used to match the response to the request. """
+
+Response = namedtuple("Response", ["id", "name", "result"])
+Response.__doc__ = """ A response from a background process. `id` is the id of the request, or 0 for notifications (e.g. "start", "end"). """
+
+
+class CommandChannel(object):
+    """ A request/response control channel between the main process and a single background process (e.g. the capture, writer or pose process).
+
+    Requests are written synchronously to a pipe, and the number of requests sent and received is kept in shared memory,
+    so checking for new commands in a background process (:meth:`poll`) is a read of two integers when there are no commands.
+    The main process waits for responses with a blocking read and a timeout.
+
+    Parameters
+    ----------
+    name : str
+        name of the channel, e.g. "capture"
+    ctx : :class:`multiprocess.Context`
+        multiprocessing context
+    """
+
+    def __init__(self, name, ctx=mp.get_context("spawn")):
+        """ Constructor method
+        """
+
+        self.name = name
+        self._requests = ctx.SimpleQueue()
+        self._responses = ctx.Queue()
+        self._counts = ctx.RawArray(ctypes.c_int64, 2)
+
+    ### main process side
+
+    def send(self, name, *args):
+        """ Send a command to the background process
+
+        Parameters
+        ----------
+        name : str
+            name of the command
+        *args
+            command arguments
+
+        Returns
+        -------
+        int
+            id of the command, used to wait for its response
+        """
+
+        cmd_id = self._counts[0] + 1
+        self._requests.put(Command(cmd_id, name, args))
+        self._counts[0] = cmd_id
+
+        return cmd_id
+
+    def wait(self, name=None, cmd_id=None, timeout=None):
+        """ Wait for a response from the background process. Responses that do not match `name` or `cmd_id` (e.g. late responses to earlier requests) are discarded.
+
+        Parameters
+        ----------
+        name : str, optional
+            name of the response to wait for, by default None (any name)
+        cmd_id : int, optional
+            id of the command to wait for, by default None (any id)
+        timeout : float, optional
+            maximum time to wait in seconds, by default None (wait forever)
+
+        Returns
+        -------
+        :class:`Response`
+            the response, or None if the timeout expired
+        """
+
+        end_time = time.time() + timeout if timeout is not None else None
+
+        while True:
+
+            remaining = None
+            if end_time is not None:
+                remaining = end_time - time.time()
+                if remaining <= 0:
+                    return None
+
+            try:
+                resp = self._responses.get(timeout=remaining)
+            except Empty:
+                return None
+
+            if ((name is None) or (resp.name == name)) and (
+                (cmd_id is None) or (resp.id == cmd_id)
+            ):
+                return resp
+
+    def request(self, name, *args, timeout=None):
+        """ Send a command and wait for its response
+
+        Parameters
+        ----------
+        name : str
+            name of the command
+        *args
+            command arguments
+        timeout : float, optional
+            maximum time to wait in seconds, by default None (wait forever)
+
+        Returns
+        -------
+        :class:`Response`
+            the response, or None if the timeout expired
+        """
+
+        cmd_id = self.send(name, *args)
+        return self.wait(name=name, cmd_id=cmd_id, timeout=timeout)
+
+    def clear(self):
+        """ Discard pending commands and responses, e.g. before starting a new background process on this channel
+        """
+
+        while not self._requests.empty():
+            self._requests.get()
+        self._counts[1] = self._counts[0]
+
+        try:
+            while True:
+                self._responses.get_nowait()
+        except Empty:
+            pass
+
+    def stats(self):
+        """ Get the number of commands sent by the main process and received by the background process
+
+        Returns
+        -------
+        dict
+            dictionary with keys "sent", "received" and "pending"
+        """
+
+        sent, received = self._counts[0], self._counts[1]
+        return {"sent": sent, "received": received, "pending": max(sent - received, 0)}
+
+    ### background process side
+
+    def poll(self):
+        """ Get the next command, if there is one. Does not block.
+
+        Returns
+        -------
+        :class:`Command`
+            the next command, or None if there are no pending commands
+        """
+
+        if self._counts[1] >= self._counts[0]:
+            return None
+
+        cmd = self._requests.get()
+        self._counts[1] = cmd.id
+
+        return cmd
+
+    def reply(self, cmd, result=None):
+        """ Send the response to a command
+
+        Parameters
+        ----------
+        cmd : :class:`Command`
+            the command being responded to
+        result : object, optional
+            result of the command, by default None
+        """
+
+        self._responses.put(Response(cmd.id, cmd.name, result))
+
+    def notify(self, name, result=None):
+        """ Send a notification that is not a response to a command (e.g. that the process has started)
+
+        Parameters
+        ----------
+        name : str
+            name of the notification
+        result : object, optional
+            value sent with the notification, by default None
+        """
+
+        self._responses.put(Response(0, name, result))
@@ -0,0 +1,372 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import time
+import numpy as np
+import colorcet as cc
+from PIL import ImageColor
+
+
+def disk_offsets(radius):
+    """ Pixel offsets of a filled disk
+
+    Parameters
+    ----------
+    radius : float
+        radius of the disk in pixels
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        row offsets
+    :class:`numpy.ndarray`
+        column offsets
+    """
+
+    r = int(np.ceil(radius))
+    dy, dx = np.mgrid[-r : r + 1, -r : r + 1]
+    inside = dx ** 2 + dy ** 2 <= radius ** 2 + 0.5
+
+    return dy[inside], dx[inside]
+
+
+def cmap_colors(cmap, n_colors):
+    """ Pick evenly spaced colors from a :package:`colorcet` colormap
+
+    Parameters
+    ----------
+    cmap : str
+        name of the colormap
+    n_colors : int
+        number of colors
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        array of shape (n_colors, 3) of RGB colors
+    """
+
+    all_colors = getattr(cc, cmap)
+    step = max(int(len(all_colors) / max(n_colors, 1)), 1)
+    colors = [ImageColor.getcolor(c, "RGB") for c in all_colors[::step]]
+
+    return np.array(colors[:n_colors], dtype=np.uint8)
+
+
+def _stamp(image, ys, xs, offsets, colors):
+    """ Set the pixels of a disk around each point, in one indexing operation. `colors` has one row per point, or a single row for all points.
+    Pixels outside the image are skipped.
+    """
+
+    ys = np.round(ys).astype(np.intp)[:, None] + offsets[0][None, :]
+    xs = np.round(xs).astype(np.intp)[:, None] + offsets[1][None, :]
+    inside = (ys >= 0) & (ys < image.shape[0]) & (xs >= 0) & (xs < image.shape[1])
+
+    colors = np.broadcast_to(colors[:, None, :], ys.shape + (colors.shape[1],))
+    image[ys[inside], xs[inside]] = colors[inside]
+
+
+def visible_keypoints(pose, lik_thresh=0.5):
+    """ Mask of keypoints with finite coordinates and a likelihood above a threshold
+
+    Parameters
+    ----------
+    pose : :class:`numpy.ndarray`
+        pose array of shape (n_keypoints, 3), with columns x, y, likelihood
+    lik_thresh : float, optional
+        likelihood threshold, by default 0.5
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        boolean array of shape (n_keypoints,)
+    """
+
+    return np.isfinite(pose[:, :2]).all(axis=1) & (pose[:, 2] > lik_thresh)
+
+
+def draw_keypoints(image, pose, colors, radius=3, lik_thresh=0.5, offsets=None):
+    """ Draw a filled circle at every keypoint above the likelihood threshold
+
+    Parameters
+    ----------
+    image : :class:`numpy.ndarray`
+        image of shape (height, width, channels), drawn on in place
+    pose : :class:`numpy.ndarray`
+        pose array of shape (n_keypoints, 3), with columns x, y, likelihood
+    colors : array-like
+        colors of the keypoints, of shape (n_colors, channels). Colors are reused if there are more keypoints than colors
+    radius : float, optional
+        radius of the circles in pixels, by default 3
+    lik_thresh : float, optional
+        likelihood threshold, by default 0.5
+    offsets : tuple, optional
+        precomputed :func:`disk_offsets` for `radius`, by default None
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        the image
+    """
+
+    offsets = offsets if offsets is not None else disk_offsets(radius)
+    colors = np.asarray(colors, dtype=image.dtype).reshape(-1, image.shape[2])
+
+    visible = np.flatnonzero(visible_keypoints(pose, lik_thresh))
+    if visible.size > 0:
+        _stamp(
+            image,
+            pose[visible, 1],
+            pose[visible, 0],
+            offsets,
+            colors[visible % colors.shape[0]],
+        )
+
+    return image
+
+
+def draw_skeleton(
+    image, pose, skeleton, color=(255, 255, 255), lik_thresh=0.5, thickness=1
+):
+    """ Draw a line between pairs of keypoints, if both keypoints are above the likelihood threshold
+
+    Parameters
+    ----------
+    image : :class:`numpy.ndarray`
+        image of shape (height, width, channels), drawn on in place
+    pose : :class:`numpy.ndarray`
+        pose array of shape (n_keypoints, 3), with columns x, y, likelihood
+    skeleton : array-like
+        pairs of keypoint indices, of shape (n_lines, 2)
+    color : tuple, optional
+        color of the lines, by default (255, 255, 255)
+    lik_thresh : float, optional
+        likelihood threshold, by default 0.5
+    thickness : int, optional
+        thickness of the lines in pixels, by default 1
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        the image
+    """
+
+    skeleton = np.asarray(skeleton, dtype=np.intp).reshape(-1, 2)
+    skeleton = skeleton[(skeleton < pose.shape[0]).all(axis=1)]
+    skeleton = skeleton[visible_keypoints(pose, lik_thresh)[skeleton].all(axis=1)]
+    if skeleton.shape[0] == 0:
+        return image
+
+    start = pose[skeleton[:, 0], :2]
+    end = pose[skeleton[:, 1], :2]
+
+    ### sample each line at one point per pixel along its longest axis, all lines in one array
+
+    lengths = np.ceil(np.abs(end - start).max(axis=1)).astype(np.intp)
+    n_points = np.minimum(lengths, image.shape[0] + image.shape[1]) + 1
+    line = np.repeat(np.arange(skeleton.shape[0]), n_points)
+    first = np.cumsum(n_points) - n_points
+    t = (np.arange(line.size) - first[line]) / np.maximum(n_points[line] - 1, 1)
+    points = start[line] + (end - start)[line] * t[:, None]
+
+    offsets = (
+        disk_offsets(thickness / 2)
+        if thickness > 1
+        else (np.zeros(1, dtype=np.intp), np.zeros(1, dtype=np.intp))
+    )
+    colors = np.asarray(color, dtype=image.dtype).reshape(1, -1)
+    _stamp(image, points[:, 1], points[:, 0], offsets, colors)
+
+    return image
+
+
+class PoseOverlay(object):
+    """ Draws poses on display frames with vectorized numpy operations, instead of drawing keypoints one at a time.
+    The marker shape and colors are computed once, so drawing a pose costs a few array operations regardless of the number of keypoints.
+
+    Parameters
+    ----------
+    colors : array-like
+        RGB colors of the keypoints, of shape (n_colors, 3)
+    radius : float, optional
+        radius of the keypoint markers in pixels, by default 3
+    lik_thresh : float, optional
+        keypoints with a likelihood below this threshold are not drawn, by default 0.5
+    skeleton : array-like, optional
+        pairs of keypoint indices to connect with lines, by default None (no lines)
+    skeleton_color : tuple, optional
+        color of the skeleton lines, by default (255, 255, 255)
+    thickness : int, optional
+        thickness of the skeleton lines in pixels, by default 1
+    """
+
+    def __init__(
+        self,
+        colors,
+        radius=3,
+        lik_thresh=0.5,
+        skeleton=None,
+        skeleton_color=(255, 255, 255),
+        thickness=1,
+    ):
+        """ Constructor method
+        """
+
+        self.colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        self.radius = radius
+        self.lik_thresh = lik_thresh
+        self.skeleton = skeleton
+        self.skeleton_color = skeleton_color
+        self.thickness = thickness
+        self.offsets = disk_offsets(radius)
+
+    def draw(self, image, pose):
+        """ Draw a pose on an image
+
+        Parameters
+        ----------
+        image : :class:`numpy.ndarray`
+            RGB image of shape (height, width, 3), drawn on in place
+        pose : :class:`numpy.ndarray`
+            pose array of shape (n_keypoints, 3), with columns x, y, likelihood
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the image
+        """
+
+        if self.skeleton:
+            draw_skeleton(
+                image,
+                pose,
+                self.skeleton,
+                color=self.skeleton_color,
+                lik_thresh=self.lik_thresh,
+                thickness=self.thickness,
+            )
+
+        return draw_keypoints(
+            image,
+            pose,
+            self.colors,
+            radius=self.radius,
+            lik_thresh=self.lik_thresh,
+            offsets=self.offsets,
+        )
+
+
+class DisplayScheduler(object):
+    """ Decides when the GUI redraws the display window. The display is only redrawn when a new display frame is available, at most `max_fps` times per second.
+    If a redraw takes longer than the frame budget (1 / `max_fps`), the next redraw waits for the next slot of the budget, and the frames captured in the meantime are skipped.
+    Also measures the display rate and latency (time from frame capture to the end of the redraw).
+
+    Parameters
+    ----------
+    max_fps : float, optional
+        maximum redraw rate, by default 30. 0 redraws as often as new frames arrive
+    poll_interval : float, optional
+        time to wait before checking again when there is no new frame, in seconds, by default 0.005
+    stats_interval : float, optional
+        time over which display rate and latency are averaged, in seconds, by default 0.5
+    """
+
+    def __init__(self, max_fps=30, poll_interval=0.005, stats_interval=0.5):
+        """ Constructor method
+        """
+
+        self.interval = 1 / max_fps if max_fps else 0
+        self.poll_interval = poll_interval
+        self.stats_interval = stats_interval
+
+        self.last_seq = -1
+        self.n_skipped = 0
+        self.fps = 0
+        self.latency = None
+
+        self._n_drawn = 0
+        self._latency_sum = 0
+        self._stats_start = time.time()
+
+    def drawn(self, seq, frame_time):
+        """ Record that a frame was drawn
+
+        Parameters
+        ----------
+        seq : int
+            sequence number of the display frame
+        frame_time : float
+            capture timestamp of the frame
+        """
+
+        now = time.time()
+
+        if self.last_seq >= 0:
+            self.n_skipped += max(seq - self.last_seq - 1, 0)
+        self.last_seq = seq
+
+        self._n_drawn += 1
+        self._latency_sum += now - frame_time
+        self._update_stats(now)
+
+    def _update_stats(self, now):
+
+        elapsed = now - self._stats_start
+        if elapsed >= self.stats_interval:
+            self.fps = self._n_drawn / elapsed
+            self.latency = (
+                self._latency_sum / self._n_drawn if self._n_drawn > 0 else None
+            )
+            self._n_drawn = 0
+            self._latency_sum = 0
+            self._stats_start = now
+
+    def next_delay(self, start, drew):
+        """ Time to wait before the next redraw
+
+        Parameters
+        ----------
+        start : float
+            time at which the current redraw started
+        drew : bool
+            whether a new frame was drawn
+
+        Returns
+        -------
+        int
+            delay in milliseconds, for :meth:`tkinter.Misc.after`
+        """
+
+        now = time.time()
+        self._update_stats(now)
+
+        if not drew:
+            delay = self.poll_interval
+        elif self.interval == 0:
+            delay = 0
+        else:
+            elapsed = now - start
+            delay = (
+                self.interval - elapsed
+                if elapsed < self.interval
+                else self.interval - (elapsed % self.interval)
+            )
+
+        return max(int(delay * 1000), 1)
+
+    def status(self):
+        """ Display rate, latency and skipped frames, for the display window
+
+        Returns
+        -------
+        str
+            the status text
+        """
+
+        latency = f"{self.latency*1000:0.0f} ms" if self.latency is not None else "-"
+        return f"display: {self.fps:0.1f} fps  latency: {latency}  skipped: {self.n_skipped}"
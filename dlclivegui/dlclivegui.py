@@ -24,19 +24,20 @@ from tkinter import (
 from tkinter.ttk import Combobox
 import os
 import sys
+import time
 import glob
 import json
 import datetime
 import inspect
 import importlib
 
-from PIL import Image, ImageTk, ImageDraw
-import colorcet as cc
+from PIL import Image, ImageTk
 
 from dlclivegui import CameraPoseProcess
 from dlclivegui import processor
 from dlclivegui import camera
 from dlclivegui.tkutil import SettingsWindow
+from dlclivegui.display import PoseOverlay, DisplayScheduler, cmap_colors
 
 
 class DLCLiveGUI(object):
@@ -71,6 +72,9 @@ class DLCLiveGUI(object):
         self.display_colors = None
         self.display_radius = None
         self.display_lik_thresh = None
+        self.display_skeleton = None
+        self.pose_overlay = None
+        self.display_scheduler = None
 
         ### create GUI window ###
 
@@ -235,7 +239,9 @@ class DLCLiveGUI(object):
 
                 cam_obj = getattr(camera, this_cam["type"])
                 cam = cam_obj(**this_cam["params"])
-                self.cam_pose_proc = CameraPoseProcess(cam)
+                self.cam_pose_proc = CameraPoseProcess(
+                    cam, **this_cam.get("process", {})
+                )
                 ret = self.cam_pose_proc.start_capture_process()
 
                 if cam.use_tk_display:
@@ -430,10 +436,15 @@ class DLCLiveGUI(object):
         self.display_window = Toplevel(self.window)
         self.display_frame_label = Label(self.display_window)
         self.display_frame_label.pack()
+        self.display_status = StringVar(self.display_window)
+        Label(self.display_window, textvariable=self.display_status).pack()
+        self.display_scheduler = DisplayScheduler(
+            self.cam_pose_proc.display_fps if self.cam_pose_proc else 30
+        )
         self.display_frame()
 
     def set_display_colors(self, bodyparts):
-        """ Set colors for keypoints
+        """ Set colors for keypoints, and create the overlay that draws them
 
         Parameters
         ----------
@@ -441,23 +452,28 @@ class DLCLiveGUI(object):
             the number of keypoints
         """
 
-        all_colors = getattr(cc, self.display_cmap)
-        self.display_colors = all_colors[:: int(len(all_colors) / bodyparts)]
+        self.display_colors = cmap_colors(self.display_cmap, bodyparts)
+        self.pose_overlay = PoseOverlay(
+            self.display_colors,
+            radius=self.display_radius,
+            lik_thresh=self.display_lik_thresh,
+            skeleton=self.display_skeleton,
+        )
 
     def display_frame(self):
-        """ Display a frame in display window
+        """ Display a frame in display window, if a new frame is available, and schedule the next redraw
         """
 
         if self.cam_pose_proc and self.display_window:
 
-            frame = self.cam_pose_proc.get_display_frame()
+            start = time.time()
+            scheduler = self.display_scheduler
 
-            if frame is not None:
+            frame, frame_time, seq = self.cam_pose_proc.read_display_frame(
+                scheduler.last_seq
+            )
 
-                img = Image.fromarray(frame)
-                if frame.ndim == 3:
-                    b, g, r = img.split()
-                    img = Image.merge("RGB", (r, g, b))
+            if frame is not None:
 
                 pose = (
                     self.cam_pose_proc.get_display_pose()
@@ -467,50 +483,22 @@ class DLCLiveGUI(object):
 
                 if pose is not None:
 
-                    im_size = (frame.shape[1], frame.shape[0])
-
-                    if not self.display_colors:
+                    if self.pose_overlay is None:
                         self.set_display_colors(pose.shape[0])
 
-                    img_draw = ImageDraw.Draw(img)
-
-                    for i in range(pose.shape[0]):
-                        if pose[i, 2] > self.display_lik_thresh:
-                            try:
-                                x0 = (
-                                    pose[i, 0] - self.display_radius
-                                    if pose[i, 0] - self.display_radius > 0
-                                    else 0
-                                )
-                                x1 = (
-                                    pose[i, 0] + self.display_radius
-                                    if pose[i, 0] + self.display_radius < im_size[1]
-                                    else im_size[1]
-                                )
-                                y0 = (
-                                    pose[i, 1] - self.display_radius
-                                    if pose[i, 1] - self.display_radius > 0
-                                    else 0
-                                )
-                                y1 = (
-                                    pose[i, 1] + self.display_radius
-                                    if pose[i, 1] + self.display_radius < im_size[0]
-                                    else im_size[0]
-                                )
-                                coords = [x0, y0, x1, y1]
-                                img_draw.ellipse(
-                                    coords,
-                                    fill=self.display_colors[i],
-                                    outline=self.display_colors[i],
-                                )
-                            except Exception as e:
-                                print(e)
+                    self.pose_overlay.draw(frame, pose)
 
+                img = Image.fromarray(frame)
                 imgtk = ImageTk.PhotoImage(image=img)
                 self.display_frame_label.imgtk = imgtk
                 self.display_frame_label.configure(image=imgtk)
 
-            self.display_frame_label.after(10, self.display_frame)
+                scheduler.drawn(seq, frame_time)
+                self.display_status.set(scheduler.status())
+
+            self.display_frame_label.after(
+                scheduler.next_delay(start, frame is not None), self.display_frame
+            )
 
     def change_display_keypoints(self):
         """ Toggle display keypoints. If turning on, set display options. If turning off, destroy display window
@@ -524,6 +512,8 @@ class DLCLiveGUI(object):
             self.display_cmap = display_options["cmap"]
             self.display_radius = display_options["radius"]
             self.display_lik_thresh = display_options["lik_thresh"]
+            self.display_skeleton = display_options.get("skeleton")
+            self.pose_overlay = None
 
             if not self.display_window:
                 self.set_display_window()
@@ -536,6 +526,7 @@ class DLCLiveGUI(object):
                         self.display_window.destroy()
                         self.display_window = None
                         self.display_colors = None
+                        self.pose_overlay = None
 
     def edit_dlc_display(self):
 
@@ -570,6 +561,8 @@ class DLCLiveGUI(object):
         self.display_cmap = display_options["cmap"]
         self.display_radius = display_options["radius"]
         self.display_lik_thresh = display_options["lik_thresh"]
+        self.display_skeleton = display_options.get("skeleton")
+        self.pose_overlay = None
 
         self.cfg["dlc_display_options"][self.dlc_option.get()] = display_options
         self.save_config()
@@ -1136,6 +1129,14 @@ class DLCLiveGUI(object):
 
         self.session_setup_window.destroy()
 
+        if not ret:
+            messagebox.showwarning(
+                "Video Writer Error",
+                f"Could not open the '{self.cam_pose_proc.writer}' video writer. Please check the writer settings of the camera.",
+                parent=self.window,
+            )
+            return
+
         ### set GUI to Ready
 
         self.record_on.set(0)
@@ -1155,6 +1156,8 @@ class DLCLiveGUI(object):
                 parent=self.window,
             )
             self.record_on.set(-1)
+        else:
+            self.update_record_status()
 
     def stop_record(self):
         """ Issues command to stop recording frames and poses
@@ -1164,6 +1167,27 @@ class DLCLiveGUI(object):
             ret = self.cam_pose_proc.stop_record()
             self.record_on.set(0)
 
+    def update_record_status(self):
+        """ Show the number of frames written, dropped and waiting to be written, while recording
+        """
+
+        if self.cam_pose_proc is not None:
+            write_stats = self.cam_pose_proc.get_write_stats()
+            status = f"written: {write_stats['written']}  dropped: {write_stats['dropped']}  queued: {write_stats['queued']}"
+            if write_stats["error"] is not None:
+                status = f"writer error! {status}"
+
+            queue_stats = self.cam_pose_proc.get_queue_stats()["write"]
+            if queue_stats is not None:
+                latency = queue_stats["latency_p99"]
+                status += f" (max {queue_stats['high_water']}"
+                status += f", p99 {latency*1000:0.0f} ms)" if latency else ")"
+
+            self.record_status.set(status)
+
+        if self.record_on.get() == 1:
+            self.window.after(500, self.update_record_status)
+
     def save_vid(self, delete=False):
         """ Saves video, timestamp, and DLC files
 
@@ -1216,16 +1240,33 @@ class DLCLiveGUI(object):
         else:
             ret = self.cam_pose_proc.stop_writer_process(save=True)
             ret_pose = self.cam_pose_proc.save_pose(self.base_name)
+            write_stats = self.cam_pose_proc.get_write_stats()
+            dropped_msg = (
+                f"\n\nWarning: {write_stats['dropped']} frames could not be written and were dropped."
+                f" The video writer encoded {write_stats['encode_fps']:.0f} frames per second."
+                if write_stats["dropped"] > 0
+                else ""
+            )
             if ret:
                 if ret_pose:
                     messagebox.showinfo(
                         "Files Saved",
-                        "Video, timestamp, and DLC Files have been saved.",
+                        "Video, timestamp, and DLC Files have been saved."
+                        + dropped_msg,
                     )
                 else:
                     messagebox.showinfo(
-                        "Files Saved", "Video and timestamp files have been saved."
+                        "Files Saved",
+                        "Video and timestamp files have been saved." + dropped_msg,
                     )
+            elif (write_stats["error"] is not None) and (write_stats["written"] > 0):
+                messagebox.showwarning(
+                    "Video Writer Error",
+                    f"The video writer failed: {write_stats['error']}"
+                    "\n\nFrames written before the error have been saved."
+                    + dropped_msg,
+                    parent=self.window,
+                )
             else:
                 messagebox.showwarning(
                     "No Frames Recorded",
@@ -1463,6 +1504,10 @@ class DLCLiveGUI(object):
             value=-1,
             command=self.stop_record,
         ).grid(sticky="nsew", row=cur_row + 2, column=1)
+        self.record_status = StringVar(value="")
+        Label(self.window, textvariable=self.record_status).grid(
+            sticky="w", row=cur_row, column=2
+        )
         Button(self.window, text="Save Video", command=lambda: self.save_vid()).grid(
             sticky="nsew", row=cur_row + 1, column=2
         )
@@ -0,0 +1,294 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import ctypes
+import multiprocess as mp
+import numpy as np
+
+from dlclivegui.timing import DEFAULT_SPIN_THRESHOLD, wait_for
+
+
+class FrameBufferError(Exception):
+    """
+    Exception for incorrect use of the frame ring buffer
+    """
+
+    pass
+
+
+class FrameRingBuffer(object):
+    """ A ring of frame slots in shared memory, written by a single capture process and read by any number of consumers.
+
+    Every frame written to the ring gets a sequence number (0, 1, 2, ...). Frame ``seq`` is stored in slot ``seq % n_slots`` together with its capture timestamp.
+    While a slot is being written its sequence number is set to -1, so a reader can detect a torn frame by checking the slot's sequence number before and after reading.
+    The timestamps of the last `time_history` frames are kept after their frames have been overwritten, so consumers can account for frames they missed.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of a single frame, e.g. (height, width, 3)
+    n_slots : int, optional
+        number of frame slots in the ring, by default 4
+    dtype : str, optional
+        frame data type, by default "uint8"
+    time_history : int, optional
+        number of frame timestamps to keep, by default 4096
+    ctx : :class:`multiprocess.Context`
+        multiprocessing context
+    """
+
+    def __init__(
+        self,
+        shape,
+        n_slots=4,
+        dtype="uint8",
+        time_history=4096,
+        ctx=mp.get_context("spawn"),
+    ):
+        """ Constructor method
+        """
+
+        if n_slots < 1:
+            raise FrameBufferError("A frame ring buffer needs at least one slot.")
+
+        self.shape = tuple(int(s) for s in shape)
+        self.n_slots = int(n_slots)
+        self.dtype = np.dtype(dtype)
+        self.time_history = max(int(time_history), self.n_slots)
+
+        frame_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._frames_shared = ctx.RawArray(ctypes.c_uint8, self.n_slots * frame_bytes)
+        self._times_shared = ctx.RawArray(ctypes.c_double, self.n_slots)
+        self._seqs_shared = ctx.RawArray(ctypes.c_int64, self.n_slots)
+        self._head_shared = ctx.RawArray(ctypes.c_int64, 1)
+        self._history_shared = ctx.RawArray(ctypes.c_double, self.time_history)
+
+        self._attach()
+
+        self._seqs[:] = -1
+        self._head[0] = -1
+
+    def _attach(self):
+        """ Create numpy views on the shared arrays
+        """
+
+        self._frames = np.frombuffer(self._frames_shared, dtype=self.dtype).reshape(
+            (self.n_slots,) + self.shape
+        )
+        self._times = np.frombuffer(self._times_shared, dtype="d")
+        self._seqs = np.frombuffer(self._seqs_shared, dtype=np.int64)
+        self._head = np.frombuffer(self._head_shared, dtype=np.int64)
+        self._history = np.frombuffer(self._history_shared, dtype="d")
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        for k in ["_frames", "_times", "_seqs", "_head", "_history"]:
+            state.pop(k, None)
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._attach()
+
+    @property
+    def latest_seq(self):
+        """ Sequence number of the newest complete frame, or -1 if no frame has been written
+        """
+
+        return int(self._head[0])
+
+    def write(self, frame, timestamp):
+        """ Copy a frame into the next slot of the ring. Must only be called from one process.
+
+        Parameters
+        ----------
+        frame : :class:`numpy.ndarray`
+            the frame; must be broadcastable to the ring's frame shape
+        timestamp : float
+            capture timestamp of the frame
+
+        Returns
+        -------
+        int
+            sequence number of the written frame
+        """
+
+        seq = int(self._head[0]) + 1
+        slot = seq % self.n_slots
+
+        self._seqs[slot] = -1
+        np.copyto(self._frames[slot], frame, casting="unsafe")
+        self._times[slot] = timestamp
+        self._history[seq % self.time_history] = timestamp
+        self._seqs[slot] = seq
+        self._head[0] = seq
+
+        return seq
+
+    def wait_for_frame(
+        self,
+        last_seq,
+        timeout=None,
+        spin_threshold=DEFAULT_SPIN_THRESHOLD,
+        poll_interval=0.0005,
+    ):
+        """ Wait until a frame newer than `last_seq` has been written.
+        Checks the ring's sequence number in a loop for `spin_threshold` seconds, then every `poll_interval` seconds.
+        Consumers poll rather than waiting on a lock, so writing a frame never blocks the capture process.
+
+        Parameters
+        ----------
+        last_seq : int
+            sequence number of the last frame the consumer has read
+        timeout : float, optional
+            maximum time to wait in seconds, by default None (wait forever)
+        spin_threshold : float, optional
+            time to check for a new frame before sleeping between checks, in seconds, by default 0.001
+        poll_interval : float, optional
+            time to sleep between checks after spinning, in seconds, by default 0.0005
+
+        Returns
+        -------
+        bool
+            True if a new frame is available, False if the timeout expired
+        """
+
+        return wait_for(
+            lambda: self.latest_seq > last_seq,
+            timeout=timeout,
+            spin_threshold=spin_threshold,
+            poll_interval=poll_interval,
+        )
+
+    def timestamp(self, seq):
+        """ Get the timestamp of frame ``seq``, which may already have been overwritten in the ring
+
+        Parameters
+        ----------
+        seq : int
+            sequence number of the frame
+
+        Returns
+        -------
+        float
+            the frame's timestamp, or None if the frame has not been written or is older than the last `time_history` frames
+        """
+
+        head = self.latest_seq
+        if (seq < 0) or (seq > head) or (head - seq >= self.time_history):
+            return None
+
+        return float(self._history[seq % self.time_history])
+
+    def is_valid(self, seq):
+        """ Check that frame ``seq`` is still intact in the ring, i.e. has been written and not yet overwritten
+
+        Parameters
+        ----------
+        seq : int
+            sequence number of the frame
+
+        Returns
+        -------
+        bool
+            True if the frame can still be read
+        """
+
+        return (seq >= 0) and (int(self._seqs[seq % self.n_slots]) == seq)
+
+    def read(self, seq, out=None):
+        """ Read a specific frame from the ring
+
+        Without ``out``, a view on the shared slot is returned (no copy). The view remains valid only until the capture process wraps around the ring, which can be checked with :meth:`is_valid`.
+        With ``out``, the frame is copied into ``out`` and checked for tearing.
+
+        Parameters
+        ----------
+        seq : int
+            sequence number of the frame
+        out : :class:`numpy.ndarray`, optional
+            preallocated array to copy the frame into, by default None
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the frame, or None if the frame is not (or no longer) in the ring
+        float
+            the frame's timestamp, or None
+        """
+
+        if not self.is_valid(seq):
+            return None, None
+
+        slot = seq % self.n_slots
+        timestamp = float(self._times[slot])
+
+        if out is None:
+            frame = self._frames[slot]
+        else:
+            np.copyto(out, self._frames[slot])
+            frame = out
+
+        if not self.is_valid(seq):
+            return None, None
+
+        return frame, timestamp
+
+    def read_latest(self, out=None, retries=3):
+        """ Read the newest complete frame in the ring
+
+        Parameters
+        ----------
+        out : :class:`numpy.ndarray`, optional
+            preallocated array to copy the frame into, by default None (return a view on the shared slot)
+        retries : int, optional
+            number of times to retry if the frame is overwritten while reading, by default 3
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the frame, or None if no frame is available
+        float
+            the frame's timestamp, or None
+        int
+            the frame's sequence number, or -1
+        """
+
+        for _ in range(retries + 1):
+            seq = self.latest_seq
+            if seq < 0:
+                break
+            frame, timestamp = self.read(seq, out=out)
+            if frame is not None:
+                return frame, timestamp, seq
+
+        return None, None, -1
+
+    def available(self, last_seq):
+        """ Sequence numbers of frames written after ``last_seq`` that are still in the ring
+
+        Parameters
+        ----------
+        last_seq : int
+            sequence number of the last frame the consumer has read
+
+        Returns
+        -------
+        range
+            sequence numbers of frames available to read, oldest first
+        int
+            number of frames written after ``last_seq`` that have already been overwritten
+        """
+
+        head = self.latest_seq
+        first = max(last_seq + 1, head - self.n_slots + 1, 0)
+        missed = first - (last_seq + 1) if head > last_seq else 0
+
+        return range(first, head + 1), max(missed, 0)
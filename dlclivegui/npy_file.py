@@ -0,0 +1,179 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import os
+import numpy as np
+
+
+class NpyFileError(Exception):
+    """
+    Exception for incorrect use of growable .npy files
+    """
+
+    pass
+
+
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+NPY_HEADER_SIZE = 128
+
+
+def npy_header(dtype, shape):
+    """ Create a fixed size version 1.0 .npy header, so the header can be rewritten in place as the array grows
+
+    Parameters
+    ----------
+    dtype : :class:`numpy.dtype`
+        data type of the array
+    shape : tuple
+        shape of the array
+
+    Returns
+    -------
+    bytes
+        the header, `NPY_HEADER_SIZE` bytes long
+    """
+
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+        np.lib.format.dtype_to_descr(np.dtype(dtype)), tuple(shape)
+    )
+    n_pad = NPY_HEADER_SIZE - len(NPY_MAGIC) - 2 - len(header) - 1
+    if n_pad < 0:
+        raise NpyFileError(f"The .npy header for shape {shape} is too long.")
+
+    header = (header + " " * n_pad + "\n").encode("latin1")
+
+    return NPY_MAGIC + len(header).to_bytes(2, "little") + header
+
+
+class NpyAppender(object):
+    """ Appends rows to a .npy file.
+
+    Rows are collected in a small preallocated buffer, which is appended to the file when full. After every write, the array shape in the file header is updated,
+    so the file is always a valid .npy file that can be read with :func:`numpy.load`, and at most one buffer of rows is lost if the process crashes.
+
+    Parameters
+    ----------
+    filename : str
+        path to the .npy file. An existing file is overwritten.
+    dtype : str, optional
+        data type of the array, by default "float64"
+    row_shape : tuple, optional
+        shape of each row, by default () (a 1d array)
+    flush_every : int, optional
+        number of rows to buffer before writing to the file, by default 64
+    """
+
+    def __init__(self, filename, dtype="float64", row_shape=(), flush_every=64):
+        """ Constructor method
+        """
+
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.n_rows = 0
+
+        self._buffer = np.empty((flush_every,) + self.row_shape, dtype=self.dtype)
+        self._n = 0
+
+        self._file = open(self.filename, "wb")
+        self._file.write(npy_header(self.dtype, (0,) + self.row_shape))
+
+    def __len__(self):
+
+        return self.n_rows + self._n
+
+    def append(self, row):
+        """ Append a row to the array
+
+        Parameters
+        ----------
+        row : scalar or :class:`numpy.ndarray`
+            the row, of shape `row_shape`
+        """
+
+        self._buffer[self._n] = row
+        self._n += 1
+
+        if self._n == self._buffer.shape[0]:
+            self.flush()
+
+    def write(self, rows):
+        """ Append several rows to the array, bypassing the buffer
+
+        Parameters
+        ----------
+        rows : :class:`numpy.ndarray`
+            array of shape (n_rows,) + `row_shape`
+        """
+
+        self.flush()
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        self._file.write(rows.data)
+        self.n_rows += rows.shape[0]
+        self._write_header()
+
+    def flush(self):
+        """ Write buffered rows to the file and update the header
+        """
+
+        if self._n > 0:
+            self._file.write(self._buffer[: self._n].data)
+            self.n_rows += self._n
+            self._n = 0
+            self._write_header()
+
+    def _write_header(self):
+
+        self._file.flush()
+        self._file.seek(0)
+        self._file.write(npy_header(self.dtype, (self.n_rows,) + self.row_shape))
+        self._file.seek(0, os.SEEK_END)
+        self._file.flush()
+
+    def close(self):
+        """ Write buffered rows and close the file
+        """
+
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+
+def recover_npy(filename):
+    """ Update the header of a .npy file written by :class:`NpyAppender` to include all complete rows in the file,
+    e.g. rows that were written after the last header update before a crash.
+
+    Parameters
+    ----------
+    filename : str
+        path to the .npy file
+
+    Returns
+    -------
+    int
+        number of rows in the recovered array
+    """
+
+    with open(filename, "rb") as f:
+        if np.lib.format.read_magic(f) != (1, 0):
+            raise NpyFileError(f"{filename} was not written by NpyAppender.")
+        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+        offset = f.tell()
+
+    if offset != NPY_HEADER_SIZE:
+        raise NpyFileError(f"{filename} was not written by NpyAppender.")
+
+    row_shape = tuple(shape[1:])
+    row_bytes = int(np.prod(row_shape, dtype=np.int64)) * dtype.itemsize
+    n_rows = (os.path.getsize(filename) - offset) // row_bytes
+
+    with open(filename, "r+b") as f:
+        f.write(npy_header(dtype, (n_rows,) + row_shape))
+        f.truncate(offset + n_rows * row_bytes)
+
+    return n_rows
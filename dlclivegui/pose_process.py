@@ -7,13 +7,18 @@ Licensed under GNU Lesser General Public License v3.0
 
 
 import multiprocess as mp
-import threading
 import time
-import pandas as pd
 import numpy as np
+import ctypes
 
 from dlclivegui import CameraProcess
-from dlclivegui.queue import ClearableQueue, ClearableMPQueue
+from dlclivegui.queue import SharedMailbox
+from dlclivegui.control import CommandChannel
+from dlclivegui.timing import LoopMonitor
+from dlclivegui.pose_recorder import PoseRecorder, StreamingPoseRecorder
+
+
+MAX_DISPLAY_KEYPOINTS = 1024
 
 
 class DLCLiveProcessError(Exception):
@@ -24,6 +29,36 @@ class DLCLiveProcessError(Exception):
     pass
 
 
+def create_dlc_live(dlc_params):
+    """ Create a :class:`dlclive.DLCLive` object from DeepLabCut-live-GUI parameters
+
+    Parameters
+    ----------
+    dlc_params : dict
+        DeepLabCut-live parameters from the GUI configuration, including "mode" and "processor" entries.
+        "mode" and "processor" are removed from the dictionary.
+
+    Returns
+    -------
+    :class:`dlclive.DLCLive`
+        the DLCLive object (inference is not initialized)
+    bool
+        True if the mode is "Optimize Rate"
+    """
+
+    from dlclive import DLCLive
+
+    opt_rate = True if dlc_params.pop("mode") == "Optimize Rate" else False
+
+    proc_params = dlc_params.pop("processor")
+    if proc_params is not None:
+        proc_obj = proc_params.pop("object", None)
+        if proc_obj is not None:
+            dlc_params["processor"] = proc_obj(**proc_params)
+
+    return DLCLive(**dlc_params), opt_rate
+
+
 class CameraPoseProcess(CameraProcess):
     """ Camera Process Manager class. Controls image capture, pose estimation and writing images to a video file in a background process.
 
@@ -33,71 +68,82 @@ class CameraPoseProcess(CameraProcess):
         a camera object
     ctx : :class:`multiprocess.Context`
         multiprocessing context
+    pose_chunk_size : int, optional
+        number of poses per preallocated chunk of the pose recorder, by default 4096
+    stream_poses : bool, optional
+        If True, poses are appended to `{filename}_DLC.hdf5` in chunks of `stream_chunk_size` while recording, instead of being kept in memory until they are saved.
+        By default False
+    stream_chunk_size : int, optional
+        number of poses per chunk written to disk when `stream_poses` is True, by default 256
+    **kwargs
+        additional keyword arguments (e.g. buffer_size, write_mode) are passed to :class:`CameraProcess`
     """
 
-    def __init__(self, device, ctx=mp.get_context("spawn")):
+    def __init__(
+        self,
+        device,
+        ctx=mp.get_context("spawn"),
+        pose_chunk_size=4096,
+        stream_poses=False,
+        stream_chunk_size=256,
+        **kwargs,
+    ):
         """ Constructor method
         """
 
-        super().__init__(device, ctx)
+        super().__init__(device, ctx, **kwargs)
+        self.pose_chunk_size = pose_chunk_size
+        self.stream_poses = stream_poses
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_filename = None
+        self.channels["pose"] = CommandChannel("pose", ctx=self.ctx)
+        self.cpu_usage["pose"] = self.ctx.RawValue(ctypes.c_double, 0)
         self.display_pose = None
-        self.display_pose_queue = ClearableMPQueue(2, ctx=self.ctx)
+        self.display_pose_version = 0
+        self.display_pose_mailbox = SharedMailbox(
+            (MAX_DISPLAY_KEYPOINTS, 3), ctx=self.ctx
+        )
         self.pose_process = None
 
     def start_pose_process(self, dlc_params, timeout=300):
 
+        self.channels["pose"].clear()
+
         self.pose_process = self.ctx.Process(
-            target=self._run_pose,
-            args=(self.frame_shared, self.frame_time_shared, dlc_params),
-            daemon=True,
+            target=self._run_pose, args=(self.frame_buffer, dlc_params), daemon=True,
         )
         self.pose_process.start()
 
-        stime = time.time()
-        while time.time() - stime < timeout:
-            cmd = self.q_from_process.read()
-            if cmd is not None:
-                if (cmd[0] == "pose") and (cmd[1] == "start"):
-                    return cmd[2]
-                else:
-                    self.q_to_process.write(cmd)
+        resp = self.channels["pose"].wait("start", timeout=timeout)
+        if resp is not None:
+            if resp.result and (self.stream_filename is not None):
+                self._start_pose_stream(self.stream_filename)
+            return resp.result
 
-    def _run_pose(self, frame_shared, frame_time, dlc_params):
+    def _run_pose(self, frame_buffer, dlc_params):
 
-        res = self.device.im_size
-        self.frame = np.frombuffer(frame_shared.get_obj(), dtype="uint8").reshape(
-            res[1], res[0], 3
-        )
-        self.frame_time = np.frombuffer(frame_time.get_obj(), dtype="d")
+        self.frame_buffer = frame_buffer
+        self.frame = np.zeros(self.frame_buffer.shape, dtype=self.frame_buffer.dtype)
 
         ret = self._open_dlc_live(dlc_params)
-        self.q_from_process.write(("pose", "start", ret))
+        self.channels["pose"].notify("start", ret)
 
         self._pose_loop()
-        self.q_from_process.write(("pose", "end"))
+        self.channels["pose"].notify("end")
 
     def _open_dlc_live(self, dlc_params):
 
-        from dlclive import DLCLive
-
         ret = False
 
-        self.opt_rate = True if dlc_params.pop("mode") == "Optimize Rate" else False
-
-        proc_params = dlc_params.pop("processor")
-        if proc_params is not None:
-            proc_obj = proc_params.pop("object", None)
-            if proc_obj is not None:
-                dlc_params["processor"] = proc_obj(**proc_params)
-
-        self.dlc = DLCLive(**dlc_params)
+        self.dlc, self.opt_rate = create_dlc_live(dlc_params)
+        _, frame_time, _ = self.frame_buffer.read_latest(out=self.frame)
         if self.frame is not None:
             self.dlc.init_inference(
-                self.frame, frame_time=self.frame_time[0], record=False
+                self.frame,
+                frame_time=frame_time if frame_time is not None else 0,
+                record=False,
             )
-            self.poses = []
-            self.pose_times = []
-            self.pose_frame_times = []
+            self.pose_recorder = PoseRecorder(self.pose_chunk_size)
             ret = True
 
         return ret
@@ -108,41 +154,102 @@ class CameraPoseProcess(CameraProcess):
 
         run = True
         write = False
+        frame_seq = -1
         frame_time = 0
         pose_time = 0
         end_time = time.time()
+        channel = self.channels["pose"]
+        monitor = LoopMonitor(self.cpu_usage["pose"])
 
         while run:
 
             ref_time = frame_time if self.opt_rate else end_time
 
-            if self.frame_time[0] > ref_time:
-
-                frame = self.frame
-                frame_time = self.frame_time[0]
-                pose = self.dlc.get_pose(frame, frame_time=frame_time, record=write)
-                pose_time = time.time()
-
-                self.display_pose_queue.write(pose, clear=True)
-
-                if write:
-                    self.poses.append(pose)
-                    self.pose_times.append(pose_time)
-                    self.pose_frame_times.append(frame_time)
-
-                cmd = self.q_to_process.read()
-                if cmd is not None:
-                    if cmd[0] == "pose":
-                        if cmd[1] == "write":
-                            write = cmd[2]
-                            self.q_from_process.write(cmd)
-                        elif cmd[1] == "save":
-                            ret = self._save_pose(cmd[2])
-                            self.q_from_process.write(cmd + (ret,))
-                        elif cmd[1] == "end":
-                            run = False
-                    else:
-                        self.q_to_process.write(cmd)
+            if self.frame_buffer.wait_for_frame(
+                frame_seq, timeout=0.1, spin_threshold=self.spin_threshold
+            ):
+
+                ### copy the newest frame out of the ring, so it can't be overwritten during inference
+
+                frame, new_frame_time, new_seq = self.frame_buffer.read_latest(
+                    out=self.frame
+                )
+
+                if (frame is not None) and (new_frame_time > ref_time):
+
+                    frame_seq = new_seq
+                    frame_time = new_frame_time
+                    pose = self.dlc.get_pose(frame, frame_time=frame_time, record=write)
+                    pose_time = time.time()
+
+                    self.display_pose_mailbox.write(pose, pose_time)
+
+                    if write:
+                        self.pose_recorder.append(pose, frame_time, pose_time)
+
+                elif frame is not None:
+
+                    frame_seq = new_seq
+
+            monitor.tick()
+
+            cmd = channel.poll()
+            if cmd is not None:
+                if cmd.name == "write":
+                    write = cmd.args[0]
+                    channel.reply(cmd, write)
+                elif cmd.name == "save":
+                    ret = self._save_pose(cmd.args[0])
+                    channel.reply(cmd, ret)
+                elif cmd.name == "stream":
+                    self.pose_recorder.clear()
+                    self.pose_recorder = StreamingPoseRecorder(
+                        cmd.args[0],
+                        self.dlc.cfg["all_joints_names"],
+                        self.stream_chunk_size,
+                    )
+                    channel.reply(cmd, True)
+                elif cmd.name == "discard":
+                    self.pose_recorder.clear()
+                    self.pose_recorder = PoseRecorder(self.pose_chunk_size)
+                    channel.reply(cmd, True)
+                elif cmd.name == "end":
+                    run = False
+
+        if isinstance(self.pose_recorder, StreamingPoseRecorder):
+            self.pose_recorder.close()
+
+    def start_writer_process(self, filename, timeout=60):
+
+        ret = super().start_writer_process(filename, timeout=timeout)
+
+        if self.stream_poses:
+            self.stream_filename = filename
+            self._start_pose_stream(filename, timeout=timeout)
+
+        return ret
+
+    def stop_writer_process(self, save=True, timeout=None):
+
+        ret = super().stop_writer_process(save=save, timeout=timeout)
+
+        if (self.stream_filename is not None) and (not save):
+            if (self.pose_process is not None) and self.pose_process.is_alive():
+                self.channels["pose"].request("discard", timeout=timeout)
+        self.stream_filename = None
+
+        return ret
+
+    def _start_pose_stream(self, filename, timeout=5):
+        """ Tell the pose process to write poses recorded from now on to `{filename}_DLC.hdf5`
+        """
+
+        ret = False
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            resp = self.channels["pose"].request("stream", filename, timeout=timeout)
+            ret = resp.result if resp is not None else False
+
+        return ret
 
     def start_record(self, timeout=5):
 
@@ -150,17 +257,8 @@ class CameraPoseProcess(CameraProcess):
 
         if (self.pose_process is not None) and (self.writer_process is not None):
             if (self.pose_process.is_alive()) and (self.writer_process.is_alive()):
-                self.q_to_process.write(("pose", "write", True))
-
-                stime = time.time()
-                while time.time() - stime < timeout:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if (cmd[0] == "pose") and (cmd[1] == "write"):
-                            ret = cmd[2]
-                            break
-                        else:
-                            self.q_from_process.write(cmd)
+                resp = self.channels["pose"].request("write", True, timeout=timeout)
+                ret = resp.result if resp is not None else False
 
         return ret
 
@@ -170,35 +268,18 @@ class CameraPoseProcess(CameraProcess):
 
         if (self.pose_process is not None) and (self.writer_process is not None):
             if (self.pose_process.is_alive()) and (self.writer_process.is_alive()):
-                self.q_to_process.write(("pose", "write", False))
-
-                stime = time.time()
-                while time.time() - stime < timeout:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if (cmd[0] == "pose") and (cmd[1] == "write"):
-                            ret = not cmd[2]
-                            break
-                        else:
-                            self.q_from_process.write(cmd)
+                resp = self.channels["pose"].request("write", False, timeout=timeout)
+                ret = (not resp.result) if resp is not None else False
 
         return ret
 
-    def stop_pose_process(self):
+    def stop_pose_process(self, timeout=None):
 
         ret = True
         if self.pose_process is not None:
             if self.pose_process.is_alive():
-                self.q_to_process.write(("pose", "end"))
-
-                while True:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if cmd[0] == "pose":
-                            if cmd[1] == "end":
-                                break
-                        else:
-                            self.q_from_process.write(cmd)
+                self.channels["pose"].send("end")
+                self.channels["pose"].wait("end", timeout=timeout)
 
                 self.pose_process.join(5)
                 if self.pose_process.is_alive():
@@ -211,17 +292,9 @@ class CameraPoseProcess(CameraProcess):
         ret = False
         if self.pose_process is not None:
             if self.pose_process.is_alive():
-                self.q_to_process.write(("pose", "save", filename))
-
-                stime = time.time()
-                while time.time() - stime < timeout:
-                    cmd = self.q_from_process.read()
-                    if cmd is not None:
-                        if (cmd[0] == "pose") and (cmd[1] == "save"):
-                            ret = cmd[3]
-                            break
-                        else:
-                            self.q_from_process.write(cmd)
+                resp = self.channels["pose"].request("save", filename, timeout=timeout)
+                if resp is not None:
+                    ret = resp.result
         return ret
 
     def _save_pose(self, filename):
@@ -235,36 +308,31 @@ class CameraPoseProcess(CameraProcess):
 
         ret = False
 
-        if len(self.pose_times) > 0:
+        if len(self.pose_recorder) > 0:
 
-            dlc_file = f"{filename}_DLC.hdf5"
             proc_file = f"{filename}_PROC"
 
-            bodyparts = self.dlc.cfg["all_joints_names"]
-            poses = np.array(self.poses)
-            poses = poses.reshape((poses.shape[0], poses.shape[1] * poses.shape[2]))
-            pdindex = pd.MultiIndex.from_product(
-                [bodyparts, ["x", "y", "likelihood"]], names=["bodyparts", "coords"]
-            )
-            pose_df = pd.DataFrame(poses, columns=pdindex)
-            pose_df["frame_time"] = self.pose_frame_times
-            pose_df["pose_time"] = self.pose_times
-
-            pose_df.to_hdf(dlc_file, key="df_with_missing", mode="w")
+            self.pose_recorder.save(filename, self.dlc.cfg["all_joints_names"])
             if self.dlc.processor is not None:
                 self.dlc.processor.save(proc_file)
 
-            self.poses = []
-            self.pose_times = []
-            self.pose_frame_times = []
-
             ret = True
 
+        ### a streamed pose file is complete once saved, so later poses are kept in memory until a new file is set up
+
+        if isinstance(self.pose_recorder, StreamingPoseRecorder):
+            self.pose_recorder = PoseRecorder(self.pose_chunk_size)
+        else:
+            self.pose_recorder.clear()
+
         return ret
 
     def get_display_pose(self):
 
-        pose = self.display_pose_queue.read(clear=True)
+        if self.display_pose_mailbox.version == self.display_pose_version:
+            return self.display_pose
+
+        pose, _, self.display_pose_version = self.display_pose_mailbox.read()
         if pose is not None:
             self.display_pose = pose
             if self.device.display_resize != 1:
@@ -0,0 +1,289 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+from dlclivegui.queue import ClearableQueue
+
+
+def pose_dataframe(bodyparts, poses, frame_times, pose_times):
+    """ Create the pandas data frame used to store poses in `{filename}_DLC.hdf5`
+
+    Parameters
+    ----------
+    bodyparts : list
+        names of the bodyparts
+    poses : :class:`numpy.ndarray`
+        array of poses, of shape (n_poses, n_bodyparts, 3) or (n_poses, n_bodyparts * 3)
+    frame_times : :class:`numpy.ndarray`
+        timestamp of the frame used for each pose
+    pose_times : :class:`numpy.ndarray`
+        time each pose was obtained
+
+    Returns
+    -------
+    :class:`pandas.DataFrame`
+        data frame with a (bodyparts, coords) column for every keypoint coordinate, and "frame_time" and "pose_time" columns
+    """
+
+    poses = np.asarray(poses)
+    poses = poses.reshape((poses.shape[0], -1))
+    pdindex = pd.MultiIndex.from_product(
+        [bodyparts, ["x", "y", "likelihood"]], names=["bodyparts", "coords"]
+    )
+    pose_df = pd.DataFrame(poses, columns=pdindex)
+    pose_df["frame_time"] = frame_times
+    pose_df["pose_time"] = pose_times
+
+    return pose_df
+
+
+def save_pose_data(filename, bodyparts, poses, frame_times, pose_times):
+    """ Save poses to a pandas data frame in `{filename}_DLC.hdf5`
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    bodyparts : list
+        names of the bodyparts
+    poses : :class:`numpy.ndarray`
+        array of poses, of shape (n_poses, n_bodyparts, 3) or (n_poses, n_bodyparts * 3)
+    frame_times : :class:`numpy.ndarray`
+        timestamp of the frame used for each pose
+    pose_times : :class:`numpy.ndarray`
+        time each pose was obtained
+    """
+
+    pose_df = pose_dataframe(bodyparts, poses, frame_times, pose_times)
+    pose_df.to_hdf(f"{filename}_DLC.hdf5", key="df_with_missing", mode="w")
+
+
+class PoseRecorder(object):
+    """ Records poses in preallocated numpy chunks.
+
+    Each row of a chunk holds one flattened pose followed by its frame time and pose time. When a chunk is full, a new chunk is allocated,
+    so appending a pose never copies previously recorded poses and no Python object is created per pose.
+
+    Parameters
+    ----------
+    chunk_size : int, optional
+        number of poses per chunk, by default 4096
+    """
+
+    def __init__(self, chunk_size=4096):
+        """ Constructor method
+        """
+
+        self.chunk_size = chunk_size
+        self.n_cols = None
+        self.chunks = []
+        self._chunk = None
+        self._n = 0
+
+    def __len__(self):
+
+        return len(self.chunks) * self.chunk_size + self._n
+
+    def append(self, pose, frame_time, pose_time):
+        """ Record a pose
+
+        Parameters
+        ----------
+        pose : :class:`numpy.ndarray`
+            the pose, of shape (n_bodyparts, 3)
+        frame_time : float
+            timestamp of the frame used for the pose
+        pose_time : float
+            time the pose was obtained
+        """
+
+        if self._chunk is None:
+            self.n_cols = pose.size + 2
+            self._chunk = np.empty((self.chunk_size, self.n_cols))
+
+        row = self._chunk[self._n]
+        row[:-2] = pose.ravel()
+        row[-2] = frame_time
+        row[-1] = pose_time
+        self._n += 1
+
+        if self._n == self.chunk_size:
+            self._chunk_full(self._chunk)
+            self._chunk = np.empty((self.chunk_size, self.n_cols))
+            self._n = 0
+
+    def _chunk_full(self, chunk):
+        """ Store a full chunk
+        """
+
+        self.chunks.append(chunk)
+
+    def to_array(self):
+        """ Get all recorded poses as a single array
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            array of shape (n_poses, n_bodyparts * 3 + 2); the last two columns are the frame time and pose time
+        """
+
+        if self._chunk is None:
+            return np.empty((0, 2))
+
+        return np.concatenate(self.chunks + [self._chunk[: self._n]])
+
+    def save(self, filename, bodyparts):
+        """ Save the recorded poses to `{filename}_DLC.hdf5`
+
+        Parameters
+        ----------
+        filename : str
+            path and base file name
+        bodyparts : list
+            names of the bodyparts
+
+        Returns
+        -------
+        bool
+            True if any poses were saved
+        """
+
+        if len(self) == 0:
+            return False
+
+        data = self.to_array()
+        save_pose_data(filename, bodyparts, data[:, :-2], data[:, -2], data[:, -1])
+
+        return True
+
+    def clear(self):
+        """ Discard all recorded poses
+        """
+
+        self.chunks = []
+        self._n = 0
+
+
+class StreamingPoseRecorder(PoseRecorder):
+    """ Records poses in preallocated numpy chunks, and appends every full chunk to `{filename}_DLC.hdf5` from a background thread while recording.
+
+    The file is a pandas HDF5 table with the same columns as the data frame saved by :class:`PoseRecorder`, so it can be read with :func:`pandas.read_hdf` at any time.
+    The file is closed after every chunk, so at most one chunk of poses is lost if the process crashes, and saving only has to append the last partial chunk.
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    bodyparts : list
+        names of the bodyparts
+    chunk_size : int, optional
+        number of poses per chunk, by default 256
+    """
+
+    def __init__(self, filename, bodyparts, chunk_size=256):
+        """ Constructor method
+        """
+
+        super().__init__(chunk_size)
+        self.filename = filename
+        self.pose_file = f"{filename}_DLC.hdf5"
+        self.bodyparts = list(bodyparts)
+        self._n_streamed = 0
+
+        if os.path.isfile(self.pose_file):
+            os.remove(self.pose_file)
+
+        self._chunk_queue = ClearableQueue()
+        self._thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+
+        return self._n_streamed + self._n
+
+    def _chunk_full(self, chunk):
+        """ Hand a full chunk to the writer thread
+        """
+
+        self._chunk_queue.put((self._n_streamed, chunk))
+        self._n_streamed += chunk.shape[0]
+
+    def _write_chunks(self):
+        """ Append chunks to the pose file until the recorder is closed
+        """
+
+        while True:
+
+            item = self._chunk_queue.get()
+            if item is None:
+                break
+
+            start, chunk = item
+            pose_df = pose_dataframe(
+                self.bodyparts, chunk[:, :-2], chunk[:, -2], chunk[:, -1]
+            )
+            pose_df.index = pd.RangeIndex(start, start + chunk.shape[0])
+
+            ### the file is only open while a chunk is appended, so it is complete and readable between chunks, even if the process crashes
+
+            with pd.HDFStore(self.pose_file, mode="a") as store:
+                store.append("df_with_missing", pose_df, format="table")
+
+    def close(self):
+        """ Write the remaining poses to the pose file and stop the writer thread
+        """
+
+        if self._thread.is_alive():
+            if self._n > 0:
+                self._chunk_full(self._chunk[: self._n].copy())
+                self._n = 0
+            self._chunk_queue.put(None)
+            self._thread.join()
+
+    def to_array(self):
+        """ Get all recorded poses as a single array. Closes the recorder.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            array of shape (n_poses, n_bodyparts * 3 + 2); the last two columns are the frame time and pose time
+        """
+
+        self.close()
+
+        if not os.path.isfile(self.pose_file):
+            return np.empty((0, 2))
+
+        return pd.read_hdf(self.pose_file).values
+
+    def save(self, filename=None, bodyparts=None):
+        """ Write the remaining poses to `{filename}_DLC.hdf5` and close the recorder.
+        Poses are always written to the file the recorder was created with, so `filename` and `bodyparts` are only accepted for compatibility with :meth:`PoseRecorder.save`.
+
+        Returns
+        -------
+        bool
+            True if any poses were saved
+        """
+
+        self.close()
+
+        return self._n_streamed > 0
+
+    def clear(self):
+        """ Close the recorder and delete the pose file
+        """
+
+        self.close()
+        self._n_streamed = 0
+        if os.path.isfile(self.pose_file):
+            os.remove(self.pose_file)
@@ -1,6 +1,15 @@
+import os
+import mmap
+import time
+import uuid
+import ctypes
+import tempfile
 import multiprocess as mp
 from multiprocess import queues
 from queue import Queue, Empty, Full
+import numpy as np
+
+from dlclivegui.timing import wait_for
 
 
 class QueuePositionError(Exception):
@@ -9,12 +18,205 @@ class QueuePositionError(Exception):
     pass
 
 
+class QueueStats(object):
+    """ Counters for an instrumented queue, kept in shared memory so they can be read from any process.
+
+    Records the number of items put and taken, the high-water mark of the queue depth, and a histogram of the time items spent in the queue.
+    Counters are updated without a lock, so with several producers or consumers they are approximate, and the depth includes an item that is being taken.
+
+    Parameters
+    ----------
+    ctx : :class:`multiprocess.Context`, optional
+        multiprocessing context, by default None (counters are only visible within this process)
+    latency_bins : array-like, optional
+        edges of the latency histogram bins in seconds, by default 25 log-spaced edges from 10 us to 10 s
+    """
+
+    def __init__(self, ctx=None, latency_bins=np.logspace(-5, 1, 25)):
+
+        self.latency_bins = np.asarray(latency_bins, dtype=np.float64)
+
+        ### items put, items taken, high-water mark, then one count per latency bin (with underflow and overflow bins)
+
+        n_counts = 3 + self.latency_bins.size + 1
+        if ctx is not None:
+            self._counts_shared = ctx.RawArray(ctypes.c_int64, n_counts)
+            self._times_shared = ctx.RawArray(ctypes.c_double, 2)
+        else:
+            self._counts_shared = np.zeros(n_counts, dtype=np.int64)
+            self._times_shared = np.zeros(2, dtype=np.float64)
+
+        self._attach()
+        self.reset()
+
+    def _attach(self):
+        """ Create numpy views on the shared arrays
+        """
+
+        self._counts = np.frombuffer(self._counts_shared, dtype=np.int64)
+        self._times = np.frombuffer(self._times_shared, dtype=np.float64)
+        self._last_snapshot = None
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        for k in ["_counts", "_times", "_last_snapshot"]:
+            state.pop(k, None)
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._attach()
+
+    def reset(self):
+        """ Reset all counters
+        """
+
+        self._counts[:] = 0
+        self._times[0] = 0
+        self._times[1] = time.time()
+        self._last_snapshot = None
+
+    def record_put(self):
+        """ Record that an item was put in the queue
+        """
+
+        self._counts[0] += 1
+        depth = self._counts[0] - self._counts[1]
+        if depth > self._counts[2]:
+            self._counts[2] = depth
+
+    def record_lost(self, n=1):
+        """ Record that items left the queue without being taken, e.g. because they were overwritten. They are not included in the latency histogram
+
+        Parameters
+        ----------
+        n : int, optional
+            number of items, by default 1
+        """
+
+        self._counts[1] += n
+
+    def record_get(self, latency):
+        """ Record that an item was taken from the queue
+
+        Parameters
+        ----------
+        latency : float
+            time the item spent in the queue, in seconds
+        """
+
+        self._counts[1] += 1
+        self._counts[3 + np.searchsorted(self.latency_bins, latency)] += 1
+        self._times[0] += latency
+
+    def latency_percentile(self, q, hist=None):
+        """ Estimate a percentile of the queue latency from the histogram, as the upper edge of the bin that contains it
+
+        Parameters
+        ----------
+        q : float
+            percentile, between 0 and 100
+        hist : :class:`numpy.ndarray`, optional
+            latency histogram, by default None (the current histogram)
+
+        Returns
+        -------
+        float
+            the latency in seconds, or None if no items have been taken
+        """
+
+        hist = self._counts[3:] if hist is None else hist
+        total = hist.sum()
+        if total == 0:
+            return None
+
+        ind = int(np.searchsorted(np.cumsum(hist), total * q / 100))
+        return self.latency_bins[min(ind, self.latency_bins.size - 1)]
+
+    def snapshot(self):
+        """ Read all counters. Rates are computed since the previous snapshot taken in this process, or since the counters were reset.
+
+        Returns
+        -------
+        dict
+            dictionary with keys "put", "get", "depth", "high_water", "put_rate", "get_rate" (items per second),
+            "latency_mean", "latency_p50", "latency_p99" (seconds) and "latency_hist" (counts per bin of `latency_bins`, with underflow and overflow bins)
+        """
+
+        now = time.time()
+        counts = np.array(self._counts)
+        n_put, n_get = int(counts[0]), int(counts[1])
+        hist = counts[3:]
+        n_timed = int(hist.sum())
+
+        prev_time, prev_put, prev_get = (
+            self._last_snapshot
+            if self._last_snapshot is not None
+            else (self._times[1], 0, 0)
+        )
+        dt = max(now - prev_time, 1e-9)
+        self._last_snapshot = (now, n_put, n_get)
+
+        return {
+            "put": n_put,
+            "get": n_get,
+            "depth": max(n_put - n_get, 0),
+            "high_water": int(counts[2]),
+            "put_rate": (n_put - prev_put) / dt,
+            "get_rate": (n_get - prev_get) / dt,
+            "latency_mean": self._times[0] / n_timed if n_timed > 0 else None,
+            "latency_p50": self.latency_percentile(50, hist),
+            "latency_p99": self.latency_percentile(99, hist),
+            "latency_hist": hist,
+        }
+
+
 class ClearableQueue(Queue):
-    """ A Queue that provides safe methods for writing to a full queue, reading to an empty queue, and a method to clear the queue """
+    """ A Queue that provides safe methods for writing to a full queue, reading to an empty queue, and a method to clear the queue.
+    If `instrument` is True, items are timestamped when they are put, and :meth:`stats` reports the queue's depth, latency and throughput (see :class:`QueueStats`).
+    """
 
-    def __init__(self, maxsize=0):
+    def __init__(self, maxsize=0, instrument=False):
 
         super().__init__(maxsize)
+        self._stats = QueueStats() if instrument else None
+
+    def put(self, obj, block=True, timeout=None):
+
+        if self._stats is None:
+            return super().put(obj, block, timeout)
+
+        super().put((time.time(), obj), block, timeout)
+        self._stats.record_put()
+
+    def get(self, block=True, timeout=None):
+
+        if self._stats is None:
+            return super().get(block, timeout)
+
+        put_time, obj = super().get(block, timeout)
+        self._stats.record_get(time.time() - put_time)
+        return obj
+
+    def stats(self):
+        """ Get a snapshot of the queue metrics
+
+        Returns
+        -------
+        dict
+            see :meth:`QueueStats.snapshot`, or None if the queue is not instrumented
+        """
+
+        return self._stats.snapshot() if self._stats is not None else None
+
+    def reset_stats(self):
+        """ Reset the queue metrics, if the queue is instrumented
+        """
+
+        if self._stats is not None:
+            self._stats.reset()
 
     def clear(self):
         """ Clears queue, returns all objects in a list
@@ -62,7 +264,7 @@ class ClearableQueue(Queue):
 
         return success
 
-    def read(self, clear=False, position="last"):
+    def read(self, clear=False, position="last", timeout=None):
         """ Gets an object in the queue, with the option to clear the queue and return the first element, last element, or all elements
         
         Parameters
@@ -74,6 +276,8 @@ class ClearableQueue(Queue):
             If position = "last", returns last object. 
             If position = "first", returns first object. 
             If position = "all", returns all objects from the queue.
+        timeout : float, optional
+            If clear is False, wait up to timeout seconds for an object, by default None (do not wait)
         
         Returns
         -------
@@ -101,7 +305,9 @@ class ClearableQueue(Queue):
         else:
 
             try:
-                obj = self.get_nowait()
+                obj = (
+                    self.get_nowait() if timeout is None else self.get(timeout=timeout)
+                )
             except Empty:
                 pass
 
@@ -109,11 +315,58 @@ class ClearableQueue(Queue):
 
 
 class ClearableMPQueue(mp.queues.Queue):
-    """ A multiprocess Queue that provides safe methods for writing to a full queue, reading to an empty queue, and a method to clear the queue """
+    """ A multiprocess Queue that provides safe methods for writing to a full queue, reading to an empty queue, and a method to clear the queue.
+    If `instrument` is True, items are timestamped when they are put, and :meth:`stats` reports the queue's depth, latency and throughput from any process (see :class:`QueueStats`).
+    """
 
-    def __init__(self, maxsize=0, ctx=mp.get_context("spawn")):
+    def __init__(self, maxsize=0, ctx=mp.get_context("spawn"), instrument=False):
 
         super().__init__(maxsize, ctx=ctx)
+        self._stats = QueueStats(ctx=ctx) if instrument else None
+
+    def __getstate__(self):
+
+        return super().__getstate__() + (self._stats,)
+
+    def __setstate__(self, state):
+
+        super().__setstate__(state[:-1])
+        self._stats = state[-1]
+
+    def put(self, obj, block=True, timeout=None):
+
+        if self._stats is None:
+            return super().put(obj, block, timeout)
+
+        super().put((time.time(), obj), block, timeout)
+        self._stats.record_put()
+
+    def get(self, block=True, timeout=None):
+
+        if self._stats is None:
+            return super().get(block, timeout)
+
+        put_time, obj = super().get(block, timeout)
+        self._stats.record_get(time.time() - put_time)
+        return obj
+
+    def stats(self):
+        """ Get a snapshot of the queue metrics
+
+        Returns
+        -------
+        dict
+            see :meth:`QueueStats.snapshot`, or None if the queue is not instrumented
+        """
+
+        return self._stats.snapshot() if self._stats is not None else None
+
+    def reset_stats(self):
+        """ Reset the queue metrics, if the queue is instrumented
+        """
+
+        if self._stats is not None:
+            self._stats.reset()
 
     def clear(self):
         """ Clears queue, returns all objects in a list
@@ -161,7 +414,7 @@ class ClearableMPQueue(mp.queues.Queue):
 
         return success
 
-    def read(self, clear=False, position="last"):
+    def read(self, clear=False, position="last", timeout=None):
         """ Gets an object in the queue, with the option to clear the queue and return the first element, last element, or all elements
         
         Parameters
@@ -173,6 +426,8 @@ class ClearableMPQueue(mp.queues.Queue):
             If position = "last", returns last object. 
             If position = "first", returns first object. 
             If position = "all", returns all objects from the queue.
+        timeout : float, optional
+            If clear is False, wait up to timeout seconds for an object, by default None (do not wait)
         
         Returns
         -------
@@ -201,8 +456,553 @@ class ClearableMPQueue(mp.queues.Queue):
         else:
 
             try:
-                obj = self.get_nowait()
+                obj = (
+                    self.get_nowait() if timeout is None else self.get(timeout=timeout)
+                )
             except Empty:
                 pass
 
         return obj
+
+
+def _create_shared_memory(nbytes):
+    """ Create a block of shared memory that processes can open by name with :func:`_open_shared_memory`, including processes that were started before it was created.
+
+    On Windows this is a named file mapping; elsewhere it is a file in `/dev/shm` (a RAM disk), or in the temporary directory if `/dev/shm` does not exist.
+    The file's space is reserved when it is created, so running out of shared memory raises an OSError here instead of crashing a process that writes to it later.
+
+    Returns
+    -------
+    :class:`mmap.mmap`
+        the shared memory, mapped in this process
+    str
+        name of the shared memory
+    """
+
+    if os.name == "nt":
+        name = f"dlclivegui_{uuid.uuid4().hex}"
+        return mmap.mmap(-1, nbytes, tagname=name), name
+
+    shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, name = tempfile.mkstemp(prefix="dlclivegui_", dir=shm_dir)
+    try:
+        if hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(fd, 0, nbytes)
+        else:
+            os.ftruncate(fd, nbytes)
+        return mmap.mmap(fd, nbytes), name
+    except OSError:
+        os.remove(name)
+        raise
+    finally:
+        os.close(fd)
+
+
+def _open_shared_memory(name, nbytes):
+    """ Map shared memory created by :func:`_create_shared_memory` in this process
+    """
+
+    if os.name == "nt":
+        return mmap.mmap(-1, nbytes, tagname=name)
+
+    fd = os.open(name, os.O_RDWR)
+    try:
+        return mmap.mmap(fd, nbytes)
+    finally:
+        os.close(fd)
+
+
+class SharedArrayQueue(object):
+    """ A single-producer, single-consumer ring queue in shared memory for numpy arrays of a fixed shape and data type.
+
+    Items are copied into preallocated slots, so writing and reading cost one memcpy each, with no pickling, pipe or feeder thread.
+    The producer can also fill the next slot in place with :meth:`reserve` and :meth:`commit`. Items may be structured arrays, to send several fields (e.g. a frame and its timestamp) as one item.
+    When the queue is full, new items overwrite the oldest ones. Every slot holds the sequence number of its item, which is set to -1 while the item is being written,
+    so the consumer detects items that were overwritten while it was reading them. Only one process may write and only one process may read.
+    If `instrument` is True, :meth:`stats` reports the queue's depth, latency and throughput from any process (see :class:`QueueStats`); overwritten items count as taken, without a latency.
+
+    With `allocate=False`, the slots are not allocated until :meth:`allocate` is called, and are released by :meth:`free`, so a large queue only uses memory while it is needed.
+    Slots allocated this way can be used by processes that were started before they were allocated: the producer attaches to them on its next :meth:`reserve`,
+    and the consumer must call :meth:`attach` before reading.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of each item
+    dtype : str, optional
+        data type of the items, by default "float64"
+    maxsize : int, optional
+        number of slots in the ring, by default 16
+    ctx : :class:`multiprocess.Context`
+        multiprocessing context
+    instrument : bool, optional
+        record queue metrics, by default False
+    allocate : bool, optional
+        allocate the slots now, by default True. If False, the slots are allocated by :meth:`allocate`
+    """
+
+    def __init__(
+        self,
+        shape,
+        dtype="float64",
+        maxsize=16,
+        ctx=mp.get_context("spawn"),
+        instrument=False,
+        allocate=True,
+    ):
+
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        self.maxsize = int(maxsize)
+        self.nbytes = self.maxsize * int(np.prod(self.shape)) * self.dtype.itemsize
+
+        ### slots allocated later are shared by name, and the version tells processes that the slots were reallocated
+
+        self._data_shared = (
+            ctx.RawArray(ctypes.c_uint8, self.nbytes) if allocate else None
+        )
+        self._data_name = ctx.RawArray(ctypes.c_char, 256)
+        self._data_version = ctx.RawValue(ctypes.c_int64, 0)
+        self._seqs_shared = ctx.RawArray(ctypes.c_int64, self.maxsize)
+        self._counts_shared = ctx.RawArray(ctypes.c_int64, 2)
+        self._put_times_shared = (
+            ctx.RawArray(ctypes.c_double, self.maxsize) if instrument else None
+        )
+        self._stats = QueueStats(ctx=ctx) if instrument else None
+
+        self._attach()
+
+        self._seqs[:] = -1
+
+    def _attach(self):
+        """ Create numpy views on the shared arrays
+        """
+
+        self._mapping = None
+        self._mapped_version = 0
+        self._data = (
+            self._view_data(self._data_shared)
+            if self._data_shared is not None
+            else None
+        )
+        self._seqs = np.frombuffer(self._seqs_shared, dtype=np.int64)
+        self._counts = np.frombuffer(self._counts_shared, dtype=np.int64)
+        self._put_times = (
+            np.frombuffer(self._put_times_shared, dtype=np.float64)
+            if self._put_times_shared is not None
+            else None
+        )
+
+    def _view_data(self, buffer):
+
+        return np.frombuffer(buffer, dtype=self.dtype).reshape(
+            (self.maxsize,) + self.shape
+        )
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        for k in ["_data", "_mapping", "_seqs", "_counts", "_put_times"]:
+            state.pop(k, None)
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._attach()
+
+    @property
+    def allocated(self):
+        """ True if the queue's slots are allocated
+        """
+
+        return (self._data_shared is not None) or bool(self._data_name.value)
+
+    def allocate(self):
+        """ Allocate the slots of a queue created with `allocate=False`, and empty the queue. Does nothing if the slots are already allocated.
+
+        Raises
+        ------
+        OSError
+            if there is not enough shared memory
+        """
+
+        if self.allocated:
+            return
+
+        self._mapping, name = _create_shared_memory(self.nbytes)
+        self._counts[:] = 0
+        self._seqs[:] = -1
+        self._data_name.value = name.encode()
+        self._data_version.value += 1
+        self._mapped_version = self._data_version.value
+        self._data = self._view_data(self._mapping)
+
+    def attach(self):
+        """ Map the slots allocated by :meth:`allocate` (possibly in another process) in this process, if they are not mapped yet
+
+        Returns
+        -------
+        bool
+            True if the slots are available in this process
+        """
+
+        if self._data_shared is not None:
+            return True
+
+        version = self._data_version.value
+        if (self._data is not None) and (version == self._mapped_version):
+            return True
+
+        self.detach()
+        name = self._data_name.value.decode()
+        if not name:
+            return False
+        try:
+            self._mapping = _open_shared_memory(name, self.nbytes)
+        except OSError:
+            return False
+        self._mapped_version = version
+        self._data = self._view_data(self._mapping)
+
+        return True
+
+    def detach(self):
+        """ Unmap the slots of a queue created with `allocate=False` in this process. The memory is released once every process has detached and the queue is freed.
+        """
+
+        if self._data_shared is None:
+            self._data = None
+            self._mapping = None
+
+    def unlink(self):
+        """ Remove the name of the slots of a queue created with `allocate=False`, so they are released once every process that has attached detaches or exits,
+        even if :meth:`free` is never called. Processes can no longer attach afterwards.
+        """
+
+        name = self._data_name.value.decode()
+        if name and (os.name != "nt") and os.path.isfile(name):
+            os.remove(name)
+
+    def free(self):
+        """ Release the slots of a queue created with `allocate=False` in this process, and unlink them
+        """
+
+        if self._data_shared is None:
+            self.unlink()
+            self._data_name.value = b""
+            self.detach()
+
+    def qsize(self):
+        """ Number of unread items in the queue
+        """
+
+        return int(min(self._counts[0] - self._counts[1], self.maxsize))
+
+    def empty(self):
+
+        return self.qsize() == 0
+
+    def full(self):
+
+        return self.qsize() >= self.maxsize
+
+    def stats(self):
+        """ Get a snapshot of the queue metrics
+
+        Returns
+        -------
+        dict
+            see :meth:`QueueStats.snapshot`, or None if the queue is not instrumented
+        """
+
+        return self._stats.snapshot() if self._stats is not None else None
+
+    def reset_stats(self):
+        """ Reset the queue metrics, if the queue is instrumented
+        """
+
+        if self._stats is not None:
+            self._stats.reset()
+
+    def reserve(self):
+        """ Get the slot of the next item, to fill it in place instead of copying a complete item with :meth:`write`.
+        The item is not visible to the consumer until :meth:`commit` is called. Must only be called from the producer.
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            writable view of the slot, of the queue's item shape and data type
+        """
+
+        if self._data_version.value != self._mapped_version:
+            self.attach()
+
+        slot = int(self._counts[0]) % self.maxsize
+        self._seqs[slot] = -1
+
+        return self._data[slot, ...]
+
+    def commit(self):
+        """ Make the item filled after :meth:`reserve` visible to the consumer, overwriting the oldest item if the queue is full
+        """
+
+        seq = int(self._counts[0])
+        slot = seq % self.maxsize
+
+        if self._stats is not None:
+            self._put_times[slot] = time.time()
+            self._stats.record_put()
+
+        self._seqs[slot] = seq
+        self._counts[0] = seq + 1
+
+    def write(self, obj, clear=False):
+        """ Copy an item into the queue, overwriting the oldest item if the queue is full. Must only be called from the producer.
+
+        Parameters
+        ----------
+        obj : :class:`numpy.ndarray`
+            the item; must be broadcastable to the queue's item shape
+        clear : bool, optional
+            ignored, the consumer can read only the latest item with `read(clear=True)`. By default False
+
+        Returns
+        -------
+        bool
+            True
+        """
+
+        np.copyto(self.reserve(), obj, casting="unsafe")
+        self.commit()
+
+        return True
+
+    def _read_slot(self, seq, out=None):
+        """ Copy item `seq` out of the ring
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            a copy of the item, or None if it was overwritten
+        """
+
+        slot = seq % self.maxsize
+        if int(self._seqs[slot]) != seq:
+            return None
+
+        if out is None:
+            obj = np.array(self._data[slot, ...])
+        else:
+            obj = out
+            np.copyto(obj, self._data[slot, ...])
+        put_time = self._put_times[slot] if self._put_times is not None else None
+
+        if int(self._seqs[slot]) != seq:
+            return None
+
+        if self._stats is not None:
+            self._stats.record_get(time.time() - put_time)
+
+        return obj
+
+    def _next_seq(self):
+        """ Sequence number of the oldest item that has not been overwritten, skipping items lost to overwriting
+        """
+
+        head = int(self._counts[0])
+        tail = max(int(self._counts[1]), head - self.maxsize)
+        if (self._stats is not None) and (tail > self._counts[1]):
+            self._stats.record_lost(tail - int(self._counts[1]))
+        self._counts[1] = tail
+
+        return head, tail
+
+    def clear(self):
+        """ Read all unread items
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            array of shape (n_items,) + shape, oldest first
+        """
+
+        head, tail = self._next_seq()
+        objs = [self._read_slot(seq) for seq in range(tail, head)]
+        self._counts[1] = head
+
+        n_read = len(objs)
+        objs = [obj for obj in objs if obj is not None]
+        if self._stats is not None:
+            self._stats.record_lost(n_read - len(objs))
+        if len(objs) == 0:
+            return np.empty((0,) + self.shape, dtype=self.dtype)
+
+        return np.stack(objs)
+
+    def read(self, clear=False, position="last", timeout=None, out=None):
+        """ Read from the queue, with the same arguments as :meth:`ClearableMPQueue.read`. Must only be called from the consumer.
+
+        Parameters
+        ----------
+        clear : bool, optional
+            If True, all unread items are consumed and the item at `position` is returned. By default False
+        position : str, optional
+            If clear is True, returned object depends on position.
+            If position = "last", returns the newest item, without copying the other items.
+            If position = "first", returns the oldest unread item.
+            If position = "all", returns all unread items as one array.
+        timeout : float, optional
+            If clear is False, wait up to timeout seconds for an item, by default None (do not wait)
+        out : :class:`numpy.ndarray`, optional
+            preallocated array to copy a single item into, by default None
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the item(s), or None if the queue is empty
+        """
+
+        if clear and (position == "all"):
+            objs = self.clear()
+            return objs if objs.shape[0] > 0 else None
+
+        if clear and (position not in ["first", "last"]):
+            raise QueuePositionError(
+                "Queue read position should be one of 'first', 'last', or 'all'"
+            )
+
+        if (not clear) and (timeout is not None):
+            wait_for(lambda: not self.empty(), timeout=timeout)
+
+        while True:
+
+            head, tail = self._next_seq()
+            if head == tail:
+                return None
+
+            seq = head - 1 if (clear and position == "last") else tail
+            obj = self._read_slot(seq, out=out)
+            self._counts[1] = head if clear else seq + 1
+
+            if (self._stats is not None) and (obj is None or seq > tail):
+                self._stats.record_lost(seq - tail + (obj is None))
+
+            if obj is not None:
+                return obj
+
+
+class SharedMailbox(object):
+    """ A single latest-value slot in shared memory for a numpy array, with a version counter and a timestamp.
+
+    Each write replaces the previous value. The version counter is odd while a write is in progress, so readers retry until they copy a value whose
+    version did not change during the copy (a seqlock). The number of rows may change from write to write, up to the first dimension of `shape`;
+    rows beyond it are dropped. Only one process may write, any number of processes may read.
+
+    Parameters
+    ----------
+    shape : tuple
+        maximum shape of the value
+    dtype : str, optional
+        data type of the value, by default "float64"
+    ctx : :class:`multiprocess.Context`
+        multiprocessing context
+    """
+
+    def __init__(self, shape, dtype="float64", ctx=mp.get_context("spawn")):
+
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+
+        self._data_shared = ctx.RawArray(
+            ctypes.c_uint8, int(np.prod(self.shape)) * self.dtype.itemsize
+        )
+        self._header_shared = ctx.RawArray(ctypes.c_int64, 2)
+        self._time_shared = ctx.RawValue(ctypes.c_double, 0)
+
+        self._attach()
+
+    def _attach(self):
+        """ Create numpy views on the shared arrays
+        """
+
+        self._data = np.frombuffer(self._data_shared, dtype=self.dtype).reshape(
+            self.shape
+        )
+        self._header = np.frombuffer(self._header_shared, dtype=np.int64)
+
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        for k in ["_data", "_header"]:
+            state.pop(k, None)
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+        self._attach()
+
+    @property
+    def version(self):
+        """ Number of values written so far
+        """
+
+        return int(self._header[0]) // 2
+
+    def write(self, obj, timestamp=None):
+        """ Replace the value in the mailbox. Must only be called from one process.
+
+        Parameters
+        ----------
+        obj : :class:`numpy.ndarray`
+            the new value
+        timestamp : float, optional
+            timestamp of the value, by default None (the current time)
+        """
+
+        obj = np.asarray(obj)[: self.shape[0]]
+        n_rows = obj.shape[0] if obj.ndim > 0 else 1
+
+        self._header[0] += 1
+        self._data[:n_rows] = obj
+        self._header[1] = n_rows
+        self._time_shared.value = time.time() if timestamp is None else timestamp
+        self._header[0] += 1
+
+    def read(self, out=None):
+        """ Copy the latest value out of the mailbox
+
+        Parameters
+        ----------
+        out : :class:`numpy.ndarray`, optional
+            preallocated array of shape `shape` to copy the value into, by default None
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            a copy of the latest value, or None if nothing has been written
+        float
+            timestamp of the value
+        int
+            version of the value
+        """
+
+        while True:
+
+            start = int(self._header[0])
+            if start == 0:
+                return None, None, 0
+            if start % 2 == 1:
+                continue
+
+            n_rows = int(self._header[1])
+            if out is None:
+                obj = np.array(self._data[:n_rows])
+            else:
+                obj = out[:n_rows]
+                np.copyto(obj, self._data[:n_rows])
+            timestamp = self._time_shared.value
+
+            if int(self._header[0]) == start:
+                return obj, timestamp, start // 2
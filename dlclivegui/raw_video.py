@@ -0,0 +1,235 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import os
+import glob
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from dlclivegui.writers import VideoWriterError, create_writer
+from dlclivegui.npy_file import NpyFileError, recover_npy
+
+
+def timestamps_fps(timestamp_file, default=30):
+    """ Estimate the frame rate of a recording from its timestamp file
+
+    Parameters
+    ----------
+    timestamp_file : str
+        path to the timestamp file
+    default : float, optional
+        frame rate returned if it cannot be estimated, by default 30
+
+    Returns
+    -------
+    float
+        the median frame rate
+    """
+
+    if os.path.isfile(timestamp_file):
+        ts = np.load(timestamp_file)
+        if ts.size > 1:
+            return 1 / np.median(np.diff(ts))
+
+    return default
+
+
+class RawVideoCapture(object):
+    """ Reads raw frames written by :class:`dlclivegui.writers.NpyFrameWriter`, with the same methods as :class:`cv2.VideoCapture`.
+    The file is memory-mapped, so setting the frame position is free and frames can be read in any order.
+
+    Parameters
+    ----------
+    video_file : str
+        path to the `_VIDEO.npy` file
+    fps : float, optional
+        frame rate of the video, by default 30
+    """
+
+    def __init__(self, video_file, fps=30):
+        """ Constructor method
+        """
+
+        self.frames = np.load(video_file, mmap_mode="r")
+        self.fps = fps
+        self.pos = 0
+
+    def isOpened(self):
+
+        return self.frames is not None
+
+    def read(self):
+
+        if (self.frames is None) or (self.pos >= self.frames.shape[0]):
+            return False, None
+
+        frame = np.array(self.frames[self.pos])
+        self.pos += 1
+
+        return True, frame
+
+    def get(self, prop):
+
+        if self.frames is None:
+            return 0
+        elif prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frames.shape[0]
+        elif prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.pos
+        elif prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        elif prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.frames.shape[2]
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.frames.shape[1]
+
+        return 0
+
+    def set(self, prop, value):
+
+        if (self.frames is not None) and (prop == cv2.CAP_PROP_POS_FRAMES):
+            if 0 <= int(value) <= self.frames.shape[0]:
+                self.pos = int(value)
+                return True
+
+        return False
+
+    def release(self):
+
+        self.frames = None
+
+
+def open_video_file(video_file, fps=30):
+    """ Open a video file with :class:`cv2.VideoCapture`, or a raw `.npy` video with :class:`RawVideoCapture`
+
+    Parameters
+    ----------
+    video_file : str
+        path to the video file
+    fps : float, optional
+        frame rate of raw videos, which do not store it, by default 30
+
+    Returns
+    -------
+    :class:`cv2.VideoCapture` or :class:`RawVideoCapture`
+        the opened video
+    """
+
+    if video_file.endswith(".npy"):
+        return RawVideoCapture(video_file, fps=fps)
+
+    return cv2.VideoCapture(video_file)
+
+
+def transcode_raw_video(
+    filename, writer="divx", out_filename=None, delete=False, progress=True, **options
+):
+    """ Convert a raw `{filename}_VIDEO.npy` recording to a compressed video with one of the video writer backends
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name of the recording
+    writer : str, optional
+        name of the video writer backend, one of the keys of :data:`dlclivegui.writers.WRITERS`, by default "divx"
+    out_filename : str, optional
+        path and base file name of the compressed video, by default None (the same as `filename`)
+    delete : bool, optional
+        delete the raw video after it has been converted, by default False
+    progress : bool, optional
+        display a progress bar, by default True
+    **options
+        options of the video writer backend
+
+    Returns
+    -------
+    str
+        path to the compressed video
+    """
+
+    raw_file = f"{filename}_VIDEO.npy"
+    out_filename = out_filename if out_filename is not None else filename
+    fps = timestamps_fps(f"{filename}_TS.npy")
+
+    frames = np.load(raw_file, mmap_mode="r")
+    video_writer = create_writer(
+        writer, out_filename, fps, (frames.shape[2], frames.shape[1]), **options
+    )
+    if not video_writer.is_opened():
+        raise VideoWriterError(f"Could not open the '{writer}' video writer.")
+
+    iterator = tqdm(range(frames.shape[0])) if progress else range(frames.shape[0])
+    for i in iterator:
+        video_writer.write(np.ascontiguousarray(frames[i]))
+    video_writer.release()
+
+    del frames
+    if delete:
+        os.remove(raw_file)
+
+    return video_writer.video_file
+
+
+def recover_recording(filename):
+    """ Recover the .npy files of a recording that was interrupted, e.g. by a crash or power loss: timestamps, dropped frames and raw video, of the whole recording or of each segment.
+    The header of each file is updated to include every complete row that was written to the file (see :func:`dlclivegui.npy_file.recover_npy`).
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name of the recording
+
+    Returns
+    -------
+    dict
+        dictionary of recovered file to its number of rows. Files that were not written by :class:`dlclivegui.npy_file.NpyAppender` are skipped
+    """
+
+    recovered = {}
+    for npy_file in sorted(glob.glob(f"{glob.escape(filename)}_*.npy")):
+        try:
+            recovered[npy_file] = recover_npy(npy_file)
+        except (NpyFileError, ValueError):
+            pass
+
+    return recovered
+
+
+def main():
+
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dir", type=str)
+    parser.add_argument("--writer", type=str, default="divx")
+    parser.add_argument("-o", "--out-dir", type=str, default=None)
+    parser.add_argument("--delete", action="store_true")
+    parser.add_argument("--no-progress", action="store_false")
+    parser.add_argument("--recover", action="store_true")
+    args = parser.parse_args()
+
+    base_dir = os.path.basename(os.path.normpath(args.dir))
+    filename = os.path.normpath(f"{args.dir}/{base_dir}")
+    out_filename = (
+        os.path.normpath(f"{args.out_dir}/{base_dir}") if args.out_dir else None
+    )
+
+    if args.recover:
+        for npy_file, n_rows in recover_recording(filename).items():
+            print(f"{npy_file}: {n_rows} rows")
+        if not os.path.isfile(f"{filename}_VIDEO.npy"):
+            return
+
+    transcode_raw_video(
+        filename,
+        writer=args.writer,
+        out_filename=out_filename,
+        delete=args.delete,
+        progress=args.no_progress,
+    )
@@ -0,0 +1,620 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import os
+import json
+import time
+import shutil
+import subprocess
+import threading
+import cv2
+import numpy as np
+
+from dlclivegui.queue import ClearableQueue
+from dlclivegui.npy_file import NpyAppender
+from dlclivegui.writers import VideoWriterError, create_writer, find_video_file
+from dlclivegui.raw_video import open_video_file, timestamps_fps
+
+
+def manifest_file(filename):
+    """ Path of the manifest of a segmented recording, `{filename}_MANIFEST.json`
+    """
+
+    return f"{filename}_MANIFEST.json"
+
+
+def segment_timestamp_file(filename, segment):
+    """ Path of the timestamp file of a segment, `{filename}_TS_{segment}.npy`
+    """
+
+    return f"{filename}_TS_{segment:04d}.npy"
+
+
+def write_manifest(filename, segments, fps, im_size):
+    """ Write the manifest of a segmented recording to `{filename}_MANIFEST.json`.
+
+    The manifest lists the segments in time order, with the global index of the first frame and the number of frames in each segment,
+    so frame `i` of the recording is frame `i - first_frame` of the segment with the largest `first_frame <= i`.
+    The file is replaced atomically, so it always describes a consistent set of finished segments.
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    segments : list
+        list of dictionaries with keys "index", "video_file", "timestamp_file", "first_frame" and "n_frames". File names are relative to the manifest.
+    fps : float
+        frame rate of the video
+    im_size : tuple
+        size of the frames, (width, height)
+    """
+
+    segments = sorted(segments, key=lambda seg: seg["first_frame"])
+    manifest = {
+        "fps": fps,
+        "frame_size": [int(s) for s in im_size],
+        "n_frames": int(sum(seg["n_frames"] for seg in segments)),
+        "segments": segments,
+    }
+
+    out_file = manifest_file(filename)
+    tmp_file = f"{out_file}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_file, out_file)
+
+
+def read_manifest(filename):
+    """ Read the manifest of a segmented recording
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name, or path to the manifest file
+
+    Returns
+    -------
+    dict
+        the manifest, with file names of segments converted to full paths
+    """
+
+    if not filename.endswith("_MANIFEST.json"):
+        filename = manifest_file(filename)
+
+    with open(filename) as f:
+        manifest = json.load(f)
+    data_dir = os.path.dirname(os.path.abspath(filename))
+    for seg in manifest["segments"]:
+        seg["video_file"] = os.path.join(data_dir, seg["video_file"])
+        seg["timestamp_file"] = os.path.join(data_dir, seg["timestamp_file"])
+
+    return manifest
+
+
+class EncoderPool(object):
+    """ Encodes a recording as a series of time-ordered segments, with a pool of encoder threads.
+
+    A new segment is started when the current segment reaches `segment_frames` frames, lasts `segment_seconds` seconds (by frame timestamps) or its video file reaches `segment_bytes` bytes,
+    whichever comes first. Segments are assigned to encoders in turn, so while one encoder is still finishing a segment, the next encoder already encodes the next one,
+    and encoding throughput scales with the number of encoders (video writer backends release the GIL while encoding).
+    Every segment is written to `{filename}_VIDEO_{segment}{extension}` with its timestamps in `{filename}_TS_{segment}.npy`,
+    and the manifest `{filename}_MANIFEST.json` is updated whenever a segment is finished, so finished segments can be used while recording continues.
+    If a segment cannot be opened or written, the frames queued for it are not encoded: the error is stored in `error`, and the frames are returned by :meth:`pop_failed`.
+
+    Parameters
+    ----------
+    writer : str
+        name of the video writer backend, one of the keys of :data:`dlclivegui.writers.WRITERS`
+    filename : str
+        path and base file name
+    fps : float
+        frame rate of the video
+    im_size : tuple
+        size of the frames, (width, height)
+    n_encoders : int, optional
+        number of encoder threads, by default 2
+    segment_frames : int, optional
+        maximum number of frames per segment. By default None, which is 1000 if no other limit is set
+    segment_seconds : float, optional
+        maximum duration of a segment, in seconds, by default None
+    segment_bytes : int, optional
+        maximum size of a segment's video file, in bytes, by default None. The size is checked while frames are queued,
+        so segments can exceed this size by the frames still waiting to be encoded
+    copy_frames : bool, optional
+        copy each frame before queuing it for encoding; required if the caller reuses the frame array. By default False
+    max_queued : int, optional
+        maximum number of frames waiting for each encoder; :meth:`write` blocks while the encoder of the current segment is full. By default 0 (unbounded)
+    writer_options : dict, optional
+        options passed to the video writer backend, by default None
+    """
+
+    def __init__(
+        self,
+        writer,
+        filename,
+        fps,
+        im_size,
+        n_encoders=2,
+        segment_frames=None,
+        segment_seconds=None,
+        segment_bytes=None,
+        copy_frames=False,
+        max_queued=0,
+        writer_options=None,
+    ):
+        """ Constructor method
+        """
+
+        self.writer = writer
+        self.filename = filename
+        self.fps = fps
+        self.im_size = tuple(int(s) for s in im_size)
+        self.n_encoders = n_encoders
+        if (segment_frames, segment_seconds, segment_bytes) == (None, None, None):
+            segment_frames = 1000
+        self.segment_frames = segment_frames
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.copy_frames = copy_frames
+        self.writer_options = writer_options if writer_options is not None else {}
+
+        self.video_file = manifest_file(filename)
+        self.n_frames = 0
+        self.segments = []
+        self.error = None
+        self.n_failed = 0
+        self._failed = []
+        self._lock = threading.Lock()
+        self._encoded = [0] * n_encoders
+        self._encode_time = [0.0] * n_encoders
+        self._segment = 0
+        self._segment_start = 0
+        self._segment_start_time = None
+        self._first_frames = {0: 0}
+        self._segment_files = {}
+
+        ### open the first segment here, so an unavailable writer backend is reported before recording starts
+
+        try:
+            self._first_segment = self._open_segment(0)
+            self._segment_files[0] = self._first_segment[0].video_file
+        except VideoWriterError as e:
+            self._first_segment = None
+            self.error = str(e)
+
+        self._queues = [ClearableQueue(max_queued) for _ in range(n_encoders)]
+        self._threads = [
+            threading.Thread(target=self._encode, args=(i,), daemon=True)
+            for i in range(n_encoders)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def is_opened(self):
+
+        return (self._first_segment is not None) and self._first_segment[0].is_opened()
+
+    def _open_segment(self, segment):
+        """ Create the video writer and timestamp file of a segment
+        """
+
+        video_writer = create_writer(
+            self.writer,
+            self.filename,
+            self.fps,
+            self.im_size,
+            segment=segment,
+            **self.writer_options,
+        )
+        if not video_writer.is_opened():
+            raise VideoWriterError(f"Could not open {video_writer.video_file}.")
+        timestamps = NpyAppender(segment_timestamp_file(self.filename, segment))
+
+        return video_writer, timestamps
+
+    def _close_segment(self, i, segment, video_writer, timestamps):
+        """ Finish a segment and add it to the manifest
+        """
+
+        t0 = time.perf_counter()
+        video_writer.release()
+        timestamps.close()
+        self._encode_time[i] += time.perf_counter() - t0
+
+        with self._lock:
+            self.segments.append(
+                {
+                    "index": segment,
+                    "video_file": os.path.basename(video_writer.video_file),
+                    "timestamp_file": os.path.basename(timestamps.filename),
+                    "first_frame": self._first_frames[segment],
+                    "n_frames": len(timestamps),
+                }
+            )
+            write_manifest(self.filename, self.segments, self.fps, self.im_size)
+
+    def _encode(self, i):
+        """ Encode the segments queued for encoder `i`
+        """
+
+        segment = None
+        video_writer = None
+        timestamps = None
+
+        while True:
+
+            item = self._queues[i].get()
+
+            if (item is None) or (item[0] != segment):
+
+                if video_writer is not None:
+                    self._close_segment(i, segment, video_writer, timestamps)
+                    video_writer = None
+
+                if item is None:
+                    break
+
+                segment = item[0]
+                if segment == 0:
+                    if self._first_segment is not None:
+                        video_writer, timestamps = self._first_segment
+                else:
+                    try:
+                        video_writer, timestamps = self._open_segment(segment)
+                        self._segment_files[segment] = video_writer.video_file
+                    except (VideoWriterError, OSError) as e:
+                        self.error = str(e)
+
+            _, frame, timestamp, frame_id, frame_number = item
+
+            if video_writer is not None:
+                try:
+                    t0 = time.perf_counter()
+                    video_writer.write(frame)
+                    self._encode_time[i] += time.perf_counter() - t0
+                except Exception as e:
+                    self.error = f"Could not write to {video_writer.video_file}: {e}"
+                    self._abort_segment(i, segment, video_writer, timestamps)
+                    video_writer = None
+
+            if video_writer is not None:
+                timestamps.append(timestamp if timestamp is not None else np.nan)
+                self._encoded[i] += 1
+            else:
+                with self._lock:
+                    self._failed.append((frame_id, timestamp, frame_number))
+                    self.n_failed += 1
+
+    def _abort_segment(self, i, segment, video_writer, timestamps):
+        """ Close a segment that failed while writing, keeping the frames encoded before the failure if the segment can still be closed
+        """
+
+        try:
+            self._close_segment(i, segment, video_writer, timestamps)
+        except Exception:
+            timestamps.close()
+
+    def pop_failed(self):
+        """ Get the frames that could not be encoded since the last call, because their segment could not be opened or written
+
+        Returns
+        -------
+        list
+            list of (frame id, timestamp, frame number) of each frame, where the frame number is the frame's index in the order frames were passed to :meth:`write`
+        """
+
+        with self._lock:
+            failed, self._failed = self._failed, []
+
+        return failed
+
+    def write(self, frame, timestamp=None, frame_id=None):
+        """ Queue a frame for encoding
+
+        Parameters
+        ----------
+        frame : :class:`numpy.ndarray`
+            a BGR image of shape (height, width, 3)
+        timestamp : float, optional
+            capture timestamp of the frame, by default None
+        frame_id : int, optional
+            identifier of the frame returned by :meth:`pop_failed` if the frame cannot be encoded, by default None (the frame number)
+        """
+
+        if self._segment_full(timestamp):
+            self._segment += 1
+            self._segment_start = self.n_frames
+            self._segment_start_time = timestamp
+            self._first_frames[self._segment] = self.n_frames
+        elif self._segment_start_time is None:
+            self._segment_start_time = timestamp
+
+        if self.copy_frames:
+            frame = frame.copy()
+        self._queues[self._segment % self.n_encoders].put(
+            (
+                self._segment,
+                frame,
+                timestamp,
+                frame_id if frame_id is not None else self.n_frames,
+                self.n_frames,
+            )
+        )
+        self.n_frames += 1
+
+    def _segment_full(self, timestamp):
+        """ Check whether the current segment has reached one of its limits
+        """
+
+        if self.n_frames == self._segment_start:
+            return False
+
+        if (self.segment_frames is not None) and (
+            self.n_frames - self._segment_start >= self.segment_frames
+        ):
+            return True
+
+        if (
+            (self.segment_seconds is not None)
+            and (timestamp is not None)
+            and (self._segment_start_time is not None)
+            and (timestamp - self._segment_start_time >= self.segment_seconds)
+        ):
+            return True
+
+        if self.segment_bytes is not None:
+            video_file = self._segment_files.get(self._segment)
+            if (
+                (video_file is not None)
+                and os.path.isfile(video_file)
+                and (os.path.getsize(video_file) >= self.segment_bytes)
+            ):
+                return True
+
+        return False
+
+    @property
+    def encode_fps(self):
+        """ Combined encoding rate of all encoders, in frames per second of time spent encoding
+        """
+
+        return sum(n / t for n, t in zip(self._encoded, self._encode_time) if t > 0)
+
+    def release(self):
+        """ Wait for all queued frames to be encoded, and write the final manifest
+        """
+
+        for q in self._queues:
+            q.put(None)
+        for t in self._threads:
+            t.join()
+
+        if (self._first_segment is not None) and (self.n_frames == 0):
+            self._first_segment[0].release()
+            self._first_segment[1].close()
+
+        write_manifest(self.filename, self.segments, self.fps, self.im_size)
+
+    def remove(self):
+        """ Delete all segments and the manifest
+        """
+
+        files = [manifest_file(self.filename)]
+        if self._first_segment is not None:
+            files += [
+                self._first_segment[0].video_file,
+                self._first_segment[1].filename,
+            ]
+        for seg in self.segments:
+            data_dir = os.path.dirname(os.path.abspath(self.filename))
+            files += [
+                os.path.join(data_dir, seg["video_file"]),
+                os.path.join(data_dir, seg["timestamp_file"]),
+            ]
+
+        for f in set(files):
+            if os.path.isfile(f):
+                os.remove(f)
+
+
+class SegmentedVideoCapture(object):
+    """ Reads the frames of a segmented recording in order, with the same methods as :class:`cv2.VideoCapture`
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name, or path to the manifest file
+    """
+
+    def __init__(self, filename):
+        """ Constructor method
+        """
+
+        self.manifest = read_manifest(filename)
+        self.segments = self.manifest["segments"]
+        self.first_frames = np.array(
+            [seg["first_frame"] for seg in self.segments], dtype=np.int64
+        )
+        self.pos = 0
+        self.cap = None
+        self.segment = -1
+        self._open(0)
+
+    def _open(self, segment):
+
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+        self.segment = segment
+        if segment < len(self.segments):
+            self.cap = open_video_file(
+                self.segments[segment]["video_file"], fps=self.manifest["fps"]
+            )
+
+    def isOpened(self):
+
+        return (self.cap is not None) and self.cap.isOpened()
+
+    def read(self):
+
+        while self.cap is not None:
+            ret, frame = self.cap.read()
+            if ret:
+                self.pos += 1
+                return ret, frame
+            self._open(self.segment + 1)
+
+        return False, None
+
+    def get(self, prop):
+
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.manifest["n_frames"]
+        elif prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.pos
+        elif prop == cv2.CAP_PROP_FPS:
+            return self.manifest["fps"]
+        elif prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.manifest["frame_size"][0]
+        elif prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.manifest["frame_size"][1]
+        elif self.cap is not None:
+            return self.cap.get(prop)
+
+        return 0
+
+    def set(self, prop, value):
+
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return self.cap.set(prop, value) if self.cap is not None else False
+
+        frame = int(value)
+        segment = int(np.searchsorted(self.first_frames, frame, side="right")) - 1
+        if (segment < 0) or (frame >= self.manifest["n_frames"]):
+            return False
+
+        if segment != self.segment:
+            self._open(segment)
+        self.pos = frame
+
+        return self.cap.set(
+            cv2.CAP_PROP_POS_FRAMES, frame - self.segments[segment]["first_frame"]
+        )
+
+    def release(self):
+
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+def open_video(filename):
+    """ Open the video of a recording, which may be a single video file, a raw `.npy` video or a segmented recording
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+
+    Returns
+    -------
+    :class:`cv2.VideoCapture` or :class:`SegmentedVideoCapture`
+        the opened video
+    """
+
+    if os.path.isfile(manifest_file(filename)):
+        return SegmentedVideoCapture(filename)
+
+    return open_video_file(
+        find_video_file(filename), fps=timestamps_fps(f"{filename}_TS.npy")
+    )
+
+
+def concat_video_files(video_files, out_file, ffmpeg="ffmpeg"):
+    """ Join video files with the same codec and frame size into a single video file with ffmpeg, without re-encoding.
+    Requires the `ffmpeg` executable to be on the path.
+
+    Parameters
+    ----------
+    video_files : list
+        paths to the video files, in order
+    out_file : str
+        path to the joined video
+    ffmpeg : str, optional
+        ffmpeg executable, by default "ffmpeg"
+
+    Returns
+    -------
+    str
+        path to the joined video
+    """
+
+    if shutil.which(ffmpeg) is None:
+        raise VideoWriterError(f"Could not find the ffmpeg executable '{ffmpeg}'.")
+
+    list_file = f"{os.path.splitext(out_file)[0]}_SEGMENTS.txt"
+    with open(list_file, "w") as f:
+        for video_file in video_files:
+            f.write(f"file '{os.path.abspath(video_file)}'\n")
+
+    try:
+        subprocess.run(
+            [
+                ffmpeg,
+                "-y",
+                "-loglevel",
+                "error",
+                "-f",
+                "concat",
+                "-safe",
+                "0",
+                "-i",
+                list_file,
+                "-c",
+                "copy",
+                out_file,
+            ],
+            check=True,
+        )
+    finally:
+        os.remove(list_file)
+
+    return out_file
+
+
+def concat_segments(filename, out_file=None, ffmpeg="ffmpeg"):
+    """ Join the segments of a segmented recording into a single video file with ffmpeg, without re-encoding.
+    Requires the `ffmpeg` executable to be on the path.
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    out_file : str, optional
+        path to the joined video, by default None (`{filename}_VIDEO{extension}`)
+    ffmpeg : str, optional
+        ffmpeg executable, by default "ffmpeg"
+
+    Returns
+    -------
+    str
+        path to the joined video
+    """
+
+    manifest = read_manifest(filename)
+    if len(manifest["segments"]) == 0:
+        raise VideoWriterError(f"{manifest_file(filename)} has no segments.")
+
+    if out_file is None:
+        ext = os.path.splitext(manifest["segments"][0]["video_file"])[1]
+        out_file = f"{filename}_VIDEO{ext}"
+
+    return concat_video_files(
+        [seg["video_file"] for seg in manifest["segments"]], out_file, ffmpeg=ffmpeg
+    )
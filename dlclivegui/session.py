@@ -0,0 +1,349 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import os
+import time
+import multiprocess as mp
+import numpy as np
+import pandas as pd
+
+from dlclivegui.pose_process import CameraPoseProcess
+from dlclivegui.shared_pose_process import SharedModelPoseProcess
+from dlclivegui import camera
+
+
+class SessionError(Exception):
+    """
+    Exception for incorrect use of a multi-camera session
+    """
+
+    pass
+
+
+def align_timestamps(timestamps, reference=0, tolerance=None):
+    """ Match the frames of several cameras by nearest timestamp.
+
+    For every frame of the reference camera, finds the frame of each other camera with the closest timestamp.
+    Matches further apart than `tolerance` are marked as missing (-1).
+
+    Parameters
+    ----------
+    timestamps : list of :class:`numpy.ndarray`
+        sorted frame timestamps of each camera
+    reference : int, optional
+        index of the camera whose frames define the rows of the alignment, by default 0
+    tolerance : float, optional
+        maximum time difference between matched frames, in seconds. By default None, which uses half of the median frame interval of the reference camera
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        integer array of shape (n_reference_frames, n_cameras) with the frame index of each camera matched to each reference frame, or -1 if there is no match
+    """
+
+    ref_times = np.asarray(timestamps[reference], dtype=float)
+
+    if tolerance is None:
+        tolerance = np.median(np.diff(ref_times)) / 2 if ref_times.size > 1 else np.inf
+
+    index = np.full((ref_times.size, len(timestamps)), -1, dtype=np.int64)
+
+    for i, ts in enumerate(timestamps):
+
+        ts = np.asarray(ts, dtype=float)
+        if ts.size == 0:
+            continue
+
+        right = np.clip(np.searchsorted(ts, ref_times), 0, ts.size - 1)
+        left = np.clip(right - 1, 0, ts.size - 1)
+        nearest = np.where(
+            np.abs(ts[left] - ref_times) <= np.abs(ts[right] - ref_times), left, right
+        )
+        matched = np.abs(ts[nearest] - ref_times) <= tolerance
+        index[matched, i] = nearest[matched]
+
+    return index
+
+
+class MultiCameraSession(object):
+    """ Runs synchronized acquisition from several cameras, with one capture (and optional pose and writer) process per camera.
+
+    All processes timestamp frames with :func:`time.time`, the system clock shared by all processes on the computer.
+    When the session is saved, the frames of all cameras are matched by nearest timestamp and a merged timestamp index is written next to the per-camera files.
+
+    Parameters
+    ----------
+    cameras : dict
+        dictionary of camera name to :class:`dlclivegui.camera.Camera` object
+    ctx : :class:`multiprocess.Context`
+        multiprocessing context
+    tolerance : float, optional
+        maximum time difference between matched frames, in seconds, by default None (half the reference camera's frame interval)
+    **kwargs
+        additional keyword arguments (e.g. buffer_size, write_mode, stream_poses) are passed to each :class:`CameraPoseProcess`
+    """
+
+    def __init__(self, cameras, ctx=mp.get_context("spawn"), tolerance=None, **kwargs):
+        """ Constructor method
+        """
+
+        self.stream_poses = kwargs.get("stream_poses", False)
+
+        if len(cameras) == 0:
+            raise SessionError("A session needs at least one camera.")
+
+        self.names = list(cameras.keys())
+        self.procs = {
+            name: CameraPoseProcess(cam, ctx, **kwargs) for name, cam in cameras.items()
+        }
+        self.ctx = ctx
+        self.tolerance = tolerance
+        self.pose_service = None
+        self.base_name = None
+        self.start_time = None
+
+    @classmethod
+    def from_config(cls, cfg, camera_names, **kwargs):
+        """ Create a session from cameras in a DeepLabCut-live-GUI configuration
+
+        Parameters
+        ----------
+        cfg : dict
+            a DeepLabCut-live-GUI configuration, as saved by the GUI
+        camera_names : list
+            names of the cameras (keys of cfg["cameras"]) to use
+        **kwargs
+            additional keyword arguments passed to :class:`MultiCameraSession`
+
+        Returns
+        -------
+        :class:`MultiCameraSession`
+            the session
+        """
+
+        cameras = {}
+        for name in camera_names:
+            cam_cfg = cfg["cameras"][name]
+            cam_obj = getattr(camera, cam_cfg["type"])
+            cameras[name.replace(" ", "")] = cam_obj(**cam_cfg["params"])
+
+        return cls(cameras, **kwargs)
+
+    def start_capture(self, timeout=60):
+        """ Start the capture process of every camera
+
+        Returns
+        -------
+        dict
+            dictionary of camera name to the result of :meth:`CameraProcess.start_capture_process`
+        """
+
+        return {
+            name: proc.start_capture_process(timeout=timeout)
+            for name, proc in self.procs.items()
+        }
+
+    def start_pose(self, dlc_params, shared_model=False, timeout=300, **kwargs):
+        """ Start pose estimation for every camera
+
+        Parameters
+        ----------
+        dlc_params : dict
+            DeepLabCut-live parameters, either one dictionary for all cameras or a dictionary per camera name
+        shared_model : bool, optional
+            If True, run all cameras in a single :class:`SharedModelPoseProcess`, which loads one model for all cameras with the same model parameters
+            and estimates their poses in turn. If False, start a separate pose process for every camera. By default False
+        **kwargs
+            additional keyword arguments (e.g. max_latency) passed to :class:`SharedModelPoseProcess`
+
+        Returns
+        -------
+        dict
+            dictionary of camera name to the result of starting pose estimation
+        """
+
+        if shared_model:
+            self.pose_service = SharedModelPoseProcess(
+                self.procs, ctx=self.ctx, **kwargs
+            )
+            ret = self.pose_service.start_pose_process(dlc_params, timeout=timeout)
+            return {name: ret for name in self.names}
+
+        ret = {}
+        for name, proc in self.procs.items():
+            params = dlc_params[name] if name in dlc_params else dlc_params
+            ret[name] = proc.start_pose_process(params.copy(), timeout=timeout)
+
+        return ret
+
+    def start_writers(self, base_name, timeout=60):
+        """ Start a writer process for every camera. Files for each camera are named `{base_name}_{camera name}`
+
+        Parameters
+        ----------
+        base_name : str
+            path and base file name of the session
+
+        Returns
+        -------
+        dict
+            dictionary of camera name to the result of :meth:`CameraProcess.start_writer_process`
+        """
+
+        self.base_name = base_name
+        os.makedirs(os.path.dirname(os.path.abspath(base_name)), exist_ok=True)
+
+        ret = {
+            name: proc.start_writer_process(self.camera_file(name), timeout=timeout)
+            for name, proc in self.procs.items()
+        }
+
+        if self.stream_poses and (self.pose_service is not None):
+            self.pose_service.start_pose_stream(
+                {name: self.camera_file(name) for name in self.names}
+            )
+
+        return ret
+
+    def camera_file(self, name):
+        """ Base file name for a camera's output files
+        """
+
+        return f"{self.base_name}_{name}"
+
+    def start_record(self, timeout=5):
+        """ Start recording from all cameras
+
+        Returns
+        -------
+        bool
+            True if recording started on every camera
+        """
+
+        self.start_time = time.time()
+        rets = [proc.start_record(timeout=timeout) for proc in self.procs.values()]
+        if self.pose_service is not None:
+            rets.append(self.pose_service.start_record(timeout=timeout))
+
+        return all(rets)
+
+    def stop_record(self, timeout=5):
+        """ Stop recording from all cameras
+
+        Returns
+        -------
+        bool
+            True if recording stopped on every camera
+        """
+
+        rets = [proc.stop_record(timeout=timeout) for proc in self.procs.values()]
+        if self.pose_service is not None:
+            rets.append(self.pose_service.stop_record(timeout=timeout))
+
+        return all(rets)
+
+    def save(self, delete=False):
+        """ Stop the writer processes, save videos, timestamps and poses for each camera, and write the merged timestamp index
+
+        Parameters
+        ----------
+        delete : bool, optional
+            flag to delete the recorded files instead of saving them, by default False
+
+        Returns
+        -------
+        dict
+            dictionary of camera name to the result of :meth:`CameraProcess.stop_writer_process`
+        """
+
+        ret = {}
+        for name, proc in self.procs.items():
+            ret[name] = proc.stop_writer_process(save=not delete)
+            if not delete:
+                proc.save_pose(self.camera_file(name))
+
+        if self.pose_service is not None:
+            if delete:
+                self.pose_service.discard_pose()
+            else:
+                self.pose_service.save_pose(
+                    {name: self.camera_file(name) for name in self.names}
+                )
+
+        if (not delete) and all(ret.values()):
+            self.write_index()
+
+        return ret
+
+    def write_index(self):
+        """ Match frames across cameras and write the merged timestamp index to `{base_name}_SYNC.hdf5`
+
+        The index is a pandas data frame with one row per frame of the first camera, containing the matched frame index (-1 if none) and timestamp of every camera.
+
+        Returns
+        -------
+        :class:`pandas.DataFrame`
+            the merged timestamp index
+        """
+
+        timestamps = [
+            np.load(f"{self.camera_file(name)}_TS.npy") for name in self.names
+        ]
+        index = align_timestamps(timestamps, tolerance=self.tolerance)
+
+        sync_data = {}
+        for i, name in enumerate(self.names):
+            matched = index[:, i] >= 0
+            times = np.full(index.shape[0], np.nan)
+            times[matched] = timestamps[i][index[matched, i]]
+            sync_data[(name, "frame")] = index[:, i]
+            sync_data[(name, "frame_time")] = times
+
+        sync_df = pd.DataFrame(sync_data)
+        sync_df.columns.names = ["camera", "value"]
+        sync_df["session_time"] = sync_df[(self.names[0], "frame_time")] - (
+            self.start_time if self.start_time is not None else timestamps[0][0]
+        )
+
+        sync_df.to_hdf(f"{self.base_name}_SYNC.hdf5", key="df_with_missing", mode="w")
+
+        return sync_df
+
+    def get_display_frames(self):
+        """ Get the latest display frame of every camera (resized for display and in RGB)
+
+        Returns
+        -------
+        dict
+            dictionary of camera name to display frame
+        """
+
+        return {name: proc.get_display_frame() for name, proc in self.procs.items()}
+
+    def get_queue_stats(self):
+        """ Get the queue metrics of every camera, e.g. for a headless monitor
+
+        Returns
+        -------
+        dict
+            dictionary of camera name to :meth:`dlclivegui.CameraProcess.get_queue_stats`
+        """
+
+        return {name: proc.get_queue_stats() for name, proc in self.procs.items()}
+
+    def stop(self):
+        """ Stop all writer, pose and capture processes. Recordings that have not been saved are discarded.
+        """
+
+        if self.pose_service is not None:
+            self.pose_service.stop_pose_process()
+
+        for proc in self.procs.values():
+            proc.stop_writer_process(save=False)
+            proc.stop_pose_process()
+            proc.stop_capture_process()
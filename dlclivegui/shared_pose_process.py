@@ -0,0 +1,477 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import time
+import copy
+import ctypes
+import multiprocess as mp
+import numpy as np
+
+from dlclivegui.queue import SharedMailbox
+from dlclivegui.control import CommandChannel
+from dlclivegui.timing import LoopMonitor, wait_for, DEFAULT_SPIN_THRESHOLD
+from dlclivegui.pose_process import create_dlc_live, MAX_DISPLAY_KEYPOINTS
+from dlclivegui.pose_recorder import PoseRecorder, StreamingPoseRecorder
+
+
+# attributes of :class:`dlclive.DLCLive` that hold the loaded model: one group for tensorflow and tensorrt models, one for tflite models
+MODEL_ATTRIBUTES = (
+    ("sess", "inputs", "outputs"),
+    ("tflite_interpreter", "tflite_input_details", "tflite_output_details"),
+)
+
+
+class SharedModelError(Exception):
+    """
+    Exception for a model that cannot be shared between cameras
+    """
+
+    pass
+
+
+def share_model(source, dlc):
+    """ Let a :class:`dlclive.DLCLive` object use the model loaded by another one, instead of loading it again.
+    The objects share only the model; each keeps its own processor and cropping state.
+
+    DLCLive has no public interface for this, so the attributes that hold the model (:data:`MODEL_ATTRIBUTES`) are copied.
+    If `source` has none of the known groups of attributes (e.g. in a different version of DeepLabCut-live), a :class:`SharedModelError` is raised instead of leaving `dlc` without a model.
+
+    Parameters
+    ----------
+    source : :class:`dlclive.DLCLive`
+        a DLCLive object whose inference is initialized
+    dlc : :class:`dlclive.DLCLive`
+        a DLCLive object with the same model parameters, whose inference is not initialized
+
+    Raises
+    ------
+    SharedModelError
+        if the model of `source` is not stored in known attributes
+    """
+
+    for attrs in MODEL_ATTRIBUTES:
+        if all(getattr(source, a, None) is not None for a in attrs):
+            for a in attrs:
+                setattr(dlc, a, getattr(source, a))
+            dlc.is_initialized = True
+            return
+
+    raise SharedModelError(
+        "Cannot share the loaded model between cameras: this version of DeepLabCut-live does not store the model in any of the attributes "
+        f"{MODEL_ATTRIBUTES}. Start pose estimation without a shared model instead."
+    )
+
+
+class SharedModelPoseProcess(object):
+    """ Pose estimation for several cameras in a single background process, scheduled on shared models.
+
+    Cameras that use the same model (the same DeepLabCut-live parameters, apart from the processor) share one loaded model,
+    so the model is loaded and held in memory once. Each camera still has its own :class:`dlclive.DLCLive` object,
+    with its own processor and dynamic cropping state. In each cycle, the newest frame of every camera is gathered from its ring buffer,
+    poses are estimated one frame at a time, and each pose is dispatched back to its camera with the timestamp of the frame it was estimated from.
+    Frames are not stacked into one inference call (DeepLabCut-live estimates the pose of one frame at a time), so the time per cycle,
+    and the latency of each camera's poses, grows linearly with the number of cameras; use `max_latency` to bound latency.
+
+    Parameters
+    ----------
+    camera_procs : dict
+        dictionary of camera name to :class:`dlclivegui.CameraProcess`, whose capture processes provide the frames
+    ctx : :class:`multiprocess.Context`
+        multiprocessing context
+    max_latency : float, optional
+        frames older than `max_latency` seconds when their group is about to be processed are skipped, to keep latency bounded as the number of cameras grows.
+        By default None (never skip)
+    spin_threshold : float, optional
+        time in seconds to busy-wait for new frames before sleeping, by default 0.001
+    pose_chunk_size : int, optional
+        number of poses per preallocated chunk of each camera's pose recorder, by default 4096
+    stream_chunk_size : int, optional
+        number of poses per chunk written to disk after :meth:`start_pose_stream`, by default 256
+    """
+
+    def __init__(
+        self,
+        camera_procs,
+        ctx=mp.get_context("spawn"),
+        max_latency=None,
+        spin_threshold=DEFAULT_SPIN_THRESHOLD,
+        pose_chunk_size=4096,
+        stream_chunk_size=256,
+    ):
+        """ Constructor method
+        """
+
+        self.ctx = ctx
+        self.names = list(camera_procs.keys())
+        self.frame_buffers = {n: p.frame_buffer for n, p in camera_procs.items()}
+        self.display_resize = {
+            n: p.device.display_resize for n, p in camera_procs.items()
+        }
+        self.max_latency = max_latency
+        self.spin_threshold = spin_threshold
+        self.pose_chunk_size = pose_chunk_size
+        self.stream_chunk_size = stream_chunk_size
+
+        self.display_poses = {n: None for n in self.names}
+        self.display_pose_versions = {n: 0 for n in self.names}
+        self.display_pose_mailboxes = {
+            n: SharedMailbox((MAX_DISPLAY_KEYPOINTS, 3), ctx=self.ctx)
+            for n in self.names
+        }
+        self.latency = self.ctx.RawArray(ctypes.c_double, len(self.names))
+        self.n_skipped = self.ctx.RawArray(ctypes.c_int64, len(self.names))
+        self.cpu_usage = self.ctx.RawValue(ctypes.c_double, 0)
+
+        self.channel = CommandChannel("pose", ctx=self.ctx)
+        self.pose_process = None
+
+    def start_pose_process(self, dlc_params, timeout=300):
+        """ Start the pose estimation process
+
+        Parameters
+        ----------
+        dlc_params : dict
+            DeepLabCut-live parameters, either one dictionary for all cameras or a dictionary per camera name
+        timeout : int, optional
+            time to wait for the models to load, in seconds, by default 300
+
+        Returns
+        -------
+        bool
+            True if the models were loaded
+        """
+
+        if all(n in dlc_params for n in self.names):
+            params = {n: dlc_params[n].copy() for n in self.names}
+        else:
+            params = {n: dlc_params.copy() for n in self.names}
+
+        self.channel.clear()
+
+        self.pose_process = self.ctx.Process(
+            target=self._run_pose, args=(self.frame_buffers, params), daemon=True
+        )
+        self.pose_process.start()
+
+        resp = self.channel.wait("start", timeout=timeout)
+        if (resp is not None) and isinstance(resp.result, SharedModelError):
+            self.pose_process.join(5)
+            raise resp.result
+
+        return resp.result if resp is not None else False
+
+    def _run_pose(self, frame_buffers, dlc_params):
+
+        self.frame_buffers = frame_buffers
+
+        try:
+            ret = self._open_dlc_live(dlc_params)
+        except SharedModelError as e:
+            self.channel.notify("start", e)
+            return
+        self.channel.notify("start", ret)
+
+        self._pose_loop()
+        self.channel.notify("end")
+
+    def _open_dlc_live(self, dlc_params):
+        """ Create a DLCLive object per camera, and load one model per group of cameras with the same model parameters
+        """
+
+        self.frames = {
+            n: np.zeros(fb.shape, dtype=fb.dtype)
+            for n, fb in self.frame_buffers.items()
+        }
+        self.dlc = {}
+        models = {}
+
+        for name in self.names:
+
+            ### cameras may share one parameter dictionary, and create_dlc_live pops entries from it, so each camera gets its own copy
+
+            params = copy.deepcopy(dlc_params[name])
+            key = repr(sorted((k, v) for k, v in params.items() if k != "processor"))
+            self.dlc[name], _ = create_dlc_live(params)
+            self.frame_buffers[name].read_latest(out=self.frames[name])
+
+            if key in models:
+                share_model(models[key], self.dlc[name])
+                self.dlc[name].get_pose(self.frames[name], frame_time=0, record=False)
+            else:
+                self.dlc[name].init_inference(
+                    self.frames[name], frame_time=0, record=False
+                )
+                models[key] = self.dlc[name]
+
+        self.pose_recorders = {
+            n: PoseRecorder(self.pose_chunk_size) for n in self.names
+        }
+
+        return True
+
+    def _gather(self, names, last_seqs):
+        """ Copy the newest unprocessed frame of each camera out of its ring buffer
+
+        Returns
+        -------
+        list
+            list of (camera name, frame, frame time) for cameras with a new frame
+        """
+
+        batch = []
+        for name in names:
+            fb = self.frame_buffers[name]
+            if fb.latest_seq > last_seqs[name]:
+                frame, frame_time, seq = fb.read_latest(out=self.frames[name])
+                if frame is None:
+                    continue
+                last_seqs[name] = seq
+                if (self.max_latency is not None) and (
+                    time.time() - frame_time > self.max_latency
+                ):
+                    self.n_skipped[self.names.index(name)] += 1
+                    continue
+                batch.append((name, frame, frame_time))
+
+        return batch
+
+    def _pose_loop(self):
+        """ Gather frames from all cameras, estimate poses and dispatch them in a loop
+        """
+
+        run = True
+        write = False
+        last_seqs = {n: -1 for n in self.names}
+        monitor = LoopMonitor(self.cpu_usage)
+
+        while run:
+
+            wait_for(
+                lambda: any(
+                    fb.latest_seq > last_seqs[n] for n, fb in self.frame_buffers.items()
+                ),
+                timeout=0.1,
+                spin_threshold=self.spin_threshold,
+            )
+
+            for name, frame, frame_time in self._gather(self.names, last_seqs):
+
+                pose = self.dlc[name].get_pose(
+                    frame, frame_time=frame_time, record=write
+                )
+                pose_time = time.time()
+
+                self.display_pose_mailboxes[name].write(pose, pose_time)
+                self.latency[self.names.index(name)] = pose_time - frame_time
+
+                if write:
+                    self.pose_recorders[name].append(pose, frame_time, pose_time)
+
+            monitor.tick()
+
+            cmd = self.channel.poll()
+            if cmd is not None:
+                if cmd.name == "write":
+                    write = cmd.args[0]
+                    self.channel.reply(cmd, write)
+                elif cmd.name == "save":
+                    ret = self._save_pose(cmd.args[0])
+                    self.channel.reply(cmd, ret)
+                elif cmd.name == "stream":
+                    self._stream_pose(cmd.args[0])
+                    self.channel.reply(cmd, True)
+                elif cmd.name == "discard":
+                    self._discard_pose()
+                    self.channel.reply(cmd, True)
+                elif cmd.name == "end":
+                    run = False
+
+        for recorder in self.pose_recorders.values():
+            if isinstance(recorder, StreamingPoseRecorder):
+                recorder.close()
+
+    def _stream_pose(self, filenames):
+        """ Replace the pose recorder of each camera with one that writes to `{filename}_DLC.hdf5` while recording
+        """
+
+        for name in self.names:
+            self.pose_recorders[name].clear()
+            self.pose_recorders[name] = StreamingPoseRecorder(
+                filenames[name],
+                self.dlc[name].cfg["all_joints_names"],
+                self.stream_chunk_size,
+            )
+
+    def _discard_pose(self):
+        """ Drop the recorded poses of each camera, deleting streamed pose files
+        """
+
+        for name in self.names:
+            self.pose_recorders[name].clear()
+            self.pose_recorders[name] = PoseRecorder(self.pose_chunk_size)
+
+    def _save_pose(self, filenames):
+        """ Save the poses of each camera to `{filename}_DLC.hdf5`
+
+        Parameters
+        ----------
+        filenames : dict
+            dictionary of camera name to base file name
+
+        Returns
+        -------
+        bool
+            True if poses were saved for at least one camera
+        """
+
+        ret = False
+
+        for name in self.names:
+
+            dlc = self.dlc[name]
+            if self.pose_recorders[name].save(
+                filenames[name], dlc.cfg["all_joints_names"]
+            ):
+                ret = True
+            if isinstance(self.pose_recorders[name], StreamingPoseRecorder):
+                self.pose_recorders[name] = PoseRecorder(self.pose_chunk_size)
+            else:
+                self.pose_recorders[name].clear()
+
+            if dlc.processor is not None:
+                dlc.processor.save(f"{filenames[name]}_PROC")
+
+        return ret
+
+    def start_pose_stream(self, filenames, timeout=5):
+        """ Write poses recorded from now on to `{filename}_DLC.hdf5` of each camera while recording, instead of keeping them in memory until they are saved
+
+        Parameters
+        ----------
+        filenames : dict
+            dictionary of camera name to base file name
+
+        Returns
+        -------
+        bool
+            True if the pose process is streaming poses
+        """
+
+        ret = False
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            resp = self.channel.request("stream", filenames, timeout=timeout)
+            ret = resp.result if resp is not None else False
+
+        return ret
+
+    def start_record(self, timeout=5):
+
+        ret = False
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            resp = self.channel.request("write", True, timeout=timeout)
+            ret = resp.result if resp is not None else False
+
+        return ret
+
+    def stop_record(self, timeout=5):
+
+        ret = False
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            resp = self.channel.request("write", False, timeout=timeout)
+            ret = (not resp.result) if resp is not None else False
+
+        return ret
+
+    def save_pose(self, filenames, timeout=60):
+        """ Save the recorded poses of every camera
+
+        Parameters
+        ----------
+        filenames : dict
+            dictionary of camera name to base file name
+
+        Returns
+        -------
+        bool
+            True if poses were saved
+        """
+
+        ret = False
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            resp = self.channel.request("save", filenames, timeout=timeout)
+            if resp is not None:
+                ret = resp.result
+
+        return ret
+
+    def discard_pose(self, timeout=60):
+        """ Discard the recorded poses of every camera, including pose files written by :meth:`start_pose_stream`
+
+        Returns
+        -------
+        bool
+            True if the poses were discarded
+        """
+
+        ret = False
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            resp = self.channel.request("discard", timeout=timeout)
+            ret = resp.result if resp is not None else False
+
+        return ret
+
+    def stop_pose_process(self, timeout=None):
+
+        if (self.pose_process is not None) and self.pose_process.is_alive():
+            self.channel.send("end")
+            self.channel.wait("end", timeout=timeout)
+
+            self.pose_process.join(5)
+            if self.pose_process.is_alive():
+                self.pose_process.terminate()
+
+        return True
+
+    def get_display_pose(self, name):
+        """ Get the latest pose of a camera, scaled for display
+
+        Parameters
+        ----------
+        name : str
+            camera name
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the latest pose, or None
+        """
+
+        mailbox = self.display_pose_mailboxes[name]
+        if mailbox.version == self.display_pose_versions[name]:
+            return self.display_poses[name]
+
+        pose, _, self.display_pose_versions[name] = mailbox.read()
+        if pose is not None:
+            self.display_poses[name] = pose
+            if self.display_resize[name] != 1:
+                self.display_poses[name][:, :2] *= self.display_resize[name]
+
+        return self.display_poses[name]
+
+    def get_latency(self):
+        """ Get the latency of the latest pose of each camera (time from frame capture to pose), and the number of frames skipped because they exceeded `max_latency`
+
+        Returns
+        -------
+        dict
+            dictionary of camera name to (latency in seconds, number of skipped frames)
+        """
+
+        return {
+            n: (self.latency[i], self.n_skipped[i]) for i, n in enumerate(self.names)
+        }
@@ -0,0 +1,108 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import time
+
+
+DEFAULT_SPIN_THRESHOLD = 0.001
+
+
+def sleep_until(target_time, spin_threshold=DEFAULT_SPIN_THRESHOLD):
+    """ Wait until `target_time` (in seconds, as returned by :func:`time.time`).
+
+    Sleeps until `spin_threshold` seconds before the target time, then spins for the remaining time.
+    This gives the accuracy of a busy-wait for the last fraction of a millisecond without using a full core while waiting.
+
+    Parameters
+    ----------
+    target_time : float
+        time to wait until
+    spin_threshold : float, optional
+        time before the target time at which to stop sleeping and start spinning, in seconds.
+        0 sleeps for the whole time. By default 0.001
+    """
+
+    remaining = target_time - time.time()
+    while remaining > spin_threshold:
+        time.sleep(remaining - spin_threshold)
+        remaining = target_time - time.time()
+
+    while time.time() < target_time:
+        pass
+
+
+def wait_for(
+    condition, timeout=None, spin_threshold=DEFAULT_SPIN_THRESHOLD, poll_interval=0.0005
+):
+    """ Wait until `condition()` is True. Spins on the condition for `spin_threshold` seconds, then checks it every `poll_interval` seconds.
+
+    Parameters
+    ----------
+    condition : callable
+        a function that returns True when the wait is over
+    timeout : float, optional
+        maximum time to wait in seconds, by default None (wait forever)
+    spin_threshold : float, optional
+        time to spin before sleeping between checks, in seconds, by default 0.001
+    poll_interval : float, optional
+        time to sleep between checks after spinning, in seconds, by default 0.0005
+
+    Returns
+    -------
+    bool
+        True if the condition was met, False if the timeout expired
+    """
+
+    start_time = time.time()
+    spin_end = start_time + spin_threshold
+    end_time = start_time + timeout if timeout is not None else None
+
+    while not condition():
+        cur_time = time.time()
+        if (end_time is not None) and (cur_time >= end_time):
+            return False
+        if cur_time >= spin_end:
+            time.sleep(poll_interval)
+
+    return True
+
+
+class LoopMonitor(object):
+    """ Measures the fraction of a CPU core used by a loop, and stores it in a shared value so it can be read from another process.
+
+    Call :meth:`tick` once per loop iteration. CPU time is measured with :func:`time.process_time`, so it includes all threads of the process running the loop.
+
+    Parameters
+    ----------
+    shared_value : :class:`multiprocess.sharedctypes.RawValue`
+        a shared double in which the CPU usage (1.0 = one full core) is stored
+    interval : float, optional
+        how often to update the CPU usage, in seconds, by default 1.0
+    """
+
+    def __init__(self, shared_value, interval=1.0):
+        """ Constructor method
+        """
+
+        self.shared_value = shared_value
+        self.interval = interval
+        self.last_wall = time.time()
+        self.last_cpu = time.process_time()
+
+    def tick(self):
+        """ Update the CPU usage if more than `interval` seconds have passed since the last update
+        """
+
+        cur_wall = time.time()
+        if cur_wall - self.last_wall >= self.interval:
+            cur_cpu = time.process_time()
+            self.shared_value.value = (cur_cpu - self.last_cpu) / (
+                cur_wall - self.last_wall
+            )
+            self.last_wall = cur_wall
+            self.last_cpu = cur_cpu
@@ -7,13 +7,594 @@ Licensed under GNU Lesser General Public License v3.0
 
 
 import os
+import glob
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import warnings
+import threading
+from queue import Full
 import numpy as np
 import pandas as pd
 import cv2
 import colorcet as cc
+import multiprocess as mp
 from PIL import ImageColor
 from tqdm import tqdm
 
+from dlclivegui.queue import ClearableQueue
+from dlclivegui.writers import find_video_file
+from dlclivegui.segments import (
+    open_video,
+    manifest_file,
+    read_manifest,
+    concat_video_files,
+)
+
+
+def pose_array(poses):
+    """ Convert a pose data frame, as saved by DeepLabCut-live-GUI or :func:`dlclive.benchmark_videos`, to a dense array
+
+    Parameters
+    ----------
+    poses : :class:`pandas.DataFrame`
+        data frame with a (bodyparts, coords) column for every keypoint coordinate, and optionally "frame_time" and "pose_time" columns
+
+    Returns
+    -------
+    list
+        names of the bodyparts
+    :class:`numpy.ndarray`
+        array of poses, of shape (n_poses, n_bodyparts, 3), with x, y, likelihood for each bodypart
+    """
+
+    bodyparts = list(
+        dict.fromkeys(
+            c[0] for c in poses.columns if c[0] not in ["frame_time", "pose_time"]
+        )
+    )
+    pose_arr = np.stack(
+        [poses[bp][["x", "y", "likelihood"]].values for bp in bodyparts], axis=1
+    )
+
+    return bodyparts, pose_arr.astype(np.float64)
+
+
+def pose_indices(frame_times, pose_times):
+    """ Find the pose to draw on each frame: the latest pose obtained before the frame was captured
+
+    Parameters
+    ----------
+    frame_times : :class:`numpy.ndarray`
+        capture timestamps of the frames
+    pose_times : :class:`numpy.ndarray`
+        times the poses were obtained, in increasing order
+
+    Returns
+    -------
+    :class:`numpy.ndarray`
+        index of the pose for each frame, or -1 if no pose was obtained before the frame
+    """
+
+    return np.searchsorted(pose_times, frame_times, side="left") - 1
+
+
+def _seek_and_read(cap, index, n_frames):
+    """ Set the position of a video to frame `index` and read `n_frames` frames
+
+    Returns
+    -------
+    list
+        the frames, or None if the seek or a read failed
+    """
+
+    if not cap.set(cv2.CAP_PROP_POS_FRAMES, index):
+        return None
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != index:
+        return None
+
+    frames = []
+    for _ in range(n_frames):
+        ret, frame = cap.read()
+        if not ret:
+            return None
+        frames.append(frame)
+
+    return frames
+
+
+def seek_frame(cap, index):
+    """ Move an opened video to frame `index`, so that the next read returns that frame.
+
+    Sets :data:`cv2.CAP_PROP_POS_FRAMES`, which jumps to the nearest keyframe and decodes forward to the frame for most codecs.
+    The position a video reports after a seek only echoes the requested position, so the seek is checked against decoded frames instead:
+    frame `index` - 1 is decoded right after seeking to it, and again after seeking one frame earlier and reading forward. The two must be identical,
+    and for videos read with OpenCV, the timestamp of the frame must match its index. If the seek fails or the checks disagree,
+    the video is rewound and read frame by frame up to `index`.
+
+    Parameters
+    ----------
+    cap : :class:`cv2.VideoCapture`
+        the opened video, or a :class:`dlclivegui.segments.SegmentedVideoCapture` or :class:`dlclivegui.raw_video.RawVideoCapture`
+    index : int
+        index of the frame
+
+    Returns
+    -------
+    bool
+        True if the video is at frame `index`
+    """
+
+    if index > 2:
+
+        after_seek = _seek_and_read(cap, index - 1, 1)
+        sequential = (
+            _seek_and_read(cap, index - 2, 2) if after_seek is not None else None
+        )
+
+        if (sequential is not None) and np.array_equal(after_seek[0], sequential[1]):
+
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if (not isinstance(cap, cv2.VideoCapture)) or (fps <= 0):
+                return True
+
+            ### after reading frame `index` - 1, OpenCV reports the timestamp of that frame
+
+            expected = (index - 1) * 1000 / fps
+            if abs(cap.get(cv2.CAP_PROP_POS_MSEC) - expected) < 500 / fps:
+                return True
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(index):
+        ret, _ = cap.read()
+        if not ret:
+            return False
+
+    return True
+
+
+class FrameLabeler(object):
+    """ Draws keypoints, crops and writes timestamps on the frames of a labeled video. Holds everything needed to label any frame,
+    so it can be sent to worker processes that label different parts of the video.
+
+    Parameters
+    ----------
+    frame_times : :class:`numpy.ndarray`
+        capture timestamps of the frames
+    pose_arr : :class:`numpy.ndarray`
+        array of poses, of shape (n_poses, n_bodyparts, 3)
+    frame_pose_ind : :class:`numpy.ndarray`
+        index of the pose to draw on each frame, or -1 for none
+    colors : list
+        BGR color of each bodypart
+    radius : int
+        radius for keypoints
+    lik_thresh : float
+        likelihood threshold to plot keypoints
+    label : bool
+        draw keypoints
+    crop : list
+        crop region [y0, y1, x0, x1], or None
+    ts_params : dict
+        arguments of :func:`cv2.putText` to write the time on each frame (without the text), or None
+    write_ts_offset : float
+        offset subtracted from the written time
+    im_dir : str
+        directory to save every frame as an image, or None. Images are saved by the encoding stage of :func:`_render_frames`
+    """
+
+    def __init__(
+        self,
+        frame_times,
+        pose_arr,
+        frame_pose_ind,
+        colors,
+        radius,
+        lik_thresh,
+        label,
+        crop,
+        ts_params,
+        write_ts_offset,
+        im_dir,
+    ):
+        """ Constructor method
+        """
+
+        self.frame_times = frame_times
+        self.pose_arr = pose_arr
+        self.frame_pose_ind = frame_pose_ind
+        self.colors = colors
+        self.radius = radius
+        self.lik_thresh = lik_thresh
+        self.label = label
+        self.crop = crop
+        self.ts_params = ts_params
+        self.write_ts_offset = write_ts_offset
+        self.im_dir = im_dir
+
+    def __call__(self, frame, i):
+        """ Label frame `i` of the video
+
+        Parameters
+        ----------
+        frame : :class:`numpy.ndarray`
+            the frame
+        i : int
+            index of the frame
+
+        Returns
+        -------
+        :class:`numpy.ndarray`
+            the labeled frame
+        """
+
+        if self.label and (self.frame_pose_ind[i] >= 0):
+            this_pose = self.pose_arr[self.frame_pose_ind[i]]
+            for j in np.flatnonzero(this_pose[:, 2] > self.lik_thresh):
+                x = int(this_pose[j, 0])
+                y = int(this_pose[j, 1])
+                frame = cv2.circle(
+                    frame, (x, y), self.radius, self.colors[j], thickness=-1
+                )
+
+        if self.crop is not None:
+            frame = frame[self.crop[0] : self.crop[1], self.crop[2] : self.crop[3]]
+
+        if self.ts_params is not None:
+            vid_time = self.frame_times[i] - self.frame_times[0]
+            frame = cv2.putText(
+                frame, f"{(vid_time-self.write_ts_offset):0.3f}", **self.ts_params
+            )
+
+        return frame
+
+
+def _put(q, item, stop):
+    """ Put an item in a bounded queue, waiting for space until `stop` is set
+
+    Returns
+    -------
+    bool
+        True if the item was queued
+    """
+
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except Full:
+            pass
+
+    return False
+
+
+def _decode_frames(cap, labeler, first, last, frame_queue, stats, stop):
+    """ Read frames `first` to `last` (excluded) into `frame_queue`, as (index, frame). Ends with None, or with an exception if a frame cannot be read
+    """
+
+    for i in range(first, last):
+
+        t0 = time.perf_counter()
+        ret, frame = cap.read()
+        stats["decode"][1] += time.perf_counter() - t0
+
+        if not ret:
+            cur_time = labeler.frame_times[i] - labeler.frame_times[0]
+            _put(
+                frame_queue,
+                Exception(f"Could not read frame = {i+1} at time = {cur_time}."),
+                stop,
+            )
+            return
+
+        stats["decode"][0] += 1
+        if not _put(frame_queue, (i, frame), stop):
+            return
+
+    _put(frame_queue, None, stop)
+
+
+def _encode_frames(vwriter, im_dir, label_queue, stats, errors):
+    """ Write labeled frames from `label_queue` to the video writer, and save them as images if `im_dir` is set, until None is received.
+    After an error, frames are still taken from the queue, so the labeling stage never waits on a full queue
+    """
+
+    while True:
+
+        item = label_queue.get()
+        if item is None:
+            break
+        if errors:
+            continue
+
+        i, frame = item
+        t0 = time.perf_counter()
+        try:
+            vwriter.write(frame)
+            if im_dir is not None:
+                cv2.imwrite(f"{im_dir}/frame_{i}.png", frame)
+        except Exception as e:
+            errors.append(e)
+        stats["encode"][1] += time.perf_counter() - t0
+        stats["encode"][0] += 1
+
+
+def _stage_rates(stats):
+    """ Frames per second of busy time of each stage of :func:`_render_frames`, for the progress bar
+    """
+
+    return {
+        stage: f"{n / t:0.0f} fps" if t > 0 else "-" for stage, (n, t) in stats.items()
+    }
+
+
+def _render_frames(
+    cap, vwriter, labeler, first, last, progress=False, display=False, queue_size=32,
+):
+    """ Read frames `first` to `last` (excluded) from an opened video, label them, and write them to a video writer.
+    Frames go through three stages that run at the same time: a thread decodes frames, the calling thread labels (and displays) them,
+    and another thread encodes them (and saves images). The stages are connected by bounded queues, so decoding and encoding overlap
+    and at most `queue_size` frames wait between two stages. The progress bar shows the rate of each stage while it is busy; the slowest stage limits the labeling rate.
+
+    Returns
+    -------
+    list
+        timestamps of the written frames
+    """
+
+    frame_queue = ClearableQueue(queue_size)
+    label_queue = ClearableQueue(queue_size)
+    stats = {"decode": [0, 0.0], "label": [0, 0.0], "encode": [0, 0.0]}
+    errors = []
+    stop = threading.Event()
+
+    decoder = threading.Thread(
+        target=_decode_frames,
+        args=(cap, labeler, first, last, frame_queue, stats, stop),
+        daemon=True,
+    )
+    encoder = threading.Thread(
+        target=_encode_frames,
+        args=(vwriter, labeler.im_dir, label_queue, stats, errors),
+        daemon=True,
+    )
+    decoder.start()
+    encoder.start()
+
+    pbar = tqdm(total=last - first) if progress else None
+    last_postfix = time.time()
+    label_times = []
+
+    try:
+
+        while True:
+
+            item = frame_queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if errors:
+                raise errors[0]
+
+            i, frame = item
+            t0 = time.perf_counter()
+            frame = labeler(frame, i)
+
+            if display:
+                cv2.imshow("DLC Live Labeled Video", frame)
+                cv2.waitKey(1)
+
+            stats["label"][1] += time.perf_counter() - t0
+            stats["label"][0] += 1
+
+            label_queue.put((i, frame))
+            label_times.append(labeler.frame_times[i])
+
+            if pbar is not None:
+                pbar.update(1)
+                if time.time() - last_postfix > 0.5:
+                    pbar.set_postfix(_stage_rates(stats), refresh=False)
+                    last_postfix = time.time()
+
+    finally:
+
+        stop.set()
+        label_queue.put(None)
+        encoder.join()
+        decoder.join()
+        if pbar is not None:
+            pbar.set_postfix(_stage_rates(stats))
+            pbar.close()
+
+    if errors:
+        raise errors[0]
+
+    return label_times
+
+
+def _render_part(args):
+    """ Label frames `first` to `last` (excluded) of a recording into their own video file, in a worker process
+
+    Parameters
+    ----------
+    args : tuple
+        (base_file, part_file, fps, im_size, labeler, first, last)
+
+    Returns
+    -------
+    list
+        timestamps of the written frames
+    """
+
+    base_file, part_file, fps, im_size, labeler, first, last = args
+
+    cap = open_video(base_file)
+    if not seek_frame(cap, first):
+        raise Exception(f"Could not seek to frame = {first+1}.")
+
+    vwriter = cv2.VideoWriter(part_file, cv2.VideoWriter_fourcc(*"DIVX"), fps, im_size)
+    label_times = _render_frames(cap, vwriter, labeler, first, last)
+    vwriter.release()
+    cap.release()
+
+    return label_times
+
+
+def session_files(data_dir, out_dir=None, dlc_online=True, label=True):
+    """ Paths of the input and output files of a labeled video for a DeepLabCut-live-GUI recording
+
+    Parameters
+    ----------
+    data_dir : str
+        path to data directory
+    out_dir : str, optional
+        directory of the labeled video, by default None (the data directory)
+    dlc_online : bool, optional
+        use poses from online tracking (True) or from :func:`dlclive.benchmark_videos` (False), by default True
+    label : bool, optional
+        labeled (True) or unlabeled (False) output, by default True
+
+    Returns
+    -------
+    dict
+        dictionary with keys "base_file", "video_file", "ts_file", "dlc_file", "out_file", "out_times_file",
+        "params_file", the file that records the parameters and inputs the labeled video was made with, and "inputs", the list of files the labeled video is made from
+    """
+
+    data_dir = os.path.normpath(data_dir)
+    base_dir = os.path.basename(data_dir)
+    base_file = os.path.normpath(f"{data_dir}/{base_dir}")
+    ts_file = os.path.normpath(f"{data_dir}/{base_dir}_TS.npy")
+    dlc_file = (
+        os.path.normpath(f"{data_dir}/{base_dir}_DLC.hdf5")
+        if dlc_online
+        else os.path.normpath(f"{data_dir}/{base_dir}_VIDEO_DLCLIVE_POSES.h5")
+    )
+
+    if os.path.isfile(manifest_file(base_file)):
+        video_file = f"{base_file}_VIDEO.avi"
+        video_inputs = [manifest_file(base_file)] + [
+            seg["video_file"] for seg in read_manifest(base_file)["segments"]
+        ]
+    else:
+        video_file = find_video_file(base_file)
+        video_inputs = [video_file]
+
+    lab = "LABELED" if label else "UNLABELED"
+    if out_dir:
+        out_file = (
+            f"{out_dir}/{os.path.splitext(os.path.basename(video_file))[0]}_{lab}.avi"
+        )
+        out_times_file = (
+            f"{out_dir}/{os.path.splitext(os.path.basename(ts_file))[0]}_{lab}.npy"
+        )
+    else:
+        out_file = f"{os.path.splitext(video_file)[0]}_{lab}.avi"
+        out_times_file = f"{os.path.splitext(ts_file)[0]}_{lab}.npy"
+
+    return {
+        "base_file": base_file,
+        "video_file": video_file,
+        "ts_file": ts_file,
+        "dlc_file": dlc_file,
+        "out_file": out_file,
+        "out_times_file": out_times_file,
+        "params_file": f"{os.path.splitext(out_file)[0]}.json",
+        "inputs": video_inputs + [ts_file, dlc_file],
+    }
+
+
+def labeling_params(**kwargs):
+    """ The parameters of :func:`create_labeled_video` that change the labeled video, with defaults for parameters that are not given
+
+    Parameters
+    ----------
+    **kwargs
+        keyword arguments of :func:`create_labeled_video`
+
+    Returns
+    -------
+    dict
+        the parameters, converted to json types
+    """
+
+    params = {
+        k: v.default
+        for k, v in inspect.signature(create_labeled_video).parameters.items()
+        if k not in ["data_dir", "out_dir", "display", "progress", "workers"]
+    }
+    params.update({k: v for k, v in kwargs.items() if k in params})
+
+    ### numpy scalars and arrays are stored as python numbers and lists
+
+    return json.loads(
+        json.dumps(
+            params, default=lambda v: v.tolist() if hasattr(v, "tolist") else str(v)
+        )
+    )
+
+
+def labeling_hash(files, params):
+    """ Hash of the parameters of a labeled video and the size and modification time of each of its inputs
+
+    Parameters
+    ----------
+    files : dict
+        file paths, as returned by :func:`session_files`
+    params : dict
+        labeling parameters, as returned by :func:`labeling_params`
+
+    Returns
+    -------
+    str
+        the hash, or None if an input file is missing
+    """
+
+    if not all(os.path.isfile(f) for f in files["inputs"]):
+        return None
+
+    inputs = [
+        (os.path.basename(f), os.path.getsize(f), os.stat(f).st_mtime_ns)
+        for f in files["inputs"]
+    ]
+    key = json.dumps({"params": params, "inputs": inputs}, sort_keys=True)
+
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def is_up_to_date(files, params):
+    """ Check whether a labeled video exists and was made with the same parameters from the same inputs, by comparing :func:`labeling_hash` with the hash in `params_file`
+
+    Parameters
+    ----------
+    files : dict
+        file paths, as returned by :func:`session_files`
+    params : dict
+        labeling parameters, as returned by :func:`labeling_params`
+
+    Returns
+    -------
+    bool
+        True if the labeled video does not need to be created again
+    """
+
+    outputs = [files["out_file"], files["out_times_file"], files["params_file"]]
+    if not all(os.path.isfile(f) for f in outputs):
+        return False
+
+    try:
+        with open(files["params_file"]) as f:
+            saved_hash = json.load(f).get("hash")
+    except (OSError, ValueError):
+        return False
+
+    new_hash = labeling_hash(files, params)
+
+    return (new_hash is not None) and (saved_hash == new_hash)
+
 
 def create_labeled_video(
     data_dir,
@@ -32,6 +613,7 @@ def create_labeled_video(
     display=False,
     progress=True,
     label=True,
+    workers=1,
 ):
     """ Create a labeled video from DeepLabCut-live-GUI recording
 
@@ -57,6 +639,17 @@ def create_labeled_video(
         boolean flag to display images as video is written, by default False
     progress : bool, optional
         boolean flag to display progress bar
+    label : bool, optional
+        boolean flag to draw keypoints, by default True
+    workers : int, optional
+        number of processes that label the video in parallel, by default 1. With several workers, the frames are split into one range per worker;
+        each worker seeks to the start of its range, labels it and encodes it to a separate file, and the files are joined in order without re-encoding.
+        Joining requires `ffmpeg`; without it, a warning is issued and the video is labeled by one process. `display` is ignored with several workers
+
+    Returns
+    -------
+    str
+        path to the labeled video
 
     Raises
     ------
@@ -64,33 +657,39 @@ def create_labeled_video(
         if frames cannot be read from the video file
     """
 
-    base_dir = os.path.basename(data_dir)
-    video_file = os.path.normpath(f"{data_dir}/{base_dir}_VIDEO.avi")
-    ts_file = os.path.normpath(f"{data_dir}/{base_dir}_TS.npy")
-    dlc_file = (
-        os.path.normpath(f"{data_dir}/{base_dir}_DLC.hdf5")
-        if dlc_online
-        else os.path.normpath(f"{data_dir}/{base_dir}_VIDEO_DLCLIVE_POSES.h5")
+    params = labeling_params(
+        dlc_online=dlc_online,
+        save_images=save_images,
+        cut=cut,
+        crop=crop,
+        cmap=cmap,
+        radius=radius,
+        lik_thresh=lik_thresh,
+        write_ts=write_ts,
+        write_scale=write_scale,
+        write_pos=write_pos,
+        write_ts_offset=write_ts_offset,
+        label=label,
     )
 
-    cap = cv2.VideoCapture(video_file)
+    files = session_files(data_dir, out_dir=out_dir, dlc_online=dlc_online, label=label)
+    base_file = files["base_file"]
+    ts_file = files["ts_file"]
+    dlc_file = files["dlc_file"]
+    out_file = files["out_file"]
+    out_times_file = files["out_times_file"]
+
+    cap = open_video(base_file)
     cam_frame_times = np.load(ts_file)
     n_frames = cam_frame_times.size
 
-    lab = "LABELED" if label else "UNLABELED"
-    if out_dir:
-        out_file = (
-            f"{out_dir}/{os.path.splitext(os.path.basename(video_file))[0]}_{lab}.avi"
-        )
-        out_times_file = (
-            f"{out_dir}/{os.path.splitext(os.path.basename(ts_file))[0]}_{lab}.npy"
-        )
-    else:
-        out_file = f"{os.path.splitext(video_file)[0]}_{lab}.avi"
-        out_times_file = f"{os.path.splitext(ts_file)[0]}_{lab}.npy"
-
     os.makedirs(os.path.normpath(os.path.dirname(out_file)), exist_ok=True)
 
+    ### the parameter file is written last, so a video that is interrupted while it is labeled is never up to date
+
+    if os.path.isfile(files["params_file"]):
+        os.remove(files["params_file"])
+
     if save_images:
         im_dir = os.path.splitext(out_file)[0]
         os.makedirs(im_dir, exist_ok=True)
@@ -106,10 +705,8 @@ def create_labeled_video(
         crop[3] = crop[3] if crop[3] > 0 else im_size[0]
         im_size = (crop[3] - crop[2], crop[1] - crop[0])
 
-    fourcc = cv2.VideoWriter_fourcc(*"DIVX")
     fps = cap.get(cv2.CAP_PROP_FPS)
-    vwriter = cv2.VideoWriter(out_file, fourcc, fps, im_size)
-    label_times = []
+    ts_params = None
 
     if write_ts:
         ts_font = cv2.FONT_HERSHEY_PLAIN
@@ -126,109 +723,261 @@ def create_labeled_video(
         else:
             ts_h = 0 if crop is None else crop[0] + (12 * write_scale)
 
-        ts_coord = (ts_w, ts_h)
-        ts_color = (255, 255, 255)
-        ts_size = 2
+        ts_params = {
+            "org": (ts_w, ts_h),
+            "fontFace": ts_font,
+            "fontScale": write_scale,
+            "color": (255, 255, 255),
+            "thickness": 2,
+        }
+
+    ### convert poses to a dense array once, and find the pose for every frame with one search
 
     poses = pd.read_hdf(dlc_file)
+    bodyparts, pose_arr = pose_array(poses)
     if dlc_online:
-        pose_times = poses["pose_time"]
+        frame_pose_ind = pose_indices(
+            cam_frame_times, np.asarray(poses["pose_time"]).reshape(-1)
+        )
     else:
-        poses["frame_time"] = cam_frame_times
-        poses["pose_time"] = cam_frame_times
-    poses = poses.melt(id_vars=["frame_time", "pose_time"])
-    bodyparts = poses["bodyparts"].unique()
+        frame_pose_ind = np.arange(n_frames)
+        frame_pose_ind[frame_pose_ind >= pose_arr.shape[0]] = -1
 
     all_colors = getattr(cc, cmap)
     colors = [
         ImageColor.getcolor(c, "RGB")[::-1]
-        for c in all_colors[:: int(len(all_colors) / bodyparts.size)]
+        for c in all_colors[:: max(int(len(all_colors) / len(bodyparts)), 1)]
     ]
 
-    ind = 0
-    vid_time = 0
-    while vid_time < cut[0]:
+    labeler = FrameLabeler(
+        cam_frame_times,
+        pose_arr,
+        frame_pose_ind,
+        colors,
+        radius,
+        lik_thresh,
+        label,
+        crop,
+        ts_params,
+        write_ts_offset,
+        im_dir if save_images else None,
+    )
 
-        cur_time = cam_frame_times[ind]
-        vid_time = cur_time - cam_frame_times[0]
-        ret, frame = cap.read()
-        ind += 1
+    ### the first frame after cut[0], and as many frames as there are between cut[0] and cut[1]. Frames before cut[0] are skipped by seeking, not decoded
 
-        if not ret:
-            raise Exception(
-                f"Could not read frame = {ind+1} at time = {cur_time-cam_frame_times[0]}."
-            )
+    rel_times = cam_frame_times - cam_frame_times[0]
+    first = int(np.searchsorted(rel_times, cut[0]) + 1) if cut[0] > 0 else 0
+    n_cut = np.count_nonzero((rel_times > cut[0]) & (rel_times < cut[1]))
+    last = min(first + n_cut, n_frames)
 
-    frame_times_sub = cam_frame_times[
-        (cam_frame_times - cam_frame_times[0] > cut[0])
-        & (cam_frame_times - cam_frame_times[0] < cut[1])
-    ]
-    iterator = (
-        tqdm(range(ind, ind + frame_times_sub.size))
-        if progress
-        else range(ind, ind + frame_times_sub.size)
-    )
-    this_pose = np.zeros((bodyparts.size, 3))
+    if (workers > 1) and (shutil.which("ffmpeg") is None):
+        warnings.warn(
+            "Labeling with several workers requires ffmpeg to join the parts of the video without re-encoding. "
+            "ffmpeg was not found, so the video is labeled by one process."
+        )
+        workers = 1
 
-    for i in iterator:
+    if workers > 1:
 
-        cur_time = cam_frame_times[i]
-        vid_time = cur_time - cam_frame_times[0]
-        ret, frame = cap.read()
+        cap.release()
 
-        if not ret:
-            raise Exception(
-                f"Could not read frame = {i+1} at time = {cur_time-cam_frame_times[0]}."
+        bounds = np.linspace(first, last, workers + 1).astype(int)
+        parts = [
+            (
+                base_file,
+                f"{os.path.splitext(out_file)[0]}_PART{k:04d}.avi",
+                fps,
+                im_size,
+                labeler,
+                bounds[k],
+                bounds[k + 1],
             )
+            for k in range(workers)
+            if bounds[k + 1] > bounds[k]
+        ]
 
-        if dlc_online:
-            poses_before_index = np.where(pose_times < cur_time)[0]
-            if poses_before_index.size > 0:
-                cur_pose_time = pose_times[poses_before_index[-1]]
-                this_pose = poses[poses["pose_time"] == cur_pose_time]
-        else:
-            this_pose = poses[poses["frame_time"] == cur_time]
-
-        if label:
-            for j in range(bodyparts.size):
-                this_bp = this_pose[this_pose["bodyparts"] == bodyparts[j]][
-                    "value"
-                ].values
-                if this_bp[2] > lik_thresh:
-                    x = int(this_bp[0])
-                    y = int(this_bp[1])
-                    frame = cv2.circle(frame, (x, y), radius, colors[j], thickness=-1)
-
-        if crop is not None:
-            frame = frame[crop[0] : crop[1], crop[2] : crop[3]]
-
-        if write_ts:
-            frame = cv2.putText(
-                frame,
-                f"{(vid_time-write_ts_offset):0.3f}",
-                ts_coord,
-                ts_font,
-                write_scale,
-                ts_color,
-                ts_size,
-            )
+        with mp.get_context("spawn").Pool(workers) as pool:
+            results = pool.imap(_render_part, parts)
+            if progress:
+                results = tqdm(results, total=len(parts))
+            label_times = [t for part_times in results for t in part_times]
 
-        if display:
-            cv2.imshow("DLC Live Labeled Video", frame)
-            cv2.waitKey(1)
+        part_files = [part[1] for part in parts]
+        concat_video_files(part_files, out_file)
+        for part_file in part_files:
+            os.remove(part_file)
 
-        vwriter.write(frame)
-        label_times.append(cur_time)
-        if save_images:
-            new_file = f"{im_dir}/frame_{i}.png"
-            cv2.imwrite(new_file, frame)
+    else:
 
-    if display:
-        cv2.destroyAllWindows()
+        if not seek_frame(cap, first):
+            raise Exception(f"Could not seek to frame = {first+1}.")
+
+        vwriter = cv2.VideoWriter(
+            out_file, cv2.VideoWriter_fourcc(*"DIVX"), fps, im_size
+        )
+        label_times = _render_frames(
+            cap, vwriter, labeler, first, last, progress=progress, display=display
+        )
+        vwriter.release()
+
+        if display:
+            cv2.destroyAllWindows()
 
-    vwriter.release()
     np.save(out_times_file, label_times)
 
+    with open(files["params_file"], "w") as f:
+        json.dump({"hash": labeling_hash(files, params), "params": params}, f, indent=4)
+
+    return out_file
+
+
+def find_sessions(patterns):
+    """ Find the session directories matching a list of paths or glob patterns
+
+    Parameters
+    ----------
+    patterns : list
+        paths or glob patterns of DeepLabCut-live-GUI data directories
+
+    Returns
+    -------
+    list
+        normalized paths of the directories, in the order given and without duplicates.
+        Paths that match nothing are kept, so that they are reported as errors
+    """
+
+    data_dirs = []
+    for pattern in patterns:
+        matches = sorted(d for d in glob.glob(pattern) if os.path.isdir(d))
+        for d in matches if matches else [pattern]:
+            d = os.path.normpath(d)
+            if d not in data_dirs:
+                data_dirs.append(d)
+
+    return data_dirs
+
+
+def _label_session(args):
+    """ Label one session in a pool worker, and return its entry of the batch report
+    """
+
+    data_dir, force, kwargs = args
+    kwargs = dict(kwargs)
+    if kwargs.get("crop") is not None:
+        kwargs["crop"] = list(kwargs["crop"])
+    result = {
+        "dir": data_dir,
+        "status": None,
+        "out_file": None,
+        "n_frames": 0,
+        "seconds": 0.0,
+        "fps": None,
+        "error": None,
+    }
+
+    try:
+        if not os.path.isdir(data_dir):
+            raise FileNotFoundError(f"Directory {data_dir} does not exist")
+
+        files = session_files(
+            data_dir,
+            out_dir=kwargs.get("out_dir"),
+            dlc_online=kwargs.get("dlc_online", True),
+            label=kwargs.get("label", True),
+        )
+        result["out_file"] = files["out_file"]
+
+        if (not force) and is_up_to_date(files, labeling_params(**kwargs)):
+            result["status"] = "skipped"
+            result["n_frames"] = int(np.load(files["out_times_file"]).size)
+            return result
+
+        start = time.time()
+        create_labeled_video(data_dir, **kwargs)
+        result["seconds"] = time.time() - start
+        result["n_frames"] = int(np.load(files["out_times_file"]).size)
+        result["fps"] = (
+            result["n_frames"] / result["seconds"] if result["seconds"] > 0 else None
+        )
+        result["status"] = "done"
+
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    return result
+
+
+def label_sessions(
+    data_dirs, jobs=1, force=False, report_file=None, progress=True, **kwargs
+):
+    """ Create labeled videos for many DeepLabCut-live-GUI recordings, on a pool of processes.
+    Sessions whose labeled video was made with the same parameters from the same inputs (video, timestamps and poses) are skipped, unless `force` is True.
+    An error in one session is recorded in the report, and does not stop the others.
+
+    Parameters
+    ----------
+    data_dirs : list
+        paths or glob patterns of data directories
+    jobs : int, optional
+        number of sessions labeled at the same time, by default 1. With several jobs, each session is labeled by one process (`workers` is set to 1)
+    force : bool, optional
+        label sessions even if their labeled video is up to date, by default False
+    report_file : str, optional
+        path of a json file to write the report to, by default None (no file)
+    progress : bool, optional
+        boolean flag to display progress bars, by default True
+    **kwargs
+        keyword arguments of :func:`create_labeled_video`
+
+    Returns
+    -------
+    dict
+        the report, with keys "sessions", a list with one dictionary per session (keys "dir", "status" ("done", "skipped" or "error"), "out_file", "n_frames", "seconds", "fps" and "error"),
+        and "done", "skipped", "errors", "seconds" and "fps", totals over all sessions
+    """
+
+    data_dirs = find_sessions(data_dirs)
+    start = time.time()
+
+    if jobs > 1:
+
+        ### pool workers are daemonic and cannot start their own pool, and several progress bars at once are unreadable
+
+        kwargs["workers"] = 1
+        kwargs["progress"] = False
+        tasks = [(d, force, kwargs) for d in data_dirs]
+
+        with mp.get_context("spawn").Pool(min(jobs, max(len(tasks), 1))) as pool:
+            results = pool.imap(_label_session, tasks)
+            if progress:
+                results = tqdm(results, total=len(tasks))
+            sessions = list(results)
+
+    else:
+
+        kwargs["progress"] = progress
+        sessions = [_label_session((d, force, kwargs)) for d in data_dirs]
+
+    done = [s for s in sessions if s["status"] == "done"]
+    seconds = time.time() - start
+    n_frames = sum(s["n_frames"] for s in done)
+
+    report = {
+        "sessions": sessions,
+        "done": len(done),
+        "skipped": sum(s["status"] == "skipped" for s in sessions),
+        "errors": sum(s["status"] == "error" for s in sessions),
+        "seconds": seconds,
+        "fps": n_frames / seconds if seconds > 0 else None,
+    }
+
+    if report_file is not None:
+        with open(report_file, "w") as f:
+            json.dump(report, f, indent=4)
+
+    return report
+
 
 def main():
 
@@ -236,7 +985,7 @@ def main():
     import os
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("dir", type=str)
+    parser.add_argument("dir", type=str, nargs="+")
     parser.add_argument("-o", "--out-dir", type=str, default=None)
     parser.add_argument("--dlc-offline", action="store_true")
     parser.add_argument("-s", "--save-images", action="store_true")
@@ -252,10 +1001,17 @@ def main():
     parser.add_argument("-d", "--display", action="store_true")
     parser.add_argument("--no-progress", action="store_false")
     parser.add_argument("--no-label", action="store_false")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-f", "--force", action="store_true")
+    parser.add_argument("--report", type=str, default=None)
     args = parser.parse_args()
 
-    create_labeled_video(
+    report = label_sessions(
         args.dir,
+        jobs=args.jobs,
+        force=args.force,
+        report_file=args.report,
         out_dir=args.out_dir,
         dlc_online=(not args.dlc_offline),
         save_images=args.save_images,
@@ -271,4 +1027,19 @@ def main():
         display=args.display,
         progress=args.no_progress,
         label=args.no_label,
+        workers=args.workers,
+    )
+
+    for session in report["sessions"]:
+        if session["status"] == "done":
+            print(
+                f"{session['dir']}: {session['n_frames']} frames, {session['fps']:0.1f} fps"
+            )
+        elif session["status"] == "skipped":
+            print(f"{session['dir']}: up to date, skipped (use --force to relabel)")
+        else:
+            print(f"{session['dir']}: {session['error']}")
+
+    print(
+        f"{report['done']} labeled, {report['skipped']} skipped, {report['errors']} errors in {report['seconds']:0.1f} s"
     )
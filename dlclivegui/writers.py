@@ -0,0 +1,399 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import os
+import time
+import shutil
+import subprocess
+import tempfile
+import cv2
+import numpy as np
+
+from dlclivegui.npy_file import NpyAppender
+
+
+class VideoWriterError(Exception):
+    """
+    Exception for incorrect use of video writers
+    """
+
+    pass
+
+
+class VideoWriter(object):
+    """ Base class for video writer backends. Writes frames to `{filename}_VIDEO{extension}`, or `{filename}_VIDEO_{segment}{extension}` for a segment of a recording, and measures the time spent encoding.
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    fps : float
+        frame rate of the video
+    im_size : tuple
+        size of the frames, (width, height)
+    segment : int, optional
+        index of the segment, by default None (not a segmented recording)
+    """
+
+    extension = ".avi"
+
+    def __init__(self, filename, fps, im_size, segment=None):
+        """ Constructor method
+        """
+
+        self.video_file = (
+            f"{filename}_VIDEO{self.extension}"
+            if segment is None
+            else f"{filename}_VIDEO_{segment:04d}{self.extension}"
+        )
+        self.fps = fps
+        self.im_size = tuple(int(s) for s in im_size)
+        self.n_frames = 0
+        self.encode_time = 0
+
+    def is_opened(self):
+        """ Check that the writer is ready to write frames
+        """
+
+        return True
+
+    def write(self, frame, timestamp=None):
+        """ Encode a frame and count the time spent encoding
+
+        Parameters
+        ----------
+        frame : :class:`numpy.ndarray`
+            a BGR image of shape (height, width, 3)
+        timestamp : float, optional
+            capture timestamp of the frame, used by writers that store timestamps, by default None
+        """
+
+        t0 = time.perf_counter()
+        self._write(frame)
+        self.encode_time += time.perf_counter() - t0
+        self.n_frames += 1
+
+    def _write(self, frame):
+
+        raise NotImplementedError
+
+    def release(self):
+        """ Finish writing and close the video file
+        """
+
+        pass
+
+    def remove(self):
+        """ Delete the video file
+        """
+
+        if os.path.isfile(self.video_file):
+            os.remove(self.video_file)
+
+    @property
+    def encode_fps(self):
+        """ Sustained encoding rate, in frames per second of time spent encoding
+        """
+
+        return self.n_frames / self.encode_time if self.encode_time > 0 else 0
+
+
+class OpenCVWriter(VideoWriter):
+    """ Writes video files with :class:`cv2.VideoWriter`
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    fps : float
+        frame rate of the video
+    im_size : tuple
+        size of the frames, (width, height)
+    fourcc : str, optional
+        four character code of the codec, or None to write uncompressed frames, by default "DIVX"
+    extension : str, optional
+        video file extension, which selects the container, by default ".avi"
+    segment : int, optional
+        index of the segment, by default None (not a segmented recording)
+    """
+
+    def __init__(
+        self, filename, fps, im_size, fourcc="DIVX", extension=".avi", segment=None
+    ):
+        """ Constructor method
+        """
+
+        self.extension = extension
+        super().__init__(filename, fps, im_size, segment=segment)
+
+        self.video_writer = cv2.VideoWriter(
+            self.video_file,
+            cv2.VideoWriter_fourcc(*fourcc) if fourcc is not None else 0,
+            self.fps,
+            self.im_size,
+        )
+
+    def is_opened(self):
+
+        return self.video_writer.isOpened()
+
+    def _write(self, frame):
+
+        self.video_writer.write(frame)
+
+    def release(self):
+
+        self.video_writer.release()
+
+
+class FFmpegWriter(VideoWriter):
+    """ Writes video files by piping raw frames to an ffmpeg subprocess. Requires the `ffmpeg` executable to be on the path.
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    fps : float
+        frame rate of the video
+    im_size : tuple
+        size of the frames, (width, height)
+    codec : str, optional
+        ffmpeg video codec, by default "libx264"
+    preset : str, optional
+        encoder preset, trading compression for speed (e.g. "ultrafast", "fast", "medium"), by default "ultrafast"
+    crf : int, optional
+        constant rate factor; lower is higher quality, 0 is lossless for libx264. By default 23
+    pix_fmt : str, optional
+        pixel format of the encoded video, by default "yuv420p"
+    extension : str, optional
+        video file extension, which selects the container, by default ".mp4"
+    ffmpeg : str, optional
+        ffmpeg executable, by default "ffmpeg"
+    segment : int, optional
+        index of the segment, by default None (not a segmented recording)
+    """
+
+    def __init__(
+        self,
+        filename,
+        fps,
+        im_size,
+        codec="libx264",
+        preset="ultrafast",
+        crf=23,
+        pix_fmt="yuv420p",
+        extension=".mp4",
+        ffmpeg="ffmpeg",
+        segment=None,
+    ):
+        """ Constructor method
+        """
+
+        self.extension = extension
+        super().__init__(filename, fps, im_size, segment=segment)
+
+        if shutil.which(ffmpeg) is None:
+            raise VideoWriterError(f"Could not find the ffmpeg executable '{ffmpeg}'.")
+
+        cmd = [
+            ffmpeg,
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "bgr24",
+            "-s",
+            f"{self.im_size[0]}x{self.im_size[1]}",
+            "-r",
+            str(self.fps),
+            "-i",
+            "-",
+            "-c:v",
+            codec,
+        ]
+        if preset is not None:
+            cmd += ["-preset", preset]
+        if crf is not None:
+            cmd += ["-crf", str(crf)]
+        cmd += ["-pix_fmt", pix_fmt, self.video_file]
+
+        self.ffmpeg_process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def is_opened(self):
+
+        return self.ffmpeg_process.poll() is None
+
+    def _write(self, frame):
+
+        self.ffmpeg_process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def release(self):
+
+        ### ffmpeg encodes buffered frames after the pipe is closed, which counts towards the encoding time
+
+        if self.ffmpeg_process.poll() is None:
+            t0 = time.perf_counter()
+            self.ffmpeg_process.stdin.close()
+            self.ffmpeg_process.wait()
+            self.encode_time += time.perf_counter() - t0
+
+
+class NpyFrameWriter(VideoWriter):
+    """ Writes raw frames to a .npy file without encoding, so writing a frame costs one copy. The file can be read with :func:`numpy.load` (e.g. memory-mapped, for random access)
+    or :class:`dlclivegui.raw_video.RawVideoCapture` at any time, and converted to a compressed video with :func:`dlclivegui.raw_video.transcode_raw_video`.
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+    fps : float
+        frame rate of the video
+    im_size : tuple
+        size of the frames, (width, height)
+    flush_every : int, optional
+        number of frames to buffer before writing them to the file, by default 16
+    segment : int, optional
+        index of the segment, by default None (not a segmented recording)
+    """
+
+    extension = ".npy"
+
+    def __init__(self, filename, fps, im_size, flush_every=16, segment=None):
+        """ Constructor method
+        """
+
+        super().__init__(filename, fps, im_size, segment=segment)
+        self.frames = NpyAppender(
+            self.video_file,
+            "uint8",
+            (self.im_size[1], self.im_size[0], 3),
+            flush_every=flush_every,
+        )
+
+    def _write(self, frame):
+
+        self.frames.append(frame)
+
+    def release(self):
+
+        t0 = time.perf_counter()
+        self.frames.close()
+        self.encode_time += time.perf_counter() - t0
+
+
+### writer backends by name: (writer class, default options)
+
+WRITERS = {
+    "divx": (OpenCVWriter, {"fourcc": "DIVX"}),
+    "mjpg": (OpenCVWriter, {"fourcc": "MJPG"}),
+    "ffv1": (OpenCVWriter, {"fourcc": "FFV1", "extension": ".mkv"}),
+    "huffyuv": (OpenCVWriter, {"fourcc": "HFYU"}),
+    "raw": (OpenCVWriter, {"fourcc": None}),
+    "ffmpeg": (FFmpegWriter, {}),
+    "npy": (NpyFrameWriter, {}),
+}
+
+VIDEO_EXTENSIONS = [".avi", ".mkv", ".mp4", ".mov", ".npy"]
+
+
+def create_writer(writer, filename, fps, im_size, segment=None, **options):
+    """ Create a video writer backend by name
+
+    Parameters
+    ----------
+    writer : str
+        name of the backend, one of the keys of `WRITERS`
+    filename : str
+        path and base file name
+    fps : float
+        frame rate of the video
+    im_size : tuple
+        size of the frames, (width, height)
+    segment : int, optional
+        index of the segment, by default None (not a segmented recording)
+    **options
+        options of the backend, overriding its defaults
+
+    Returns
+    -------
+    :class:`VideoWriter`
+        the video writer
+    """
+
+    if writer not in WRITERS:
+        raise VideoWriterError(
+            f"writer must be one of {list(WRITERS.keys())}, not '{writer}'."
+        )
+
+    writer_class, defaults = WRITERS[writer]
+    kwargs = dict(defaults, **options)
+
+    return writer_class(filename, fps, im_size, segment=segment, **kwargs)
+
+
+def find_video_file(filename):
+    """ Find the video file written for a base file name, with any of the extensions used by the writer backends
+
+    Parameters
+    ----------
+    filename : str
+        path and base file name
+
+    Returns
+    -------
+    str
+        path to the video file, or None if there is none
+    """
+
+    for ext in VIDEO_EXTENSIONS:
+        video_file = f"{filename}_VIDEO{ext}"
+        if os.path.isfile(video_file):
+            return video_file
+
+    return None
+
+
+def benchmark_writer(writer, im_size=(640, 480), n_frames=300, fps=30, **options):
+    """ Measure the sustained encoding rate of a writer backend on this computer, using random noise frames (a worst case for compression)
+
+    Parameters
+    ----------
+    writer : str
+        name of the backend, one of the keys of `WRITERS`
+    im_size : tuple, optional
+        size of the frames, (width, height), by default (640, 480)
+    n_frames : int, optional
+        number of frames to write, by default 300
+    fps : float, optional
+        frame rate of the video, by default 30
+    **options
+        options of the backend
+
+    Returns
+    -------
+    float
+        encoding rate in frames per second
+    """
+
+    frames = np.random.randint(
+        0, 256, size=(8, im_size[1], im_size[0], 3), dtype=np.uint8
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_writer = create_writer(
+            writer, os.path.join(tmp_dir, "benchmark"), fps, im_size, **options
+        )
+        if not video_writer.is_opened():
+            raise VideoWriterError(f"Could not open the '{writer}' video writer.")
+        for i in range(n_frames):
+            video_writer.write(frames[i % frames.shape[0]])
+        video_writer.release()
+
+    return video_writer.encode_fps
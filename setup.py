@@ -42,6 +42,8 @@ setuptools.setup(
         "console_scripts": [
             "dlclivegui=dlclivegui.dlclivegui:main",
             "dlclivegui-video=dlclivegui.video:main",
+            "dlclivegui-transcode=dlclivegui.raw_video:main",
+            "dlclivegui-benchmark=dlclivegui.benchmark:main",
         ]
     },
 )
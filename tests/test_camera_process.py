@@ -0,0 +1,134 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import time
+import threading
+import numpy as np
+import pytest
+
+from dlclivegui.camera import Camera
+from dlclivegui.camera_process import CameraProcess
+
+
+class FakeCamera(Camera):
+    """ Camera that returns frames filled with the frame number
+    """
+
+    def __init__(self, fps=100, resolution=(32, 24)):
+
+        super().__init__(0, resolution=resolution, fps=fps)
+        self.n = 0
+
+    def set_capture_device(self):
+
+        return True
+
+    def get_image(self):
+
+        self.n += 1
+        return np.full(
+            (self.im_size[1], self.im_size[0], 3), self.n % 256, dtype=np.uint8
+        )
+
+    def close_capture_device(self):
+
+        pass
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "drop_newest"])
+def test_full_write_queue_drops_are_recorded(tmp_path, policy):
+    """ Queue more frames than the write buffer holds while the writer is stopped, then let the writer drain the buffer.
+    Every frame that was not written must be recorded as dropped, and queueing a frame must never wait on a full buffer
+    """
+
+    n_frames = 40
+    buffer_size = 8
+    proc = CameraProcess(
+        FakeCamera(),
+        writer="npy",
+        write_buffer_size=buffer_size,
+        overflow_policy=policy,
+    )
+    filename = str(tmp_path / "test")
+    proc.write_frame_queue.allocate()
+    assert proc._create_writer(filename)
+
+    seqs = []
+    max_time = 0
+    for i in range(n_frames):
+        frame = proc.device.get_image()
+        seq = proc.frame_buffer.write(frame, float(i))
+        seqs.append(seq)
+        start = time.perf_counter()
+        proc._queue_write_frame((seq, float(i), seqs[0], frame))
+        max_time = max(max_time, time.perf_counter() - start)
+
+    writer = threading.Thread(target=proc._write_loop)
+    writer.start()
+    assert proc._queue_write_frame((seqs[-1], None, seqs[0], None), True)
+    time.sleep(0.5)
+    proc.channels["writer"].send("end", True)
+    writer.join(5)
+    assert proc._save_video()
+    proc.write_frame_queue.free()
+
+    written = np.load(f"{filename}_TS.npy")
+    dropped = np.load(f"{filename}_DROPPED.npy")
+    stats = proc.get_write_stats()
+
+    assert max_time < 0.1
+    assert written.size == buffer_size
+    assert stats["written"] == written.size
+    assert stats["dropped"] == n_frames - written.size == dropped.shape[0]
+    assert sorted(written.tolist() + dropped[:, 1].tolist()) == list(range(n_frames))
+    if policy == "drop_oldest":
+        np.testing.assert_array_equal(
+            written, np.arange(n_frames - buffer_size, n_frames)
+        )
+    else:
+        np.testing.assert_array_equal(written, np.arange(buffer_size))
+
+
+def test_frames_of_failed_segment_are_dropped(tmp_path):
+    """ Frames queued for a segment that cannot be opened must be recorded as dropped, not as written, and the error must be reported
+    """
+
+    proc = CameraProcess(FakeCamera(), writer="npy", segment_frames=5)
+    filename = str(tmp_path / "test")
+    proc.write_frame_queue.allocate()
+    assert proc._create_writer(filename)
+
+    ### a directory in place of the second segment's video file makes opening the segment fail
+
+    (tmp_path / "test_VIDEO_0001.npy").mkdir()
+
+    first_seq = None
+    for i in range(15):
+        frame = proc.device.get_image()
+        seq = proc.frame_buffer.write(frame, float(i))
+        first_seq = seq if first_seq is None else first_seq
+        proc._queue_write_frame((seq, float(i), first_seq, frame))
+
+    writer = threading.Thread(target=proc._write_loop)
+    writer.start()
+    assert proc._queue_write_frame((seq, None, first_seq, None), True)
+    time.sleep(0.5)
+    proc.channels["writer"].send("end", True)
+    writer.join(5)
+    assert not proc._save_video()
+    proc.write_frame_queue.free()
+
+    written = np.load(f"{filename}_TS.npy")
+    dropped = np.load(f"{filename}_DROPPED.npy")
+    stats = proc.get_write_stats()
+
+    assert "test_VIDEO_0001.npy" in stats["error"]
+    assert (stats["written"], stats["dropped"]) == (10, 5)
+    np.testing.assert_array_equal(written, [0, 1, 2, 3, 4, 10, 11, 12, 13, 14])
+    np.testing.assert_array_equal(dropped[:, 1], np.arange(5, 10))
+    assert (dropped[:, 2] == 5).all()
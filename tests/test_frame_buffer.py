@@ -0,0 +1,34 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import threading
+import time
+import numpy as np
+
+from dlclivegui.frame_buffer import FrameRingBuffer
+
+
+def test_wait_for_frame_sees_new_frames_without_signal():
+
+    buffer = FrameRingBuffer((4, 6, 3), n_slots=2)
+    assert not buffer.wait_for_frame(-1, timeout=0.01, spin_threshold=0)
+
+    result = {}
+
+    def wait():
+        result["ready"] = buffer.wait_for_frame(-1, timeout=2, spin_threshold=0)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.05)
+    buffer.write(np.ones((4, 6, 3), dtype=np.uint8), time.time())
+    waiter.join()
+
+    assert result["ready"]
+    frame, _, seq = buffer.read_latest()
+    assert (seq == 0) and (frame == 1).all()
@@ -0,0 +1,55 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import numpy as np
+
+from dlclivegui.npy_file import NpyAppender, recover_npy
+from dlclivegui.raw_video import recover_recording
+
+
+def interrupted_file(filename, rows, n_written, extra_bytes):
+    """ Write `n_written` rows with :class:`NpyAppender`, then the rest of `rows` and `extra_bytes` of a partial row
+    directly to the file without updating the header, as if the process stopped in the middle of a write
+    """
+
+    appender = NpyAppender(filename, rows.dtype, rows.shape[1:])
+    appender.write(rows[:n_written])
+    appender.close()
+
+    with open(filename, "ab") as f:
+        f.write(rows[n_written:].tobytes())
+        f.write(rows[0].tobytes()[:extra_bytes])
+
+
+def test_recover_truncated_file(tmp_path):
+
+    filename = str(tmp_path / "test_TS.npy")
+    rows = np.arange(50, dtype=np.float64)
+    interrupted_file(filename, rows, 20, 3)
+
+    assert np.load(filename).shape == (20,)
+    assert recover_npy(filename) == 50
+    np.testing.assert_array_equal(np.load(filename), rows)
+
+
+def test_recover_recording(tmp_path):
+
+    filename = str(tmp_path / "session")
+    ts = np.arange(30, dtype=np.float64)
+    frames = np.random.RandomState(0).randint(0, 256, (12, 4, 6, 3)).astype(np.uint8)
+    interrupted_file(f"{filename}_TS.npy", ts, 10, 5)
+    interrupted_file(f"{filename}_VIDEO.npy", frames, 4, 40)
+    np.save(f"{filename}_other.npy", np.zeros((2, 2)))
+
+    recovered = recover_recording(filename)
+
+    assert recovered[f"{filename}_TS.npy"] == 30
+    assert recovered[f"{filename}_VIDEO.npy"] == 12
+    np.testing.assert_array_equal(np.load(f"{filename}_TS.npy"), ts)
+    np.testing.assert_array_equal(np.load(f"{filename}_VIDEO.npy"), frames)
+    np.testing.assert_array_equal(np.load(f"{filename}_other.npy"), np.zeros((2, 2)))
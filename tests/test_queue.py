@@ -0,0 +1,80 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import numpy as np
+import multiprocess as mp
+
+from dlclivegui.queue import SharedArrayQueue
+
+
+def test_shared_array_queue_structured_items():
+
+    dtype = [("seq", np.int64), ("frame", np.uint8, (4, 6, 3))]
+    q = SharedArrayQueue((), dtype=dtype, maxsize=4, instrument=True)
+
+    for i in range(10):
+        item = q.reserve()
+        item["seq"] = i
+        item["frame"] = i
+        q.commit()
+
+    ### the first 6 items were overwritten, and count as taken without a latency
+
+    out = np.empty((), dtype=q.dtype)
+    seqs = []
+    while True:
+        item = q.read(out=out)
+        if item is None:
+            break
+        assert (item["frame"] == item["seq"]).all()
+        seqs.append(int(item["seq"]))
+
+    stats = q.stats()
+    assert seqs == [6, 7, 8, 9]
+    assert (stats["put"], stats["get"], stats["depth"]) == (10, 10, 0)
+    assert stats["latency_hist"].sum() == 4
+
+
+def test_shared_array_queue_read_latest():
+
+    q = SharedArrayQueue((2,), maxsize=8)
+    for i in range(5):
+        q.write(np.full(2, i))
+
+    np.testing.assert_array_equal(q.read(clear=True, position="last"), [4, 4])
+    assert q.empty()
+    assert q.read() is None
+
+
+def read_after_allocation(q, commands, results):
+
+    commands.get()
+    results.put((q.attach(), q.read(timeout=5)))
+
+
+def test_shared_array_queue_allocated_later():
+    """ A process started before the slots were allocated attaches to them by name
+    """
+
+    ctx = mp.get_context("spawn")
+    q = SharedArrayQueue((3,), maxsize=4, ctx=ctx, allocate=False)
+    commands, results = ctx.Queue(), ctx.Queue()
+    consumer = ctx.Process(target=read_after_allocation, args=(q, commands, results))
+    consumer.start()
+    assert not q.allocated
+
+    q.allocate()
+    q.write(np.arange(3))
+    commands.put(True)
+    attached, item = results.get(timeout=30)
+    consumer.join(5)
+    q.free()
+
+    assert attached
+    np.testing.assert_array_equal(item, np.arange(3))
+    assert not q.allocated
@@ -0,0 +1,191 @@
+"""
+DeepLabCut Toolbox (deeplabcut.org)
+© A. & M. Mathis Labs
+
+Licensed under GNU Lesser General Public License v3.0
+"""
+
+
+import os
+import cv2
+import numpy as np
+import pytest
+
+import dlclivegui.video
+from dlclivegui.pose_recorder import save_pose_data
+from dlclivegui.video import create_labeled_video, label_sessions, seek_frame
+
+
+FPS = 30
+N_FRAMES = 120
+IM_SIZE = (64, 48)
+
+
+def synthetic_frame(i):
+    """ A frame with a bright square whose position and intensity depend on the frame number
+    """
+
+    frame = np.zeros((IM_SIZE[1], IM_SIZE[0], 3), dtype=np.uint8)
+    x = (3 * i) % (IM_SIZE[0] - 8)
+    y = (2 * i) % (IM_SIZE[1] - 8)
+    frame[y : y + 8, x : x + 8] = 55 + (i * 7) % 200
+    return frame
+
+
+@pytest.fixture
+def session_dir(tmp_path):
+    """ A DeepLabCut-live-GUI recording with a short synthetic video, its timestamps and poses
+    """
+
+    data_dir = tmp_path / "session"
+    data_dir.mkdir()
+    base_file = str(data_dir / "session")
+
+    vwriter = cv2.VideoWriter(
+        f"{base_file}_VIDEO.avi", cv2.VideoWriter_fourcc(*"DIVX"), FPS, IM_SIZE
+    )
+    for i in range(N_FRAMES):
+        vwriter.write(synthetic_frame(i))
+    vwriter.release()
+
+    frame_times = 1000 + np.arange(N_FRAMES) / FPS
+    np.save(f"{base_file}_TS.npy", frame_times)
+
+    rng = np.random.RandomState(0)
+    poses = np.concatenate(
+        [
+            rng.uniform(0, IM_SIZE[1], size=(N_FRAMES, 4, 2)),
+            rng.uniform(0, 1, size=(N_FRAMES, 4, 1)),
+        ],
+        axis=2,
+    )
+    save_pose_data(
+        base_file, ["a", "b", "c", "d"], poses, frame_times, frame_times + 0.01
+    )
+
+    return str(data_dir)
+
+
+def sequential_seek(cap, index):
+    """ Move a video to frame `index` by reading every frame before it
+    """
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(index):
+        cap.read()
+    return True
+
+
+def read_frames(video_file):
+
+    cap = cv2.VideoCapture(video_file)
+    frames = []
+    ret, frame = cap.read()
+    while ret:
+        frames.append(frame)
+        ret, frame = cap.read()
+    cap.release()
+    return np.array(frames)
+
+
+@pytest.mark.parametrize("index", [0, 1, 2, 3, 11, 12, 13, 50, N_FRAMES - 1])
+def test_seek_frame_matches_sequential_decode(session_dir, index):
+
+    video_file = os.path.join(session_dir, "session_VIDEO.avi")
+
+    cap = cv2.VideoCapture(video_file)
+    assert seek_frame(cap, index)
+    seek_frames = [cap.read()[1] for _ in range(min(5, N_FRAMES - index))]
+    cap.release()
+
+    cap = cv2.VideoCapture(video_file)
+    sequential_seek(cap, index)
+    sequential_frames = [cap.read()[1] for _ in range(len(seek_frames))]
+    cap.release()
+
+    for a, b in zip(seek_frames, sequential_frames):
+        np.testing.assert_array_equal(a, b)
+
+
+class KeyframeSeekCapture(object):
+    """ A video whose seeks land on the previous multiple of `gop` frames, but report the requested position, like an inaccurate seek
+    """
+
+    def __init__(self, video_file, gop=12):
+
+        self.cap = cv2.VideoCapture(video_file)
+        self.gop = gop
+        self.pos = 0
+
+    def read(self):
+
+        ret, frame = self.cap.read()
+        self.pos += 1
+        return ret, frame
+
+    def get(self, prop):
+
+        return self.pos if prop == cv2.CAP_PROP_POS_FRAMES else self.cap.get(prop)
+
+    def set(self, prop, value):
+
+        self.pos = int(value)
+        return self.cap.set(prop, int(value) - int(value) % self.gop)
+
+
+@pytest.mark.parametrize("index", [13, 14, 25, 50])
+def test_seek_frame_detects_inaccurate_seek(session_dir, index):
+
+    video_file = os.path.join(session_dir, "session_VIDEO.avi")
+
+    cap = KeyframeSeekCapture(video_file)
+    assert seek_frame(cap, index)
+    frame = cap.read()[1]
+
+    cap = cv2.VideoCapture(video_file)
+    sequential_seek(cap, index)
+    np.testing.assert_array_equal(frame, cap.read()[1])
+    cap.release()
+
+
+@pytest.mark.parametrize("cut", [(0.5, 2.5), (1.9, 3.0)])
+def test_labeled_video_cut_matches_sequential_decode(
+    session_dir, tmp_path, monkeypatch, cut
+):
+
+    create_labeled_video(
+        session_dir, out_dir=str(tmp_path / "seek"), cut=cut, progress=False
+    )
+
+    monkeypatch.setattr(dlclivegui.video, "seek_frame", sequential_seek)
+    create_labeled_video(
+        session_dir, out_dir=str(tmp_path / "sequential"), cut=cut, progress=False
+    )
+
+    seek_frames = read_frames(str(tmp_path / "seek" / "session_VIDEO_LABELED.avi"))
+    sequential_frames = read_frames(
+        str(tmp_path / "sequential" / "session_VIDEO_LABELED.avi")
+    )
+    seek_times = np.load(str(tmp_path / "seek" / "session_TS_LABELED.npy"))
+    sequential_times = np.load(str(tmp_path / "sequential" / "session_TS_LABELED.npy"))
+
+    assert seek_frames.shape[0] > 0
+    np.testing.assert_array_equal(seek_frames, sequential_frames)
+    np.testing.assert_array_equal(seek_times, sequential_times)
+
+
+def test_label_sessions_skips_only_identical_labeling(session_dir):
+    def statuses(**kwargs):
+        report = label_sessions([session_dir], progress=False, **kwargs)
+        return [s["status"] for s in report["sessions"]]
+
+    assert statuses(lik_thresh=0.5) == ["done"]
+    assert statuses(lik_thresh=0.5) == ["skipped"]
+    assert statuses() == ["skipped"]
+    assert statuses(lik_thresh=0.8) == ["done"]
+    assert statuses(lik_thresh=0.8, cut=(1.0, 2.0)) == ["done"]
+
+    ts_file = os.path.join(session_dir, "session_TS.npy")
+    os.utime(ts_file, ns=(0, os.stat(ts_file).st_mtime_ns + 10 ** 9))
+    assert statuses(lik_thresh=0.8, cut=(1.0, 2.0)) == ["done"]
+    assert statuses(lik_thresh=0.8, cut=(1.0, 2.0)) == ["skipped"]